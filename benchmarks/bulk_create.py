@@ -0,0 +1,88 @@
+""" content creation benchmark, container api vs bulk_create
+
+Usage::
+
+    python benchmarks/bulk_create.py --count 10000 --batch 500
+
+"""
+import sys
+import time
+import argparse
+import sqlahelper
+import sqlalchemy as sqla
+import transaction
+from pyramid import testing
+
+import ptah
+import ptah.cms
+
+
+class BenchContent(ptah.cms.Content):
+    __type__ = ptah.cms.Type('benchcontent', 'Bench content',
+                             permission=None)
+
+
+class BenchContainer(ptah.cms.Container):
+    __type__ = ptah.cms.Type('benchcontainer', 'Bench container')
+
+
+def setup():
+    sqlahelper.add_engine(sqla.create_engine('sqlite://'))
+
+    config = testing.setUp(request=testing.DummyRequest(), autocommit=False)
+    config.include('ptah')
+    config.scan('ptah')
+    config.scan(sys.modules[__name__])
+    config.commit()
+    ptah.init_settings(config, {})
+
+    Base = sqlahelper.get_base()
+    Base.metadata.create_all()
+    transaction.commit()
+
+
+def records(prefix, count):
+    for idx in range(count):
+        yield {'__name__': '%s%s'%(prefix, idx),
+               'title': 'Item %s'%idx, 'description': 'Description %s'%idx,
+               'subjects': ['bench']}
+
+
+def container_api(count, batch):
+    container = BenchContainer.__type__.create(title='Container')
+    ptah.cms.Session.add(container)
+    tinfo = BenchContent.__type__
+    for record in records('item', count):
+        name = record.pop('__name__')
+        container[name] = tinfo.create(**record)
+    transaction.commit()
+
+
+def bulk(count, batch):
+    container = BenchContainer.__type__.create(title='Container')
+    ptah.cms.Session.add(container)
+    ptah.cms.bulk_create(
+        container, BenchContent.__type__, records('item', count), batch)
+    transaction.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--count', type=int, default=10000,
+                        help='Number of content items')
+    parser.add_argument('--batch', type=int, default=500,
+                        help='bulk_create batch size')
+    args = parser.parse_args()
+
+    setup()
+
+    print('%-10s %12s'%('mode', 'items/s'))
+    for mode, func in (('container', container_api), ('bulk', bulk)):
+        started = time.time()
+        func(args.count, args.batch)
+        seconds = time.time() - started
+        print('%-10s %12.0f'%(mode, args.count / seconds))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+""" content info() benchmark, fieldset binding vs compiled type serializer
+
+Usage::
+
+    python benchmarks/content_info.py --count 1000 --rounds 10
+
+"""
+import sys
+import time
+import argparse
+import sqlahelper
+import sqlalchemy as sqla
+import transaction
+from pyramid import testing
+
+import ptah
+import ptah.cms
+from ptah.cms.node import Node
+
+
+class BenchContent(ptah.cms.Content):
+    __type__ = ptah.cms.Type('benchcontent', 'Bench content')
+
+
+class BenchContainer(ptah.cms.Container):
+    __type__ = ptah.cms.Type('benchcontainer', 'Bench container')
+
+
+def old_info(content):
+    """ info() implementation with fieldset binding """
+    info = Node.info(content)
+    info['__name__'] = content.__name__
+    info['__content__'] = True
+    info['__container__'] = False
+    content._extra_info(info)
+    return info
+
+
+def setup():
+    sqlahelper.add_engine(sqla.create_engine('sqlite://'))
+
+    config = testing.setUp(request=testing.DummyRequest(), autocommit=False)
+    config.include('ptah')
+    config.scan('ptah')
+    config.scan(sys.modules[__name__])
+    config.commit()
+    ptah.init_settings(config, {})
+
+    Base = sqlahelper.get_base()
+    Base.metadata.create_all()
+    transaction.commit()
+
+
+def bench(func, rounds):
+    started = time.time()
+    for i in range(rounds):
+        func()
+    return time.time() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--count', type=int, default=1000,
+                        help='Number of content items')
+    parser.add_argument('--rounds', type=int, default=10,
+                        help='Number of serializations of all items')
+    args = parser.parse_args()
+
+    setup()
+
+    container = BenchContainer.__type__.create(title='Container')
+    ptah.cms.Session.add(container)
+    for idx in range(args.count):
+        container['item%s'%idx] = BenchContent.__type__.create(
+            title='Item %s'%idx, description='Description %s'%idx)
+    container_uri = container.__uri__
+    transaction.commit()
+
+    container = ptah.resolve(container_uri)
+    items = container.values()
+    serializer = BenchContent.__type__.serializer
+
+    total = args.count * args.rounds
+    results = (
+        ('bind', bench(lambda: [old_info(i) for i in items], args.rounds)),
+        ('compiled', bench(lambda: [serializer(i) for i in items],
+                           args.rounds)),
+        ('batch', bench(lambda: serializer.many(items), args.rounds)),
+        )
+
+    print('%-10s %12s'%('mode', 'items/s'))
+    for mode, seconds in results:
+        print('%-10s %12.0f'%(mode, total / seconds))
+
+
+if __name__ == '__main__':
+    main()
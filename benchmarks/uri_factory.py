@@ -0,0 +1,91 @@
+""" ptah_nodes insert/lookup benchmark for random and time ordered uris
+
+Usage::
+
+    python benchmarks/uri_factory.py --count 1000000
+
+"""
+import os
+import time
+import random
+import argparse
+import tempfile
+import sqlalchemy as sqla
+
+import ptah
+from ptah.cms.node import Node
+
+
+def run(ordered, count, batch, lookups, path):
+    if os.path.exists(path):
+        os.unlink(path)
+
+    engine = sqla.create_engine('sqlite:///%s'%path)
+    table = Node.__table__
+    table.create(engine)
+
+    factory = ptah.UriFactory('cms-bench', ordered=ordered)
+
+    uris = []
+    parent = None
+    started = time.time()
+    for idx in range(0, count, batch):
+        rows = []
+        for i in range(idx, min(idx + batch, count)):
+            uri = factory()
+            rows.append({'uri': uri, 'parent': parent,
+                         'type': 'cms-type:bench',
+                         'owner': '', 'roles': '{}', 'acls': '[]'})
+            uris.append(uri)
+            if not i % 100:
+                parent = uri
+
+        conn = engine.connect()
+        trans = conn.begin()
+        conn.execute(table.insert(), rows)
+        trans.commit()
+        conn.close()
+    insert_time = time.time() - started
+
+    sample = random.sample(uris, min(lookups, len(uris)))
+    stmt = sqla.select([table.c.id]).where(
+        table.c.uri == sqla.sql.bindparam('uri'))
+
+    conn = engine.connect()
+    started = time.time()
+    for uri in sample:
+        conn.execute(stmt, uri=uri).fetchall()
+    lookup_time = time.time() - started
+    conn.close()
+
+    engine.dispose()
+    size = os.path.getsize(path)
+    os.unlink(path)
+
+    return insert_time, lookup_time, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--count', type=int, default=1000000,
+                        help='Number of nodes')
+    parser.add_argument('--batch', type=int, default=10000,
+                        help='Number of nodes inserted per transaction')
+    parser.add_argument('--lookups', type=int, default=100000,
+                        help='Number of uri lookups')
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.gettempdir(), 'ptah-uri-bench.db')
+
+    print('%-8s %12s %12s %12s'%('mode', 'inserts/s', 'lookups/s', 'db size'))
+    for mode, ordered in (('uuid4', False), ('ordered', True)):
+        insert_time, lookup_time, size = run(
+            ordered, args.count, args.batch, args.lookups, path)
+
+        print('%-8s %12.0f %12.0f %11.1fM'%(
+            mode, args.count / insert_time,
+            min(args.lookups, args.count) / lookup_time, size / 1048576.0))
+
+
+if __name__ == '__main__':
+    main()
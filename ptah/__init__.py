@@ -2,6 +2,7 @@
 
 # uri
 from ptah.uri import resolve
+from ptah.uri import resolve_many
 from ptah.uri import resolver
 from ptah.uri import register_uri_resolver
 from ptah.uri import extract_uri_schema
@@ -11,6 +12,7 @@ from ptah.uri import UriFactory
 from ptah import config
 from ptah.config import adapter
 from ptah.config import subscriber
+from ptah.config import batch_subscriber
 from ptah.config import get_cfg_storage
 
 # events
@@ -85,6 +87,7 @@ CFG_ID_PTAH = 'ptah'
 CFG_ID_FORMAT = 'format'
 CFG_ID_SQLA = 'sqla'
 CFG_ID_PASSWORD = 'password'
+CFG_ID_BLOB = 'blob'
 
 # password tool
 from ptah.password import pwd_tool
@@ -29,9 +29,29 @@ from ptah.cms.root import ApplicationFactory
 
 # blob storage
 from ptah.cms.blob import blob_storage
+from ptah.cms.blob import fs_blob_storage
+from ptah.cms.blob import chunked_blob_storage
 from ptah.cms.interfaces import IBlob
 from ptah.cms.interfaces import IBlobStorage
 
+# full-text search
+from ptah.cms.search import search
+from ptah.cms.search import search_index
+from ptah.cms.search import reindex
+
+# content terms index
+from ptah.cms.terms import find_by_term
+from ptah.cms.terms import find_by_subject
+from ptah.cms.terms import find_by_creator
+from ptah.cms.terms import find_by_contributor
+from ptah.cms.terms import count_by_term
+
+# content queries
+from ptah.cms.query import query
+
+# bulk content creation
+from ptah.cms.bulk import bulk_create
+
 # schemas
 from ptah.cms.interfaces import ContentSchema
 from ptah.cms.interfaces import ContentNameSchema
@@ -1,36 +1,90 @@
 """ blob storage implementation """
 import os
+import time
+import errno
+import hashlib
+import tempfile
+import transaction
 import sqlalchemy as sqla
-from pyramid.compat import text_type
+from io import BytesIO
+from datetime import datetime
+from pyramid.compat import bytes_, text_type
 from zope.interface import implementer
+from sqlalchemy.engine.reflection import Inspector
+from zope.sqlalchemy import mark_changed
 
 import ptah
-from ptah.cms.node import Node, Session
+from ptah.cms.node import Base, Node, Session
 from ptah.cms.interfaces import IBlob, IBlobStorage
 
+try:
+    import fcntl
+except ImportError: # pragma: no cover
+    fcntl = None
 
-@implementer(IBlob)
-class Blob(Node):
-    """ simple blob implementation """
+CHUNK_SIZE = 65536
+SQL_CHUNK_SIZE = 1048576
 
-    __tablename__ = 'ptah_blobs'
-    __mapper_args__ = {'polymorphic_identity': 'blob-sql'}
-    __uri_factory__ = ptah.UriFactory('blob-sql')
 
-    __id__ = sqla.Column('id', sqla.Integer,
-                         sqla.ForeignKey('ptah_nodes.id'), primary_key=True)
+def _read_chunk(data, size):
+    """ read exactly `size` bytes from stream, less only at the end """
+    chunk = data.read(size)
+    if not chunk or len(chunk) == size:
+        return chunk
+
+    chunks = [chunk]
+    size -= len(chunk)
+    while size > 0:
+        chunk = data.read(size)
+        if not chunk:
+            break
+        chunks.append(chunk)
+        size -= len(chunk)
+
+    return b''.join(chunks)
+
+
+def copy_stream(data, write, chunk_size=CHUNK_SIZE):
+    """ Copy file-like object `data` to `write` callable in chunks of
+    `chunk_size` bytes. Return size and SHA-256 hash of copied data. """
+    sha = hashlib.sha256()
+    size = 0
+    while True:
+        chunk = _read_chunk(data, chunk_size)
+        if not chunk:
+            break
+
+        sha.update(chunk)
+        size += len(chunk)
+        write(chunk)
+
+    return size, sha.hexdigest()
+
+
+
+class BlobMetadata(object):
+    """ blob metadata columns """
 
     mimetype = sqla.Column(sqla.String(), default=text_type(''))
     filename = sqla.Column(sqla.String(), default=text_type(''))
     size = sqla.Column(sqla.Integer, default=0)
-    data = sqla.orm.deferred(sqla.Column(sqla.LargeBinary))
+    hash = sqla.Column(sqla.String(64), index=True)
+    modified = sqla.Column(sqla.DateTime)
 
-    def read(self):
-        return self.data
+    @property
+    def etag(self):
+        """ Strong entity tag, SHA-256 hash of data or tag
+        built from blob uri, size and modification time """
+        if self.hash:
+            return self.hash
 
-    def write(self, data):
-        self.data = data
-        self.size = len(data)
+        return hashlib.md5(bytes_(
+            '%s:%s:%s'%(self.__uri__, self.size, self.modified), 'utf-8'))\
+            .hexdigest()
+
+    def open(self):
+        """ Return file-like object for reading blob data """
+        return BytesIO(self.read() or b'')
 
     def updateMetadata(self, mimetype=None, filename=None, **md):
         if mimetype is not None:
@@ -40,7 +94,7 @@ class Blob(Node):
             self.filename = filename
 
     def info(self):
-        info = super(Blob, self).info()
+        info = super(BlobMetadata, self).info()
 
         info['size'] = self.size
         info['mimetype'] = self.mimetype
@@ -48,6 +102,106 @@ class Blob(Node):
         return info
 
 
+@implementer(IBlob)
+class Blob(BlobMetadata, Node):
+    """ simple blob implementation """
+
+    __tablename__ = 'ptah_blobs'
+    __mapper_args__ = {'polymorphic_identity': 'blob-sql'}
+    __uri_factory__ = ptah.UriFactory('blob-sql')
+
+    __id__ = sqla.Column('id', sqla.Integer,
+                         sqla.ForeignKey('ptah_nodes.id'), primary_key=True)
+
+    data = sqla.orm.deferred(sqla.Column(sqla.LargeBinary))
+
+    def read(self):
+        return self.data
+
+    def write(self, data):
+        if isinstance(data, bytes):
+            data = BytesIO(data)
+
+        chunks = []
+        self.size, self.hash = copy_stream(data, chunks.append)
+        self.data = b''.join(chunks)
+        self.modified = datetime.utcnow()
+
+
+@implementer(IBlob)
+class FsBlob(BlobMetadata, Node):
+    """ filesystem blob, data is stored in file named by SHA-256
+    hash of data, see :py:class:`FsBlobStorage` """
+
+    __tablename__ = 'ptah_blobs_fs'
+    __mapper_args__ = {'polymorphic_identity': 'blob-fs'}
+    __uri_factory__ = ptah.UriFactory('blob-fs')
+
+    __id__ = sqla.Column('id', sqla.Integer,
+                         sqla.ForeignKey('ptah_nodes.id'), primary_key=True)
+
+    @property
+    def data(self):
+        return self.read()
+
+    def open(self):
+        if not self.hash:
+            return BytesIO(b'')
+        return open(fs_blob_storage.path(self.hash), 'rb')
+
+    def read(self):
+        if not self.hash:
+            return None
+
+        with self.open() as f:
+            return f.read()
+
+    def write(self, data):
+        if isinstance(data, bytes):
+            data = BytesIO(data)
+
+        self.hash, self.size = fs_blob_storage.store(data)
+        self.modified = datetime.utcnow()
+
+
+class BlobIter(object):
+    """ WSGI app_iter, reads blob file in chunks. Supports
+    `app_iter_range` so ranged responses seek instead of reading
+    skipped data. """
+
+    def __init__(self, file, start=0, stop=None, block_size=CHUNK_SIZE):
+        self.file = file
+        self.remaining = None if stop is None else stop - start
+        self.block_size = block_size
+
+        if start:
+            file.seek(start)
+
+    def __iter__(self):
+        return self
+
+    def next(self):
+        size = self.block_size
+        if self.remaining is not None:
+            size = min(size, self.remaining)
+
+        data = self.file.read(size) if size > 0 else b''
+        if not data:
+            raise StopIteration
+
+        if self.remaining is not None:
+            self.remaining -= len(data)
+        return data
+
+    __next__ = next # py3
+
+    def app_iter_range(self, start, stop):
+        return self.__class__(self.file, start, stop, self.block_size)
+
+    def close(self):
+        self.file.close()
+
+
 @implementer(IBlobStorage)
 class BlobStorage(object):
     """ simple blob storage """
@@ -68,32 +222,644 @@ class BlobStorage(object):
         return blob
 
     def add(self, data, parent=None, **metadata):
+        data.seek(0)
+        return self.ingest(data, parent, **metadata)
+
+    def ingest(self, fp, parent=None, **metadata):
+        """ Create blob from file-like object, data is read from current
+        position in chunks. `ptah.form.FileField` value can be passed as
+        keyword arguments. """
         blob = self.create(parent)
+        blob.write(fp)
+        blob.updateMetadata(**metadata)
 
-        data.seek(0)
+        return blob
+
+    def get(self, uri):
+        """SQL Blob resolver"""
+        blob = self._sql_get.first(uri=uri)
+        if blob is None:
+            # blob is moved to filesystem storage
+            blob = fs_blob_storage.get(uri)
+        return blob
+
+    def get_many(self, uris):
+        """SQL Blob batch resolver"""
+        blobs = dict((blob.__uri__, blob) for blob in
+                     Session.query(Blob).filter(Blob.__uri__.in_(uris)))
+        if len(blobs) < len(uris):
+            blobs.update(fs_blob_storage.get_many(
+                [uri for uri in uris if uri not in blobs]))
+        return blobs
+
+    def getByParent(self, parent):
+        return self._sql_get_by_parent.first(parent=parent)
 
-        blob.data = data.read()
+    def replace(self, uri, data, **metadata):
+        blob = self._sql_get.first(uri=uri)
+        if blob is None:
+            return fs_blob_storage.replace(uri, data, **metadata)
+
+        data.seek(0)
+        blob.write(data)
         blob.updateMetadata(**metadata)
+        return blob
+
+    def remove(self, uri):
+        blob = self._sql_get.first(uri=uri)
+        if blob is None:
+            return fs_blob_storage.remove(uri)
+
+        Session.delete(blob)
+        Session.flush()
+
+
+blob_storage = BlobStorage()
+
+ptah.register_uri_resolver(
+    'blob-sql', blob_storage.get, batch=blob_storage.get_many)
+
+
+@implementer(IBlobStorage)
+class FsBlobStorage(object):
+    """ filesystem blob storage
+
+    Blob data is stored in `directory` in file named by SHA-256 hash
+    of data, so identical blobs share one file. File is written to
+    temporary file first and then renamed. Blob metadata is stored in
+    `ptah_blobs_fs` table. Storage directory is configured with
+    `blob.fs_path` setting.
+
+    Files which are not referenced by blobs anymore are removed after
+    commit, files stored by aborted transaction are removed on abort.
+    File is removed only if no committed blob references it and it
+    was not stored during last `grace` seconds (`blob.fs_grace`
+    setting), so file shared with concurrent uncommitted transaction
+    is kept. Such files are removed by :py:meth:`collect`.
+    """
+
+    directory = ''
+    offload = 'none'
+    offload_prefix = '/blobs/'
+    grace = 3600
 
-        data.seek(0, os.SEEK_END)
-        blob.size = data.tell()
+    _sql_get = ptah.QueryFreezer(
+        lambda: Session.query(FsBlob)
+            .filter(FsBlob.__uri__ == sqla.sql.bindparam('uri')))
+
+    _sql_get_by_parent = ptah.QueryFreezer(
+        lambda: Session.query(FsBlob)
+            .filter(FsBlob.__parent_uri__ == sqla.sql.bindparam('parent')))
+
+    _sql_hash_count = ptah.QueryFreezer(
+        lambda: Session.query(sqla.func.count(FsBlob.__id__))
+            .filter(FsBlob.hash == sqla.sql.bindparam('hash')))
+
+    def _directory(self):
+        if not self.directory:
+            raise RuntimeError(
+                "Filesystem blob storage path is not configured.")
+        return self.directory
+
+    def path(self, hash):
+        """ Return path of file for data `hash` """
+        return os.path.join(self._directory(), hash[:2], hash[2:4], hash)
+
+    def offload_header(self, blob):
+        """ Return `X-Sendfile` or `X-Accel-Redirect` header for
+        filesystem blob, or None if offload is disabled """
+        if self.offload == 'none' or \
+                not isinstance(blob, FsBlob) or not blob.hash:
+            return None
+
+        if self.offload == 'x-sendfile':
+            return 'X-Sendfile', self.path(blob.hash)
+
+        hash = blob.hash
+        return 'X-Accel-Redirect', '%s/%s/%s/%s'%(
+            self.offload_prefix.rstrip('/'), hash[:2], hash[2:4], hash)
+
+    def _makedirs(self, path):
+        try:
+            os.makedirs(path)
+        except OSError as e:
+            if e.errno != errno.EEXIST: # pragma: no cover
+                raise
+
+    def _lock(self):
+        """ Open and lock storage lock file, publishing and removing
+        of files is serialized between processes """
+        fd = os.open(os.path.join(self._directory(), 'lock'),
+                     os.O_RDWR | os.O_CREAT, 0o644)
+        if fcntl is not None:
+            fcntl.lockf(fd, fcntl.LOCK_EX)
+        return fd
+
+    def _unlock(self, fd):
+        if fcntl is not None:
+            fcntl.lockf(fd, fcntl.LOCK_UN)
+        os.close(fd)
+
+    def store(self, data):
+        """ Store data from file-like object, return data hash and size """
+        tmpdir = os.path.join(self._directory(), 'tmp')
+        self._makedirs(tmpdir)
+
+        fd, tmp = tempfile.mkstemp(dir=tmpdir)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                size, hash = copy_stream(data, f.write)
+
+                f.flush()
+                os.fsync(f.fileno())
+
+            path = self.path(hash)
+            lock = self._lock()
+            try:
+                if os.path.exists(path):
+                    # mark file as used, so it isn't removed
+                    os.utime(path, None)
+                    os.unlink(tmp)
+                else:
+                    self._makedirs(os.path.dirname(path))
+                    os.rename(tmp, path)
+                    FsBlobDataManager.get(self).created[hash] = \
+                        os.path.getmtime(path)
+            finally:
+                self._unlock(lock)
+        except:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            raise
+
+        return hash, size
+
+    def _remove(self, items):
+        """ Remove files for `(hash, since)` items, file is removed if
+        it is not referenced by committed blobs and it was not stored
+        after `since` time. Returns number of removed files. """
+        table = FsBlob.__table__
+        items = sorted(items)
+
+        count = 0
+        conn = Session.bind.connect()
+        lock = self._lock()
+        try:
+            for idx in range(0, len(items), 500):
+                batch = items[idx:idx+500]
+                used = set(row[0] for row in conn.execute(
+                    sqla.sql.select([table.c.hash]).distinct()
+                    .where(table.c.hash.in_([h for h, _s in batch]))))
+
+                for hash, since in batch:
+                    path = self.path(hash)
+                    if hash not in used and os.path.exists(path) and \
+                            os.path.getmtime(path) <= since:
+                        os.unlink(path)
+                        count += 1
+        finally:
+            self._unlock(lock)
+            conn.close()
+
+        return count
+
+    def _release(self, hash):
+        """ Remove file after commit if it is not used anymore """
+        if hash and not self._sql_hash_count.first(hash=hash)[0]:
+            def remove(success):
+                if success:
+                    self._remove([(hash, time.time() - self.grace)])
+
+            transaction.get().addAfterCommitHook(remove)
+
+    def collect(self):
+        """ Remove files which are not referenced by blobs and were
+        not stored during last `grace` seconds, and stale temporary
+        files. Returns number of removed files. """
+        directory = self._directory()
+        since = time.time() - self.grace
+
+        count = 0
+        tmpdir = os.path.join(directory, 'tmp')
+        if os.path.isdir(tmpdir):
+            for name in os.listdir(tmpdir):
+                path = os.path.join(tmpdir, name)
+                if os.path.getmtime(path) <= since:
+                    os.unlink(path)
+                    count += 1
+
+        items = []
+        for root, dirs, files in os.walk(directory):
+            if root == directory:
+                dirs[:] = [d for d in dirs if len(d) == 2]
+            else:
+                items.extend((name, since) for name in files)
+
+        return count + self._remove(items)
+
+    def create(self, parent=None):
+        blob = FsBlob(__parent__=parent)
+        Session.add(blob)
+        Session.flush()
+
+        return blob
+
+    def add(self, data, parent=None, **metadata):
+        data.seek(0)
+        return self.ingest(data, parent, **metadata)
+
+    def ingest(self, fp, parent=None, **metadata):
+        """ Create blob from file-like object, see
+        :py:meth:`BlobStorage.ingest` """
+        blob = self.create(parent)
+        blob.write(fp)
+        blob.updateMetadata(**metadata)
 
         return blob
 
     def get(self, uri):
-        """SQL Blob resolver"""
+        """Filesystem Blob resolver"""
         return self._sql_get.first(uri=uri)
 
+    def get_many(self, uris):
+        """Filesystem Blob batch resolver"""
+        return dict((blob.__uri__, blob) for blob in
+                    Session.query(FsBlob).filter(FsBlob.__uri__.in_(uris)))
+
     def getByParent(self, parent):
         return self._sql_get_by_parent.first(parent=parent)
 
-    def replace(self, uri, data, **metadata): # pragma: no cover
+    def replace(self, uri, data, **metadata):
+        blob = self.get(uri)
+        if blob is None:
+            return None
+
+        hash = blob.hash
+
+        data.seek(0)
+        blob.write(data)
+        blob.updateMetadata(**metadata)
+        Session.flush()
+
+        if hash != blob.hash:
+            self._release(hash)
+        return blob
+
+    def remove(self, uri):
+        blob = self.get(uri)
+        if blob is not None:
+            Session.delete(blob)
+            Session.flush()
+            self._release(blob.hash)
+
+
+class FsBlobDataManager(object):
+    """ Transaction data manager of filesystem blob storage, removes
+    files created by transaction when transaction is aborted """
+
+    def __init__(self, storage, txn):
+        self.storage = storage
+        self.transaction_manager = transaction.manager
+        self.created = {}
+        txn.join(self)
+
+    @classmethod
+    def get(cls, storage):
+        txn = transaction.get()
+        dm = getattr(txn, '_ptah_fs_blobs', None)
+        if dm is None:
+            dm = txn._ptah_fs_blobs = cls(storage, txn)
+        return dm
+
+    def abort(self, txn):
+        # file is kept if other transaction stored it since
+        if self.created:
+            self.storage._remove(self.created.items())
+            self.created.clear()
+
+    tpc_abort = abort
+
+    def tpc_begin(self, txn):
+        pass
+
+    def commit(self, txn):
         pass
 
-    def remove(self, uri): # pragma: no cover
+    def tpc_vote(self, txn):
         pass
 
+    def tpc_finish(self, txn):
+        self.created.clear()
 
-blob_storage = BlobStorage()
+    def sortKey(self):
+        return 'ptah.fsblobs:%d'%id(self)
+
+
+fs_blob_storage = FsBlobStorage()
+
+ptah.register_uri_resolver(
+    'blob-fs', fs_blob_storage.get, batch=fs_blob_storage.get_many)
+
+
+class BlobChunk(Base):
+    """ chunk of :py:class:`ChunkedBlob` data """
+
+    __tablename__ = 'ptah_blob_chunks'
+
+    blob_id = sqla.Column(sqla.Integer, sqla.ForeignKey('ptah_nodes.id'),
+                          primary_key=True, autoincrement=False)
+    seq = sqla.Column(sqla.Integer, primary_key=True, autoincrement=False)
+    data = sqla.Column(sqla.LargeBinary)
+
+
+@implementer(IBlob)
+class ChunkedBlob(BlobMetadata, Node):
+    """ sql blob, data is split into `chunk_size` rows of
+    `ptah_blob_chunks` table. Data is written and read one chunk at a
+    time, see :py:class:`ChunkedBlobFile` """
+
+    __tablename__ = 'ptah_blobs_chunked'
+    __mapper_args__ = {'polymorphic_identity': 'blob-chunked'}
+    __uri_factory__ = ptah.UriFactory('blob-chunked')
+
+    __id__ = sqla.Column('id', sqla.Integer,
+                         sqla.ForeignKey('ptah_nodes.id'), primary_key=True)
+
+    chunk_size = sqla.Column(sqla.Integer, default=SQL_CHUNK_SIZE)
+
+    @property
+    def data(self):
+        return self.read()
+
+    def open(self):
+        return ChunkedBlobFile(self)
+
+    def read(self):
+        if not self.size:
+            return None
+
+        with self.open() as f:
+            return f.read()
+
+    def write(self, data):
+        if isinstance(data, bytes):
+            data = BytesIO(data)
+
+        if not self.chunk_size:
+            self.chunk_size = SQL_CHUNK_SIZE
+        Session.flush()
+
+        table = BlobChunk.__table__
+        Session.execute(table.delete().where(table.c.blob_id == self.__id__))
+
+        seq = [0]
+        def write(chunk):
+            Session.execute(
+                table.insert(),
+                {'blob_id': self.__id__, 'seq': seq[0], 'data': chunk})
+            seq[0] += 1
+
+        self.size, self.hash = copy_stream(data, write, self.chunk_size)
+        mark_changed(Session())
+
+        self.modified = datetime.utcnow()
+
+
+class ChunkedBlobFile(object):
+    """ read-only file-like object for :py:class:`ChunkedBlob`,
+    only one chunk is loaded at a time.
+
+    Chunks are loaded with session of transaction which opened file.
+    When file outlives transaction, e.g. it is read by response
+    `app_iter` after commit, chunks are loaded on separate connection,
+    connection is closed by :py:meth:`close` """
+
+    _sql_chunk = ptah.QueryFreezer(
+        lambda: Session.query(BlobChunk.data)
+            .filter(sqla.sql.and_(
+                BlobChunk.blob_id == sqla.sql.bindparam('id'),
+                BlobChunk.seq == sqla.sql.bindparam('seq'))))
+
+    def __init__(self, blob):
+        self.id = blob.__id__
+        self.size = blob.size or 0
+        self.chunk_size = blob.chunk_size
+        self.closed = False
+
+        self._txn = transaction.get()
+        self._conn = None
+        self._pos = 0
+        self._seq = None
+        self._chunk = b''
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _load(self, seq):
+        if seq != self._seq:
+            if self._txn is transaction.get():
+                row = self._sql_chunk.first(id=self.id, seq=seq)
+            else:
+                if self._conn is None:
+                    self._conn = Session.bind.connect()
+
+                table = BlobChunk.__table__
+                row = self._conn.execute(
+                    sqla.sql.select([table.c.data])
+                    .where(sqla.sql.and_(table.c.blob_id == self.id,
+                                         table.c.seq == seq))).first()
+            self._seq = seq
+            self._chunk = row[0] if row is not None else b''
+        return self._chunk
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = self.size - self._pos
+
+        data = []
+        while size > 0 and self._pos < self.size:
+            seq, offset = divmod(self._pos, self.chunk_size)
+            chunk = self._load(seq)[offset:offset + size]
+            if not chunk:
+                break
+
+            data.append(chunk)
+            self._pos += len(chunk)
+            size -= len(chunk)
+
+        return b''.join(data)
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        if whence == os.SEEK_CUR:
+            offset += self._pos
+        elif whence == os.SEEK_END:
+            offset += self.size
+        self._pos = max(0, offset)
+        return self._pos
+
+    def tell(self):
+        return self._pos
+
+    def close(self):
+        self.closed = True
+        self._chunk = b''
+        self._txn = None
+
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+@implementer(IBlobStorage)
+class ChunkedBlobStorage(object):
+    """ chunked sql blob storage, for large blobs """
+
+    _sql_get = ptah.QueryFreezer(
+        lambda: Session.query(ChunkedBlob)
+            .filter(ChunkedBlob.__uri__ == sqla.sql.bindparam('uri')))
+
+    _sql_get_by_parent = ptah.QueryFreezer(
+        lambda: Session.query(ChunkedBlob)
+            .filter(ChunkedBlob.__parent_uri__ ==
+                    sqla.sql.bindparam('parent')))
+
+    def create(self, parent=None):
+        blob = ChunkedBlob(__parent__=parent)
+        Session.add(blob)
+        Session.flush()
+
+        return blob
+
+    def add(self, data, parent=None, **metadata):
+        data.seek(0)
+        return self.ingest(data, parent, **metadata)
+
+    def ingest(self, fp, parent=None, **metadata):
+        """ Create blob from file-like object, see
+        :py:meth:`BlobStorage.ingest` """
+        blob = self.create(parent)
+        blob.write(fp)
+        blob.updateMetadata(**metadata)
+
+        return blob
+
+    def get(self, uri):
+        """Chunked Blob resolver"""
+        return self._sql_get.first(uri=uri)
+
+    def get_many(self, uris):
+        """Chunked Blob batch resolver"""
+        return dict((blob.__uri__, blob) for blob in
+                    Session.query(ChunkedBlob)
+                    .filter(ChunkedBlob.__uri__.in_(uris)))
+
+    def getByParent(self, parent):
+        return self._sql_get_by_parent.first(parent=parent)
+
+    def replace(self, uri, data, **metadata):
+        blob = self.get(uri)
+        if blob is None:
+            return None
+
+        data.seek(0)
+        blob.write(data)
+        blob.updateMetadata(**metadata)
+        return blob
+
+    def remove(self, uri):
+        blob = self.get(uri)
+        if blob is not None:
+            table = BlobChunk.__table__
+            Session.execute(
+                table.delete().where(table.c.blob_id == blob.__id__))
+            Session.delete(blob)
+            Session.flush()
+
+
+chunked_blob_storage = ChunkedBlobStorage()
+
+ptah.register_uri_resolver(
+    'blob-chunked', chunked_blob_storage.get,
+    batch=chunked_blob_storage.get_many)
+
+
+@ptah.subscriber(ptah.events.SettingsInitializing)
+def initialized(ev):
+    BLOB = ptah.get_settings(ptah.CFG_ID_BLOB, ev.registry)
+    fs_blob_storage.directory = BLOB['fs_path']
+    fs_blob_storage.offload = BLOB['offload']
+    fs_blob_storage.offload_prefix = BLOB['offload_prefix']
+    fs_blob_storage.grace = BLOB['fs_grace']
+
+
+def upgrade_blob_tables():
+    """ Add columns missing in existing blob tables, `hash` and
+    `modified` blob metadata columns are added in 0.2. Returns list
+    of added `table.column` names. """
+    conn = Session.connection()
+    inspector = Inspector.from_engine(conn)
+    names = inspector.get_table_names()
+
+    added = []
+    for table in (Blob.__table__, FsBlob.__table__, ChunkedBlob.__table__):
+        if table.name not in names:
+            continue
+
+        existing = set(
+            col['name'] for col in inspector.get_columns(table.name))
+        columns = [col for col in table.columns if col.name not in existing]
+        for col in columns:
+            conn.execute('ALTER TABLE %s ADD COLUMN %s %s'%(
+                table.name, col.name, col.type.compile(dialect=conn.dialect)))
+            added.append('%s.%s'%(table.name, col.name))
+
+        for index in table.indexes:
+            if any(col.name in index.columns for col in columns):
+                index.create(conn)
+
+    if added:
+        mark_changed(Session())
+        transaction.commit()
+    return added
+
+
+def migrate_sql_blobs(batch=100):
+    """ Move `blob-sql` blobs to filesystem storage. Blobs keep their
+    uris, `blob-sql` resolver loads moved blobs from filesystem storage.
+    Each batch is committed separately. Returns number of moved blobs. """
+    nodes = Node.__table__
+    sql_table = Blob.__table__
+    fs_table = FsBlob.__table__
+
+    count = 0
+    while True:
+        rows = Session.execute(
+            sqla.sql.select([sql_table.c.id, sql_table.c.mimetype,
+                             sql_table.c.filename, sql_table.c.modified,
+                             sql_table.c.data])
+                .order_by(sql_table.c.id).limit(batch)).fetchall()
+        if not rows:
+            break
+
+        values = []
+        for id, mimetype, filename, modified, data in rows:
+            hash, size = fs_blob_storage.store(BytesIO(data or b''))
+            values.append({'id': id, 'mimetype': mimetype,
+                           'filename': filename, 'modified': modified,
+                           'size': size, 'hash': hash})
+
+        ids = [row[0] for row in rows]
+        Session.execute(fs_table.insert(), values)
+        Session.execute(nodes.update()
+                        .where(nodes.c.id.in_(ids)).values(type='blob-fs'))
+        Session.execute(sql_table.delete().where(sql_table.c.id.in_(ids)))
+        mark_changed(Session())
+
+        Session.expunge_all()
+        transaction.commit()
+        count += len(rows)
 
-ptah.register_uri_resolver('blob-sql', blob_storage.get)
+    return count
@@ -0,0 +1,239 @@
+""" bulk content creation """
+from datetime import datetime
+import sqlalchemy as sqla
+from zope.sqlalchemy import mark_changed
+from pyramid.compat import string_types
+from pyramid.threadlocal import get_current_registry
+
+import ptah
+from ptah.form import null, Invalid
+from ptah.cms.node import Node, Session
+from ptah.cms.content import BaseContent
+from ptah.cms.container import BaseContainer, POSITION_GAP
+from ptah.cms.interfaces import NotFound, Error
+
+BULK_BATCH = 500
+
+# content attributes which are not in type fieldset
+CONTENT_ATTRS = ('view', 'effective', 'expires', 'creators', 'subjects',
+                 'publisher', 'contributors')
+
+
+class BulkResult(object):
+    """ Result of :py:func:`bulk_create`
+
+    .. attribute:: created
+
+       List of uris of created content
+
+    .. attribute:: conflicts
+
+       List of names which already exist in container or are repeated
+       in records
+
+    .. attribute:: errors
+
+       List of (name, errors) of records which failed validation,
+       `errors` is a dict of field name and error message
+    """
+
+    def __init__(self):
+        self.created = []
+        self.conflicts = []
+        self.errors = []
+
+    def __len__(self):
+        return len(self.created)
+
+
+def _column_default(column):
+    default = column.default
+    if default is not None and default.is_scalar:
+        return default.arg
+    return None
+
+
+class BulkTable(object):
+    """ Insert statement of one mapped table of content type """
+
+    def __init__(self, mapper, table):
+        self.table = table
+        self.pk = list(table.primary_key)[0]
+        self.columns = []
+        for column in table.columns:
+            if column.primary_key:
+                continue
+            try:
+                prop = mapper.get_property_by_column(column)
+            except sqla.orm.exc.UnmappedColumnError: # pragma: no cover
+                continue
+            self.columns.append((prop.key, column))
+
+    def rows(self, items, pk=True):
+        # executemany requires same keys in all rows, columns without
+        # values are left to column defaults
+        columns = [(key, column) for key, column in self.columns
+                   if any(key in item for item in items)]
+
+        rows = []
+        for item in items:
+            row = {self.pk.name: item['__id__']} if pk else {}
+            for key, column in columns:
+                row[column.name] = item[key] if key in item \
+                    else _column_default(column)
+            rows.append(row)
+        return rows
+
+    def insert(self, items, pk=True):
+        Session.execute(self.table.insert(), self.rows(items, pk))
+
+
+def _validate(fieldset, record):
+    data = {}
+    errors = {}
+    for field in fieldset.fields():
+        value = record.get(field.name, null)
+        if value is null or value is None:
+            value = field.default
+        if value is null:
+            value = field.missing
+        try:
+            field.validate(value)
+        except Invalid as e:
+            errors[field.name] = e.msg
+        else:
+            data[field.name] = value
+
+    if not errors:
+        try:
+            fieldset.validate(data)
+        except Invalid as e:
+            errors[getattr(e.field, 'name', '')] = e.msg
+    return data, errors
+
+
+def bulk_create(container, type, records, batch=BULK_BATCH):
+    """ Create content of `type` in `container` with set-based inserts.
+
+    Permission is checked once, records are validated against type
+    fieldset, `__uri__`, `__name__` and `__path__` are computed in
+    python and `ptah_nodes`, `ptah_content` and type table rows are
+    inserted with executemany, `batch` records at a time. Records with
+    names which already exist or fail validation are skipped and
+    reported in result. ORM events are not sent,
+    :py:class:`ptah.events.ContentsAddedEvent` is sent for each batch.
+
+    :param container: :py:class:`ptah.cms.BaseContainer`
+    :param type: :py:class:`ptah.cms.TypeInformation` or type uri
+    :param records: Iterable of dicts, `__name__` key is required, type
+        fieldset fields and content attributes (`view`, `effective`,
+        `expires`, `creators`, `subjects`, `publisher`, `contributors`)
+        are copied, other keys are ignored
+    :param batch: Number of records inserted with one statement
+    :returns: :py:class:`BulkResult`
+    """
+    if not isinstance(container, BaseContainer):
+        raise Error("Container is required")
+
+    tinfo = ptah.resolve(type) if isinstance(type, string_types) else type
+    if tinfo is None:
+        raise NotFound('Type information is not found')
+
+    tinfo.check_context(container)
+
+    Session.flush()
+
+    cls = tinfo.cls
+    mapper = sqla.orm.class_mapper(cls)
+
+    # ptah_nodes, ptah_content, then type tables
+    tables = []
+    for m in list(mapper.iterate_to_root())[::-1]:
+        if m.local_table not in [t.table for t in tables]:
+            tables.append(BulkTable(mapper, m.local_table))
+
+    now = datetime.utcnow()
+    owner = ptah.auth_service.get_userid()
+    defaults = {'__type_id__': tinfo.__uri__,
+                '__parent_uri__': container.__uri__,
+                'created': now, 'modified': now}
+    if owner:
+        defaults['__owner__'] = owner
+
+    position = container._next_position() if container.__ordered__ else None
+
+    result = BulkResult()
+    seen = set()
+    registry = get_current_registry()
+
+    def insert(items):
+        names = [item['__name__'] for item in items]
+        existing = set(name for name, in Session.query(BaseContent.__name_id__)
+                       .filter(BaseContent.__parent_uri__ == container.__uri__)
+                       .filter(BaseContent.__name_id__.in_(names)))
+        if existing:
+            result.conflicts.extend(n for n in names if n in existing)
+            items = [item for item in items
+                     if item['__name__'] not in existing]
+        if not items:
+            return
+
+        tables[0].insert(items, pk=False)
+
+        uris = [item['__uri__'] for item in items]
+        ids = dict(Session.query(Node.__uri__, Node.__id__)
+                   .filter(Node.__uri__.in_(uris)))
+        for item in items:
+            item['__id__'] = ids[item['__uri__']]
+
+        for table in tables[1:]:
+            table.insert(items)
+
+        mark_changed(Session())
+        result.created.extend(uris)
+        registry.notify(
+            ptah.events.ContentsAddedEvent(container, tinfo, items))
+
+    items = []
+    for record in records:
+        name = record.get('__name__')
+        if not name or '/' in name or name.startswith(' '):
+            result.errors.append((name, {'__name__': 'Invalid name'}))
+            continue
+
+        if name in seen:
+            result.conflicts.append(name)
+            continue
+
+        data, errors = _validate(tinfo.fieldset, record)
+        if errors:
+            result.errors.append((name, errors))
+            continue
+
+        seen.add(name)
+        item = dict((key, record[key]) for key in CONTENT_ATTRS
+                    if key in record)
+        # missing values are left to column defaults
+        item.update((key, value) for key, value in data.items()
+                    if value is not None and value is not null
+                    and not key.startswith('_'))
+        item.update(defaults)
+        item['__name__'] = name
+        item['__uri__'] = cls.__uri_factory__()
+        item['__name_id__'] = name
+        item['__path__'] = '%s%s/'%(container.__path__, name)
+        if position is not None:
+            item['__position__'] = position
+            position += POSITION_GAP
+        items.append(item)
+
+        if len(items) >= batch:
+            insert(items)
+            items = []
+
+    if items:
+        insert(items)
+
+    container._v_keys = container._v_keyset = None
+    container._v_keys_loaded = False
+    return result
@@ -1,21 +1,35 @@
 """ Base container class implementation """
 import sqlalchemy as sqla
 from zope.interface import implementer
+from zope.sqlalchemy import mark_changed
 from pyramid.compat import string_types
 from pyramid.threadlocal import get_current_registry
 
 import ptah
-from ptah.cms.node import Session, load_parents
-from ptah.cms.content import Content, BaseContent
+from ptah.cms.node import Node, Session, load_parents
+from ptah.cms.content import Content, BaseContent, NULL_POSITION
 from ptah.cms.security import action
 from ptah.cms.permissions import DeleteContent
-from ptah.cms.interfaces import IContent, IContainer, NotFound, Error
+from ptah.cms.interfaces import IContent, IContainer
+from ptah.cms.interfaces import NotFound, Forbidden, Error
+
+DELETE_BATCH = 500
+POSITION_GAP = 1024
 
 
 class BaseContainer(BaseContent):
-    """ Content container implementation. """
+    """ Content container implementation.
+
+    .. attribute:: __ordered__
+
+       Keep children in manual order, children are ordered by
+       `__position__`. Default is `False`.
+    """
+
+    __ordered__ = False
 
     _v_keys = None
+    _v_keyset = None
     _v_keys_loaded = False
     _v_items = None
 
@@ -25,16 +39,56 @@ class BaseContainer(BaseContent):
 
     _sql_values = ptah.QueryFreezer(
         lambda: Session.query(BaseContent)
+            .options(sqla.orm.undefer_group('json'))
             .filter(BaseContent.__parent_uri__ == sqla.sql.bindparam('uri')))
 
+    _sql_keys_ordered = ptah.QueryFreezer(
+        lambda: Session.query(BaseContent.__name_id__)
+            .filter(BaseContent.__parent_uri__ == sqla.sql.bindparam('uri'))
+            .order_by(BaseContent.__position__, BaseContent.__id__))
+
+    _sql_values_ordered = ptah.QueryFreezer(
+        lambda: Session.query(BaseContent)
+            .options(sqla.orm.undefer_group('json'))
+            .filter(BaseContent.__parent_uri__ == sqla.sql.bindparam('uri'))
+            .order_by(BaseContent.__position__, BaseContent.__id__))
+
+    _sql_max_position = ptah.QueryFreezer(
+        lambda: Session.query(sqla.func.max(BaseContent.__position__))
+            .filter(BaseContent.__parent_uri__ == sqla.sql.bindparam('uri')))
+
+    _sql_count = ptah.QueryFreezer(
+        lambda: Session.query(sqla.func.count(BaseContent.__id__))
+            .filter(BaseContent.__parent_uri__ == sqla.sql.bindparam('uri')))
+
+    _sql_contains = ptah.QueryFreezer(
+        lambda: Session.query(sqla.sql.exists(
+            Session.query(BaseContent.__id__)
+                .filter(BaseContent.__parent_uri__ ==
+                        sqla.sql.bindparam('parent'))
+                .filter(BaseContent.__name_id__ ==
+                        sqla.sql.bindparam('key')).statement)))
+
     def keys(self):
         """Return an list of the keys in the container."""
         if self._v_keys_loaded:
             return self._v_keys
         else:
             if self._v_keys is None:
-                self._v_keys = [n for n, in
-                                self._sql_keys.all(uri=self.__uri__)]
+                query = self._sql_keys_ordered if self.__ordered__ \
+                    else self._sql_keys
+                keys = [n for n, in query.all(uri=self.__uri__)]
+                keyset = set(keys)
+
+                # not flushed items
+                if self._v_items:
+                    for name in self._v_items:
+                        if name not in keyset:
+                            keys.append(name)
+                            keyset.add(name)
+
+                self._v_keys = keys
+                self._v_keyset = keyset
 
             self._v_keys_loaded = True
             return self._v_keys
@@ -61,7 +115,7 @@ class BaseContainer(BaseContent):
 
         if self._v_keys_loaded and self._v_items:
             if len(self._v_items) == len(self._v_keys):
-                return self._v_items.values()
+                return [self._v_items[key] for key in self._v_keys]
 
         values = []
         old_items = self._v_items
@@ -69,7 +123,10 @@ class BaseContainer(BaseContent):
         self._v_keys = keys = []
         self._v_items = items = {}
 
-        for item in self._sql_values.all(uri = self.__uri__):
+        query = self._sql_values_ordered if self.__ordered__ \
+            else self._sql_values
+
+        for item in query.all(uri = self.__uri__):
             item.__parent__ = self
             items[item.__name__] = item
             keys.append(item.__name__)
@@ -82,6 +139,7 @@ class BaseContainer(BaseContent):
                     items[name] = item
                     values.append(item)
 
+        self._v_keyset = set(keys)
         return values
 
     def items(self):
@@ -89,9 +147,212 @@ class BaseContainer(BaseContent):
         for item in self.values():
             yield item.__name__, item
 
+    _sql_pages = {}
+
+    def page(self, limit=100, order_by=None, after=None,
+             queries=_sql_pages):
+        """Return page of container children ordered by `order_by`
+        content attribute. Children are not stored in container caches.
+
+        :param limit: Page size
+        :param order_by: Name of content column attribute, column values
+           has to be not null. Default is
+           `__position__` for ordered container and `__name__` for others.
+        :param after: Keyset marker of previous page
+        :returns: Tuple of list of children and keyset marker of next page,
+           marker is `None` for last page.
+        """
+        if order_by is None:
+            order_by = '__position__' if self.__ordered__ else '__name__'
+        if order_by == '__name__':
+            order_by = '__name_id__'
+
+        column = getattr(BaseContent, order_by, None)
+        if not isinstance(column, sqla.orm.attributes.QueryableAttribute):
+            raise ValueError(order_by)
+
+        # limit is applied to frozen statement, it is not part of key
+        key = (order_by, after is not None)
+        if key not in queries:
+            def builder(column=column, keyset=after is not None):
+                query = Session.query(BaseContent)\
+                    .options(sqla.orm.undefer_group('json'))\
+                    .filter(BaseContent.__parent_uri__ ==
+                            sqla.sql.bindparam('uri'))
+                if keyset:
+                    value = sqla.sql.bindparam('value')
+                    query = query.filter(sqla.sql.or_(
+                        column > value,
+                        sqla.sql.and_(
+                            column == value,
+                            BaseContent.__id__ > sqla.sql.bindparam('id'))))
+                return query.order_by(column, BaseContent.__id__)
+
+            queries[key] = ptah.QueryFreezer(builder)
+
+        # flush pending children
+        Session.flush()
+
+        params = {'uri': self.__uri__}
+        if after is not None:
+            params['value'], params['id'] = after
+
+        query = queries[key]
+        items = list(query.execute(query.compile().stmt.limit(limit), params))
+        for item in items:
+            item.__parent__ = self
+
+        if len(items) < limit:
+            return items, None
+
+        last = items[-1]
+        return items, (getattr(last, order_by), last.__id__)
+
+    def iter_values(self, batch_size=100, order_by=None, after=None):
+        """Iterate over container children. Children are loaded with
+        keyset paginated queries, `batch_size` children at once.
+        See :py:meth:`page` for parameters description."""
+        while True:
+            items, after = self.page(batch_size, order_by, after)
+            for item in items:
+                yield item
+
+            if after is None:
+                break
+
     def __contains__(self, key):
         """Tell if a key exists in the mapping."""
-        return key in self.keys()
+        if self._v_items and key in self._v_items:
+            return True
+
+        if self._v_keys_loaded:
+            return key in self._v_keyset
+
+        return self._sql_contains.first(key=key, parent=self.__uri__)[0]
+
+    def __len__(self):
+        """Number of items in the container."""
+        if self._v_keys_loaded:
+            return len(self._v_keys)
+
+        # flush pending children
+        Session.flush()
+        return self._sql_count.first(uri=self.__uri__)[0]
+
+    def _next_position(self):
+        position = self._sql_max_position.first(uri=self.__uri__)[0]
+        if self._v_items:
+            for item in self._v_items.values():
+                if item.__position__ is not None and \
+                        (position is None or item.__position__ > position):
+                    position = item.__position__
+
+        if position is None or position == NULL_POSITION:
+            return POSITION_GAP
+        return position + POSITION_GAP
+
+    def move_to(self, key, index):
+        """Move item to `index` position in ordered container. Item gets
+        position between its new neighbours, all children are renumbered
+        only if there is no free position between them."""
+        if not self.__ordered__:
+            raise Error("Container is not ordered.")
+
+        item = self[key]
+        Session.flush()
+
+        index = max(min(index, len(self) - 1), 0)
+
+        query = Session.query(BaseContent.__position__)\
+            .filter(BaseContent.__parent_uri__ == self.__uri__)\
+            .filter(BaseContent.__id__ != item.__id__)\
+            .order_by(BaseContent.__position__, BaseContent.__id__)
+
+        edge = object()
+        if index:
+            neighbours = [p for p, in query.offset(index - 1).limit(2)]
+        else:
+            neighbours = [edge] + [p for p, in query.limit(1)]
+        neighbours.append(edge)
+        before, after = neighbours[:2]
+
+        if NULL_POSITION in (before, after):
+            # children without position
+            position = None
+        elif before is edge:
+            position = POSITION_GAP if after is edge else after - POSITION_GAP
+        elif after is edge:
+            position = before + POSITION_GAP
+        elif after - before > 1:
+            position = (before + after) // 2
+        else:
+            position = None
+
+        if position is None:
+            keys = [n for n, in Session.query(BaseContent.__name_id__)
+                    .filter(BaseContent.__parent_uri__ == self.__uri__)
+                    .filter(BaseContent.__id__ != item.__id__)
+                    .order_by(BaseContent.__position__, BaseContent.__id__)]
+            keys.insert(index, item.__name__)
+            self.reorder(keys)
+        else:
+            item.__position__ = position
+            Session.flush()
+            self._v_keys = self._v_keyset = None
+            self._v_keys_loaded = False
+
+    def reorder(self, keys):
+        """Set order of items in ordered container, items which are not
+        in `keys` are placed after them in current order."""
+        if not self.__ordered__:
+            raise Error("Container is not ordered.")
+
+        Session.flush()
+
+        rows = Session.query(BaseContent.__id__, BaseContent.__name_id__)\
+            .filter(BaseContent.__parent_uri__ == self.__uri__)\
+            .order_by(BaseContent.__position__, BaseContent.__id__).all()
+        ids = dict((name, id) for id, name in rows)
+
+        order = []
+        for key in keys:
+            if key not in ids:
+                raise KeyError(key)
+            if key not in order:
+                order.append(key)
+
+        seen = set(order)
+        order.extend(name for id, name in rows if name not in seen)
+
+        positions = dict((ids[name], (idx + 1) * POSITION_GAP)
+                         for idx, name in enumerate(order))
+        if not positions:
+            return
+
+        table = BaseContent.__table__
+        Session.execute(
+            table.update()
+                .where(table.c.id == sqla.sql.bindparam('_id'))
+                .values(position = sqla.sql.bindparam('_position')),
+            [{'_id': id, '_position': position}
+             for id, position in positions.items()])
+        mark_changed(Session())
+
+        for ob in Session.identity_map.values():
+            if isinstance(ob, BaseContent):
+                id = ob.__dict__.get('__id__')
+                if id in positions:
+                    sqla.orm.attributes.set_committed_value(
+                        ob, '__position__', positions[id])
+
+        self._v_keys = self._v_keyset = None
+        self._v_keys_loaded = False
+
+    def __bool__(self):
+        # container is true even if it is empty
+        return True
+
+    __nonzero__ = __bool__
 
     def __getitem__(self, key):
         """Get a value for a key
@@ -126,18 +387,26 @@ class BaseContainer(BaseContent):
         if item.__uri__ in parents:
             raise TypeError("Can't itself to chidlren")
 
-        if key in self.keys():
+        if key in self:
             raise KeyError(key)
 
+        oldpath = item.__path__
+        newpath = '%s%s/'%(self.__path__, key)
+
+        if self.__ordered__ and (
+                item.__parent_uri__ != self.__uri__ or
+                item.__position__ in (None, NULL_POSITION)):
+            item.__position__ = self._next_position()
+
         if item.__parent_uri__ is None:
             event = ptah.events.ContentAddedEvent(item)
         else:
-            event = ptah.events.ContentMovedEvent(item)
+            event = ptah.events.ContentMovedEvent(item, oldpath, newpath)
 
         item.__name__ = key
         item.__parent__ = self
         item.__parent_uri__ = self.__uri__
-        item.__path__ = '%s%s/'%(self.__path__, key)
+        item.__path__ = newpath
 
         if item not in Session:
             Session.add(item)
@@ -148,8 +417,9 @@ class BaseContainer(BaseContent):
         else:
             self._v_items[key] = item
 
-        if key not in self._v_keys:
+        if self._v_keys is not None and key not in self._v_keyset:
             self._v_keys.append(key)
+            self._v_keyset.add(key)
 
         # recursevly update children paths
         def update_path(container):
@@ -161,9 +431,12 @@ class BaseContainer(BaseContent):
                     update_path(item)
 
         if isinstance(item, BaseContainer):
-            update_path(item)
+            if oldpath and oldpath != newpath:
+                move_subtree(oldpath, newpath)
+            else:
+                update_path(item)
 
-        get_current_registry().notify(event)
+        ptah.events.notify(event)
 
     def __delitem__(self, item, flush=True):
         """Delete a value from the container using the key."""
@@ -172,16 +445,36 @@ class BaseContainer(BaseContent):
             item = self[item]
 
         if item.__parent_uri__ == self.__uri__:
+            self._delete_items([item], flush)
+            return
+
+        raise KeyError(item)
+
+    def _delete_items(self, items, flush=True):
+        registry = get_current_registry()
+
+        paths = []
+        for item in items:
             if isinstance(item, BaseContainer):
-                for key in item.keys():
-                    item.__delitem__(key, False)
+                if item.__path__:
+                    paths.append(item.__path__)
+                else:
+                    for key in item.keys():
+                        item.__delitem__(key, False)
 
-            get_current_registry().notify(
-                ptah.events.ContentDeletingEvent(item))
+            registry.notify(ptah.events.ContentDeletingEvent(item))
 
+        uris = [item.__uri__ for item in items]
+        if paths:
+            delete_subtrees(paths, uris)
+        else:
+            registry.notify(ptah.events.ContentsDeletingEvent(uris))
+
+        for item in items:
             name = item.__name__
             if self._v_keys:
                 self._v_keys.remove(name)
+                self._v_keyset.discard(name)
             if self._v_items and name in self._v_items:
                 del self._v_items[name]
 
@@ -193,10 +486,6 @@ class BaseContainer(BaseContent):
                 except:
                     pass
 
-            return
-
-        raise KeyError(item)
-
     @action
     def create(self, tname, name, **params):
         tinfo = ptah.resolve(tname)
@@ -222,8 +511,16 @@ class BaseContainer(BaseContent):
 
     @action(permission=DeleteContent)
     def batchdelete(self, uris):
-        """Batch delete"""
-        raise NotImplements() # pragma: no cover
+        """Batch delete, delete container items by uris """
+        items = [item for item in ptah.resolve_many(uris).values()
+                 if item is not None and item.__parent_uri__ == self.__uri__]
+        for item in items:
+            item.__parent__ = self
+            if not ptah.check_permission(DeleteContent, item):
+                raise Forbidden()
+
+        if items:
+            self._delete_items(items)
 
     def info(self):
         info = super(BaseContainer, self).info()
@@ -231,6 +528,104 @@ class BaseContainer(BaseContent):
         return info
 
 
+def subtree_clause(path):
+    """ Sql clause for all content below `path`. Prefix is compared
+    with `substr()`, `LIKE` ignores case on some databases """
+    column = BaseContent.__path__
+    return sqla.sql.and_(
+        column > path,
+        sqla.func.substr(column, 1, len(path)) == path)
+
+
+def move_subtree(oldpath, newpath):
+    """ Change path prefix of all content in subtree with one
+    UPDATE statement, loaded content objects get new path as well """
+    Session.flush()
+
+    path = BaseContent.__path__
+    Session.execute(
+        BaseContent.__table__.update()
+            .where(subtree_clause(oldpath))
+            .values({path: sqla.sql.literal(newpath, sqla.Unicode) +
+                           sqla.func.substr(path, len(oldpath) + 1)}))
+    mark_changed(Session())
+
+    for ob in Session.identity_map.values():
+        if isinstance(ob, BaseContent):
+            obpath = ob.__dict__.get('__path__')
+            if obpath and obpath != oldpath and obpath.startswith(oldpath):
+                sqla.orm.attributes.set_committed_value(
+                    ob, '__path__', newpath + obpath[len(oldpath):])
+
+
+def delete_subtrees(paths, uris=()):
+    """ Delete all content below `paths` with set-based statements.
+    :py:class:`ptah.events.ContentsDeletingEvent` is sent once
+    with `uris` and uris of all deleted content. """
+    Session.flush()
+
+    node = Node.__table__
+    content = BaseContent.__table__
+    rows = Session.query(
+        BaseContent.__id__, BaseContent.__uri__, BaseContent.__type_id__)\
+        .filter(sqla.sql.or_(*[subtree_clause(path) for path in paths]))\
+        .all()
+
+    get_current_registry().notify(ptah.events.ContentsDeletingEvent(
+        list(uris) + [uri for _id, uri, _type in rows]))
+
+    if not rows:
+        return
+
+    # type tables, then content and nodes
+    types = {}
+    for id, uri, tp in rows:
+        types.setdefault(tp, []).append(id)
+
+    tables = []
+    polymorphic = Node.__mapper__.polymorphic_map
+    for tp, ids in types.items():
+        if tp in polymorphic:
+            for mapper in polymorphic[tp].iterate_to_root():
+                table = mapper.local_table
+                if table is not node and table is not content:
+                    tables.append((table, ids))
+
+    ids = [id for id, _uri, _type in rows]
+    tables.extend(((content, ids), (node, ids)))
+
+    # nodes which are not content (blobs, etc) lose parent,
+    # same as orm delete of parent
+    parents = list(uris) + [uri for _id, uri, _type in rows]
+    for idx in range(0, len(parents), DELETE_BATCH):
+        Session.execute(node.update().where(
+            node.c.parent.in_(parents[idx:idx+DELETE_BATCH]))
+            .values(parent=None))
+
+    for table, ids in tables:
+        pk = list(table.primary_key)[0]
+        for idx in range(0, len(ids), DELETE_BATCH):
+            Session.execute(table.delete().where(
+                pk.in_(ids[idx:idx+DELETE_BATCH])))
+    mark_changed(Session())
+
+    # remove deleted content from session
+    ids = set(id for id, _uri, _type in rows)
+    parents = set(parents)
+    for ob in list(Session.identity_map.values()):
+        if isinstance(ob, Node):
+            if ob.__dict__.get('__id__') in ids:
+                Session.expunge(ob)
+                continue
+            if ob.__dict__.get('__parent_uri__') in parents:
+                sqla.orm.attributes.set_committed_value(
+                    ob, '__parent_uri__', None)
+                if '__parent_ref__' in ob.__dict__:
+                    Session.expire(ob, ['__parent_ref__'])
+            if '__children__' in ob.__dict__:
+                Session.expire(ob, ['__children__'])
+
+
 @implementer(IContainer)
 class Container(BaseContainer, Content):
     """ container for content, it just for inheritance """
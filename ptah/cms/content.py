@@ -4,7 +4,6 @@ from sqlalchemy.ext.hybrid import hybrid_property
 from datetime import datetime
 from zope.interface import implementer
 from pyramid.compat import text_type
-from pyramid.threadlocal import get_current_registry
 
 import ptah
 from ptah.cms.node import Node, Session
@@ -12,6 +11,12 @@ from ptah.cms.interfaces import Error, IContent
 from ptah.cms.security import action
 from ptah.cms.permissions import DeleteContent, ModifyContent
 
+#: position of content outside of ordered container, it is ordered first
+NULL_POSITION = -2 ** 31
+
+#: deferred json list attributes of content, 'json' column group
+JSON_LISTS = ('creators', 'subjects', 'contributors')
+
 
 class BaseContent(Node):
     """ Base class for content objects. A content class should inherit from
@@ -29,6 +34,11 @@ class BaseContent(Node):
        This is the identifier in a container if you are using containment and
        hierarchies.
 
+    .. attribute:: __position__
+
+       Position of content in ordered container, see
+       :py:meth:`ptah.cms.BaseContainer.move_to`.
+
     .. attribute:: title
 
        Content title which is editable by end user.
@@ -90,8 +100,11 @@ class BaseContent(Node):
 
     __id__ = sqla.Column('id', sqla.Integer,
                          sqla.ForeignKey('ptah_nodes.id'), primary_key=True)
-    __path__ = sqla.Column('path', sqla.Unicode, default=text_type(''))
-    __name_id__ = sqla.Column('name', sqla.Unicode(255))
+    __path__ = sqla.Column('path', sqla.Unicode, default=text_type(''),
+                           index=True)
+    __name_id__ = sqla.Column('name', sqla.Unicode(255), index=True)
+    __position__ = sqla.Column('position', sqla.Integer, index=True,
+                               nullable=False, default=NULL_POSITION)
 
     title = sqla.Column(sqla.Unicode, default=text_type(''))
     description = sqla.Column(sqla.Unicode, default=text_type(''),
@@ -99,14 +112,19 @@ class BaseContent(Node):
     view = sqla.Column(sqla.Unicode, default=text_type(''))
 
     created = sqla.Column(sqla.DateTime)
-    modified = sqla.Column(sqla.DateTime)
-    effective = sqla.Column(sqla.DateTime)
-    expires = sqla.Column(sqla.DateTime)
-
-    creators = sqla.Column(ptah.JsonListType(), default=[])
-    subjects = sqla.Column(ptah.JsonListType(), default=[])
+    modified = sqla.Column(sqla.DateTime, index=True)
+    effective = sqla.Column(sqla.DateTime, index=True)
+    expires = sqla.Column(sqla.DateTime, index=True)
+
+    # json lists are loaded and decoded on first access, bulk loads
+    # undefer 'json' group or use load_json_lists()
+    creators = sqla.orm.deferred(
+        sqla.Column(ptah.JsonListType(), default=[]), group='json')
+    subjects = sqla.orm.deferred(
+        sqla.Column(ptah.JsonListType(), default=[]), group='json')
     publisher = sqla.Column(sqla.Unicode, default=text_type(''))
-    contributors = sqla.Column(ptah.JsonListType(), default=[])
+    contributors = sqla.orm.deferred(
+        sqla.Column(ptah.JsonListType(), default=[]), group='json')
 
     # sql queries
     _sql_get = ptah.QueryFreezer(
@@ -122,6 +140,8 @@ class BaseContent(Node):
         lambda: Session.query(BaseContent)
             .filter(BaseContent.__uri__ == sqla.sql.bindparam('parent')))
 
+    _parents_queries = {}
+
     def __init__(self, **kw):
         super(BaseContent, self).__init__(**kw)
 
@@ -140,6 +160,42 @@ class BaseContent(Node):
         return '%s%s'%(request.root.__root_path__,
                        self.__path__[len(request.root.__path__):])
 
+    def _load_parents(self, queries=_parents_queries):
+        """ Load all parents with one query, parents are selected
+        by prefixes of content `__path__` """
+        if self.__parent_uri__ is None or not self.__path__:
+            return False
+
+        paths = {}
+        current = '/'
+        for idx, sec in enumerate(self.__path__.split('/')[1:-2]):
+            current = '%s%s/'%(current, sec)
+            paths[str(idx)] = current
+
+        idx = len(paths)
+        if not idx:
+            return False
+
+        if idx not in queries:
+            bindparams = [sqla.sql.bindparam(str(p)) for p in range(idx)]
+
+            queries[idx] = ptah.QueryFreezer(
+                lambda: Session.query(BaseContent)
+                    .filter(BaseContent.__path__.in_(bindparams))
+                    .order_by(sqla.sql.desc(BaseContent.__path__)))
+
+        child = self
+        for parent in queries[idx].all(**paths):
+            if parent.__uri__ != child.__parent_uri__:
+                break
+
+            child.__parent__ = parent
+            if parent.__parent__ is not None:
+                break
+            child = parent
+
+        return self.__parent__ is not None
+
     @action(permission=DeleteContent)
     def delete(self):
         parent = self.__parent__
@@ -161,8 +217,8 @@ class BaseContent(Node):
                 if val is not ptah.form.null:
                     setattr(self, field.name, val)
 
-            get_current_registry().notify(
-                ptah.events.ContentModifiedEvent(self))
+            self.modified = datetime.utcnow()
+            ptah.events.notify(ptah.events.ContentModifiedEvent(self))
 
     def _extra_info(self, info):
         if self.__type__:
@@ -178,6 +234,9 @@ class BaseContent(Node):
         info['expires'] = self.expires
 
     def info(self):
+        if self.__type__ and self.__type__.cls is self.__class__:
+            return self.__type__.serializer(self)
+
         info = super(BaseContent, self).info()
         info['__name__'] = self.__name__
         info['__content__'] = True
@@ -191,6 +250,21 @@ class Content(BaseContent):
     """ Content """
 
 
+def load_json_lists(items):
+    """ Load deferred json lists of persistent `items` with one query """
+    ids = []
+    for item in items:
+        state = sqla.orm.attributes.instance_state(item)
+        if state.key is not None and \
+                any(name in state.unloaded for name in JSON_LISTS):
+            ids.append(item.__id__)
+
+    if ids:
+        Session.query(BaseContent)\
+            .options(sqla.orm.undefer_group('json'))\
+            .filter(BaseContent.__id__.in_(ids)).all()
+
+
 @ptah.subscriber(ptah.events.ContentCreatedEvent)
 def content_created_handler(ev):
     """ Assigns created, modified, __owner__
@@ -89,6 +89,13 @@ class IBlob(INode):
     mimetype = interface.Attribute('Blob mimetype')
     filename = interface.Attribute('Original filename')
     data = interface.Attribute('Blob data')
+    size = interface.Attribute('Blob data size')
+    hash = interface.Attribute('SHA-256 hash of blob data')
+    modified = interface.Attribute('Blob data modification time')
+    etag = interface.Attribute('Strong entity tag of blob data')
+
+    def open():
+        """ return file-like object for reading blob data """
 
 
 class IBlobStorage(interface.Interface):
@@ -97,6 +104,9 @@ class IBlobStorage(interface.Interface):
     def add(parent, data, mimetype=None, filename=None):
         """ add blob return uri """
 
+    def ingest(fp, parent=None, mimetype=None, filename=None):
+        """ create blob from file-like object, data is copied in chunks """
+
     def query(uri):
         """ return blob object """
 
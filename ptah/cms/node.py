@@ -61,17 +61,19 @@ class Node(Base):
     __tablename__ = 'ptah_nodes'
 
     __id__ = sqla.Column('id', sqla.Integer, primary_key=True)
-    __type_id__ = sqla.Column('type', sqla.String, info={'uri':True})
+    __type_id__ = sqla.Column('type', sqla.String, index=True,
+                              info={'uri':True})
     __type__ = None
 
     __uri__ = sqla.Column('uri', sqla.String, unique=True,
                           nullable=False, info={'uri':True})
     __parent_uri__ = sqla.Column('parent',
                                  sqla.String,sqla.ForeignKey(__uri__),
-                                 info={'uri': True})
+                                 index=True, info={'uri': True})
 
     __owner__ = sqla.Column('owner',
-                            sqla.String, default=text_type(''), info={'uri':True})
+                            sqla.String, default=text_type(''), index=True,
+                            info={'uri':True})
     __local_roles__ = sqla.Column('roles', ptah.JsonDictType(), default={})
     __acls__ = sqla.Column('acls', ptah.JsonListType(), default=[])
 
@@ -114,6 +116,11 @@ class Node(Base):
 
         return info
 
+    def _load_parents(self):
+        """ Load and initialize `__parent__` attributes of all parents
+        at once. Returns `True` if `__parent__` is loaded. """
+        return False
+
 
 def load(uri, permission=None):
     """ Load node by `uri` and initialize __parent__ attributes. Also checks
@@ -151,7 +158,8 @@ def load_parents(node):
         if not isinstance(parent, Node):
             break
 
-        if parent.__parent__ is None:
+        if parent.__parent__ is None and not parent._load_parents() \
+                and parent.__parent_uri__ is not None:
             parent.__parent__ = parent.__parent_ref__
 
         parent = parent.__parent__
@@ -0,0 +1,196 @@
+""" declarative content queries """
+import sqlalchemy as sqla
+from pyramid.compat import string_types
+
+import ptah
+from ptah.cms.node import Session
+from ptah.cms.content import BaseContent
+
+ORDER = {
+    'id': BaseContent.__id__,
+    'title': BaseContent.title,
+    'position': BaseContent.__position__,
+    'created': BaseContent.created,
+    'modified': BaseContent.modified,
+    'effective': BaseContent.effective,
+    }
+
+
+CRITERIA = {
+    'type': lambda: BaseContent.__type_id__ == sqla.sql.bindparam('type'),
+    'parent': lambda: (BaseContent.__parent_uri__ ==
+                       sqla.sql.bindparam('parent')),
+    # prefix is compared with substr(), LIKE ignores case on some databases
+    'path': lambda: sqla.sql.and_(
+        BaseContent.__path__ > sqla.sql.bindparam('path'),
+        sqla.func.substr(BaseContent.__path__, 1,
+                         sqla.func.length(sqla.sql.bindparam('path'))) ==
+        sqla.sql.bindparam('path')),
+    'owner': lambda: BaseContent.__owner__ == sqla.sql.bindparam('owner'),
+    'modified_after': lambda: (BaseContent.modified >=
+                               sqla.sql.bindparam('modified_after')),
+    'modified_before': lambda: (BaseContent.modified <
+                                sqla.sql.bindparam('modified_before')),
+    'effective': lambda: sqla.sql.and_(
+        sqla.sql.or_(BaseContent.effective == None,
+                     BaseContent.effective <= sqla.sql.bindparam('effective')),
+        sqla.sql.or_(BaseContent.expires == None,
+                     BaseContent.expires > sqla.sql.bindparam('effective'))),
+    }
+
+
+class PagedQueryFreezer(ptah.QueryFreezer):
+    """ :py:class:`ptah.QueryFreezer` with `offset` and `limit`
+    applied to frozen statement """
+
+    def iter(self, offset=0, limit=None, **params):
+        stmt = self.compile().stmt
+        if offset:
+            stmt = stmt.offset(offset)
+        if limit is not None:
+            stmt = stmt.limit(limit)
+
+        return self.execute(stmt, params)
+
+
+class CompiledQuery(object):
+    """ Frozen statements for one criteria shape """
+
+    def __init__(self, criteria, order, reverse):
+        self.criteria = criteria
+        self.order = order
+        self.reverse = reverse
+
+        self.uris = PagedQueryFreezer(self.build_uris)
+        self.count = ptah.QueryFreezer(self.build_count)
+
+    def filter(self, query):
+        for name in self.criteria:
+            query = query.filter(CRITERIA[name]())
+        return query
+
+    def build_uris(self):
+        order = ORDER[self.order]
+        if self.reverse:
+            order = order.desc()
+
+        return self.filter(Session.query(BaseContent.__uri__))\
+            .order_by(order, BaseContent.__id__)
+
+    def build_count(self):
+        return self.filter(
+            Session.query(sqla.func.count(BaseContent.__id__)))
+
+
+class QueryResult(object):
+    """ Lazy result of :py:func:`query`, statements are executed on
+    iteration, slicing and :py:func:`len`. Slices are loaded with
+    one paginated statement.
+
+    .. code-block:: python
+
+        result = ptah.cms.query(type=Page.__type__, order='-modified')
+        len(result)
+        result[20:40]
+        result.page(2, 20)
+    """
+
+    def __init__(self, compiled, params):
+        self.compiled = compiled
+        self.params = params
+        self._count = None
+
+    def uris(self, offset=0, limit=None):
+        return [uri for uri, in self.compiled.uris.iter(
+            offset=offset, limit=limit, **self.params)]
+
+    def fetch(self, offset=0, limit=None):
+        """ Return list of content """
+        uris = self.uris(offset, limit)
+        items = ptah.resolve_many(uris)
+        return [items[uri] for uri in uris if items[uri] is not None]
+
+    def count(self):
+        if self._count is None:
+            self._count = self.compiled.count.one(**self.params)[0]
+        return self._count
+
+    __len__ = count
+
+    def page(self, number, size=20):
+        """ Return list of content on page `number`, starts with 1 """
+        return self.fetch((max(number, 1) - 1) * size, size)
+
+    def first(self):
+        items = self.fetch(0, 1)
+        return items[0] if items else None
+
+    def __iter__(self):
+        return iter(self.fetch())
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            if key.step is not None or \
+                    (key.start or 0) < 0 or (key.stop or 0) < 0:
+                raise ValueError("Unsupported slice: %s"%key)
+
+            start = key.start or 0
+            limit = None if key.stop is None else max(key.stop - start, 0)
+            if limit == 0:
+                return []
+            return self.fetch(start, limit)
+
+        if key < 0:
+            raise IndexError(key)
+        items = self.fetch(key, 1)
+        if not items:
+            raise IndexError(key)
+        return items[0]
+
+
+_compiled = {}
+
+
+def query(type=None, parent=None, path=None, owner=None,
+          modified_after=None, modified_before=None, effective=None,
+          order='id'):
+    """ Query content by declarative criteria. Each distinct combination
+    of criteria and order is compiled once and cached.
+
+    :param type: :py:class:`ptah.cms.TypeInformation`, content class
+        or type uri
+    :param parent: Parent uri, direct children of parent
+    :param path: Path prefix, all content below path, content with
+        this path is not included
+    :param owner: Owner principal uri
+    :param modified_after: Content modified at or after datetime
+    :param modified_before: Content modified before datetime
+    :param effective: Content effective at datetime, `effective` and
+        `expires` can be empty
+    :param order: `id`, `title`, `position`, `created`, `modified` or
+        `effective`, `-` prefix for descending order
+    :returns: :py:class:`QueryResult`
+    """
+    if type is not None and not isinstance(type, string_types):
+        type = getattr(type, '__type__', type).__uri__
+
+    params = {}
+    for name, value in (('type', type), ('parent', parent),
+                        ('path', path), ('owner', owner),
+                        ('modified_after', modified_after),
+                        ('modified_before', modified_before),
+                        ('effective', effective)):
+        if value is not None:
+            params[name] = value
+
+    reverse = order.startswith('-')
+    order = order.lstrip('-')
+    if order not in ORDER:
+        raise ValueError("Unknown order: %s"%order)
+
+    key = (tuple(sorted(params)), order, reverse)
+    compiled = _compiled.get(key)
+    if compiled is None:
+        compiled = _compiled[key] = CompiledQuery(key[0], order, reverse)
+
+    return QueryResult(compiled, params)
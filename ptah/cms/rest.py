@@ -1,12 +1,14 @@
 """ rest api for cms """
+from io import BytesIO
 from collections import OrderedDict
 from zope.interface import providedBy, implementer, Interface
-from pyramid.compat import bytes_
+from pyramid.compat import native_
 
 import ptah
 from ptah import config
 from ptah.cms import wrap
 from ptah.cms.node import load
+from ptah.cms.blob import BlobIter, CHUNK_SIZE, fs_blob_storage
 from ptah.cms.container import Container
 from ptah.cms.interfaces import NotFound, CmsException
 from ptah.cms.interfaces import INode, IBlob, IContent, IContainer
@@ -180,7 +182,7 @@ def containerNodeInfo(content, request, *args):
     info = nodeInfo(content, request)
 
     contents = []
-    for item in content.values():
+    for item in content.iter_values():
         if not ptah.check_permission(View, item, request): # pragma: no cover
             continue
 
@@ -271,14 +273,35 @@ def createContentAction(content, request, *args):
 
 @restaction('data', IBlob, View)
 def blobData(content, request, *args):
-    """Download blob"""
+    """Download blob, supports conditional and range requests.
+    Filesystem blobs can be sent by front-end server, see `blob.offload`
+    setting"""
     response = request.response
 
     info = content.info()
-    response.content_type = info['mimetype']
+    response.content_type = info['mimetype'] or 'application/octet-stream'
     if info['filename']:
-        response.headerlist = {
-            'Content-Disposition':
-            bytes_('filename="{0}"'.format(info['filename']), 'utf-8')}
-    response.body = content.read()
+        response.content_disposition = native_(
+            'filename="{0}"'.format(info['filename']), 'utf-8')
+
+    offload = fs_blob_storage.offload_header(content)
+    if offload is not None:
+        response.headers[offload[0]] = offload[1]
+        response.content_length = 0
+        return response
+
+    data = content.open()
+
+    file_wrapper = request.environ.get('wsgi.file_wrapper')
+    if file_wrapper is not None and 'HTTP_RANGE' not in request.environ \
+            and not isinstance(data, BytesIO):
+        response.app_iter = file_wrapper(data, CHUNK_SIZE)
+    else:
+        response.app_iter = BlobIter(data)
+
+    response.content_length = content.size
+    response.etag = content.etag
+    response.last_modified = content.modified
+    response.accept_ranges = 'bytes'
+    response.conditional_response = True
     return response
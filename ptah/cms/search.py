@@ -0,0 +1,345 @@
+""" content full-text search index """
+import re
+import logging
+import transaction
+import sqlalchemy as sqla
+from pyramid.compat import string_types
+from zope.sqlalchemy import mark_changed
+
+import ptah
+from ptah.cms.node import Base, Session
+from ptah.cms.content import BaseContent
+
+log = logging.getLogger('ptah.cms')
+
+TEXT_FIELDS = ('title', 'description')
+
+
+def text_fields(tinfo):
+    """ Names of type fieldset fields indexed as text """
+    if tinfo is None or tinfo.fieldset is None:
+        return ()
+    return [field.name for field in tinfo.fieldset.fields()
+            if field.name not in TEXT_FIELDS]
+
+
+def searchable_text(content):
+    """ Return title, description and text of other text fields of
+    content type fieldset """
+    text = []
+    for name in text_fields(content.__type__):
+        value = getattr(content, name, None)
+        if value and isinstance(value, string_types):
+            text.append(value)
+
+    return (content.title or '', content.description or '', ' '.join(text))
+
+
+class SqliteSearchBackend(object):
+    """ SQLite FTS5 backend, documents are stored in `ptah_search`
+    virtual table with content id as rowid """
+
+    weights = (10.0, 5.0, 1.0)
+
+    def create(self, conn):
+        conn.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS ptah_search "
+            "USING fts5(uri UNINDEXED, title, description, text)")
+
+    def drop(self, conn):
+        conn.execute("DROP TABLE IF EXISTS ptah_search")
+
+    def query(self, text):
+        words = re.findall(r'\w+', text, re.UNICODE)
+        return ' '.join('"%s"'%word for word in words)
+
+    def remove(self, ids):
+        Session.execute(
+            sqla.sql.text("DELETE FROM ptah_search WHERE rowid = :id"),
+            [{'id': id} for id in ids])
+
+    def index(self, rows):
+        self.remove([row['id'] for row in rows])
+        Session.execute(
+            sqla.sql.text(
+                "INSERT INTO ptah_search(rowid, uri, title, description, text)"
+                " VALUES (:id, :uri, :title, :description, :text)"), rows)
+
+    def clear(self):
+        Session.execute("DELETE FROM ptah_search")
+
+    def search(self, text, offset, limit):
+        query = self.query(text)
+        if not query:
+            return []
+
+        return [(uri, -rank) for uri, rank in Session.execute(
+            sqla.sql.text(
+                "SELECT uri, bm25(ptah_search, 0.0, %s, %s, %s) AS rank "
+                "FROM ptah_search WHERE ptah_search MATCH :query "
+                "ORDER BY rank LIMIT :limit OFFSET :offset"%self.weights),
+            {'query': query, 'limit': limit, 'offset': offset})]
+
+    def count(self, text):
+        query = self.query(text)
+        if not query:
+            return 0
+
+        return Session.execute(
+            sqla.sql.text("SELECT count(*) FROM ptah_search "
+                          "WHERE ptah_search MATCH :query"),
+            {'query': query}).scalar()
+
+
+class PostgresSearchBackend(object):
+    """ PostgreSQL backend, documents are stored as weighted `tsvector`
+    in `ptah_search` table with GIN index """
+
+    config = 'simple'
+
+    def create(self, conn):
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS ptah_search ("
+            "id INTEGER PRIMARY KEY, uri VARCHAR(255), document TSVECTOR)")
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS ix_ptah_search_document "
+            "ON ptah_search USING gin(document)")
+
+    def drop(self, conn):
+        conn.execute("DROP TABLE IF EXISTS ptah_search")
+
+    def remove(self, ids):
+        Session.execute(
+            sqla.sql.text("DELETE FROM ptah_search WHERE id = :id"),
+            [{'id': id} for id in ids])
+
+    def index(self, rows):
+        self.remove([row['id'] for row in rows])
+        Session.execute(
+            sqla.sql.text(
+                "INSERT INTO ptah_search(id, uri, document) VALUES (:id, :uri,"
+                " setweight(to_tsvector('%(c)s', :title), 'A') ||"
+                " setweight(to_tsvector('%(c)s', :description), 'B') ||"
+                " setweight(to_tsvector('%(c)s', :text), 'C'))"%{
+                    'c': self.config}), rows)
+
+    def clear(self):
+        Session.execute("DELETE FROM ptah_search")
+
+    def search(self, text, offset, limit):
+        return [(uri, rank) for uri, rank in Session.execute(
+            sqla.sql.text(
+                "SELECT uri, ts_rank(document, query) AS rank "
+                "FROM ptah_search, plainto_tsquery('%s', :query) query "
+                "WHERE document @@ query ORDER BY rank DESC "
+                "LIMIT :limit OFFSET :offset"%self.config),
+            {'query': text, 'limit': limit, 'offset': offset})]
+
+    def count(self, text):
+        return Session.execute(
+            sqla.sql.text(
+                "SELECT count(*) FROM ptah_search "
+                "WHERE document @@ plainto_tsquery('%s', :query)"%self.config),
+            {'query': text}).scalar()
+
+
+class SearchIndex(object):
+    """ Full-text index of :py:class:`ptah.cms.BaseContent`.
+    Backend is selected by database dialect, index table is created
+    with `Base.metadata.create_all()`. Index is updated by content
+    event subscribers, use :py:func:`reindex` for existing content.
+    Backend is not used if index table can't be created or doesn't
+    exist, content is not indexed in this case. """
+
+    enabled = True
+
+    def __init__(self):
+        self.backends = {'sqlite': SqliteSearchBackend(),
+                         'postgresql': PostgresSearchBackend()}
+        self.available = {}
+
+    def backend(self, bind=None):
+        """ Return backend for database dialect or None """
+        if not self.enabled:
+            return None
+
+        if bind is None:
+            bind = Session.bind
+
+        name = bind.dialect.name
+        backend = self.backends.get(name)
+        if backend is None:
+            return None
+
+        available = self.available.get(name)
+        if available is None:
+            available = self.available[name] = bind.has_table('ptah_search')
+        return backend if available else None
+
+    def index(self, items):
+        """ Add or replace documents of content items """
+        rows = []
+        for item in items:
+            title, description, text = searchable_text(item)
+            rows.append({'id': item.__id__, 'uri': item.__uri__,
+                         'title': title, 'description': description,
+                         'text': text})
+        self.index_rows(rows)
+
+    def index_rows(self, rows):
+        """ Add or replace documents, row is a dict with `id`, `uri`,
+        `title`, `description` and `text` """
+        backend = self.backend()
+        if backend is None or not rows:
+            return
+
+        backend.index(rows)
+        mark_changed(Session())
+
+    def remove(self, uris):
+        """ Remove documents of content by uris """
+        backend = self.backend()
+        if backend is None or not uris:
+            return
+
+        ids = [id for id, in Session.query(BaseContent.__id__)
+               .filter(BaseContent.__uri__.in_(list(uris)))]
+        if ids:
+            backend.remove(ids)
+            mark_changed(Session())
+
+    def search(self, text, offset=0, limit=20):
+        """ Return list of (uri, rank) of documents matching `text`
+        ordered by rank """
+        backend = self.backend()
+        if backend is None:
+            return []
+        return backend.search(text, offset, limit)
+
+    def count(self, text):
+        """ Number of documents matching `text` """
+        backend = self.backend()
+        if backend is None:
+            return 0
+        return backend.count(text)
+
+    def clear(self):
+        backend = self.backend()
+        if backend is not None:
+            backend.clear()
+            mark_changed(Session())
+
+
+search_index = SearchIndex()
+
+
+def search(text, offset=0, limit=20):
+    """ Full-text search, return list of content ordered by rank
+
+    :param text: Search text
+    :param offset: Number of skipped results
+    :param limit: Page size
+    """
+    uris = [uri for uri, rank in search_index.search(text, offset, limit)]
+    items = ptah.resolve_many(uris)
+    return [items[uri] for uri in uris if items[uri] is not None]
+
+
+def reindex(batch=500):
+    """ Rebuild search index, content is indexed in batches of
+    `batch` items, each batch is committed separately. Returns number
+    of indexed items. """
+    search_index.clear()
+    transaction.commit()
+
+    count = 0
+    last = 0
+    while True:
+        items = Session.query(BaseContent)\
+            .filter(BaseContent.__id__ > last)\
+            .order_by(BaseContent.__id__).limit(batch).all()
+        if not items:
+            break
+
+        last = items[-1].__id__
+        search_index.index(items)
+        count += len(items)
+
+        transaction.commit()
+
+    return count
+
+
+def create_index(target, connection, **kw):
+    name = connection.dialect.name
+    backend = search_index.backends.get(name)
+    if backend is not None:
+        try:
+            backend.create(connection)
+        except sqla.exc.DBAPIError as e:
+            log.warning("Can't create search index: %s", e)
+            search_index.available[name] = False
+        else:
+            search_index.available[name] = True
+
+
+def drop_index(target, connection, **kw):
+    name = connection.dialect.name
+    backend = search_index.backends.get(name)
+    if backend is not None:
+        backend.drop(connection)
+        search_index.available[name] = False
+
+
+sqla.event.listen(Base.metadata, 'after_create', create_index)
+sqla.event.listen(Base.metadata, 'before_drop', drop_index)
+
+
+@ptah.batch_subscriber(ptah.events.ContentAddedEvent)
+@ptah.batch_subscriber(ptah.events.ContentModifiedEvent)
+def content_search_handler(events):
+    """ Index added or modified content """
+    items = [ev.object for ev in events
+             if isinstance(ev.object, BaseContent)]
+    if items and search_index.enabled:
+        Session.flush()
+        search_index.index(items)
+
+
+@ptah.subscriber(ptah.events.ContentAddedEvent)
+@ptah.subscriber(ptah.events.ContentModifiedEvent)
+def content_notify_search_handler(ev):
+    """ Index content of event sent with `registry.notify()`, events of
+    :py:func:`ptah.events.notify` are indexed by batch subscriber """
+    if not getattr(ev, 'dispatched', False):
+        content_search_handler((ev,))
+
+
+@ptah.subscriber(ptah.events.ContentsAddedEvent)
+def bulk_search_handler(ev):
+    """ Index content created with :py:func:`ptah.cms.bulk_create` """
+    if not search_index.enabled:
+        return
+
+    names = text_fields(ev.tinfo)
+    rows = []
+    for item in ev.items:
+        text = [item[name] for name in names
+                if item.get(name) and isinstance(item[name], string_types)]
+        rows.append({'id': item['__id__'], 'uri': item['__uri__'],
+                     'title': item.get('title') or '',
+                     'description': item.get('description') or '',
+                     'text': ' '.join(text)})
+    search_index.index_rows(rows)
+
+
+@ptah.subscriber(ptah.events.ContentsDeletingEvent)
+def contents_search_handler(ev):
+    """ Remove deleted content from search index """
+    search_index.remove(ev.uris)
+
+
+@ptah.subscriber(ptah.events.SettingsInitializing)
+def initialized(ev):
+    PTAH = ptah.get_settings(ptah.CFG_ID_PTAH, ev.registry)
+    search_index.enabled = PTAH['search_index']
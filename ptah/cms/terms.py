@@ -0,0 +1,218 @@
+""" secondary index of content json list columns """
+import transaction
+import sqlalchemy as sqla
+from pyramid.compat import string_types
+from zope.sqlalchemy import mark_changed
+
+import ptah
+from ptah.cms.node import Base, Node, Session
+from ptah.cms.content import BaseContent
+
+TERMS = ('subjects', 'creators', 'contributors')
+TERMS_BATCH = 500
+TERM_LENGTH = 255
+
+
+class ContentTerm(Base):
+    """ value of :py:class:`ptah.cms.BaseContent` `subjects`, `creators`
+    or `contributors` list, one row per value """
+
+    __tablename__ = 'ptah_content_terms'
+
+    node_id = sqla.Column(sqla.Integer,
+                          sqla.ForeignKey('ptah_nodes.id', ondelete='CASCADE'),
+                          primary_key=True, autoincrement=False)
+    name = sqla.Column(sqla.String(32), primary_key=True)
+    value = sqla.Column(sqla.Unicode(TERM_LENGTH), primary_key=True)
+
+    __table_args__ = (sqla.Index('ix_ptah_content_terms_value',
+                                 'name', 'value'),)
+
+
+def content_terms(content, names=TERMS):
+    """ Return index rows for `names` lists of content """
+    return record_terms(
+        content.__id__,
+        dict((name, getattr(content, name)) for name in names), names)
+
+
+def record_terms(id, record, names=TERMS):
+    """ Return index rows for `names` lists of `record` dict. Values
+    longer than `TERM_LENGTH` are not indexed """
+    rows = []
+    for name in names:
+        values = set(value for value in (record.get(name) or ())
+                     if isinstance(value, string_types) and
+                     len(value) <= TERM_LENGTH)
+        rows.extend({'node_id': id, 'name': name, 'value': value}
+                    for value in sorted(values))
+    return rows
+
+
+def _remove_terms(conn, ids, names=None):
+    table = ContentTerm.__table__
+    for idx in range(0, len(ids), TERMS_BATCH):
+        clause = table.c.node_id.in_(ids[idx:idx+TERMS_BATCH])
+        if names:
+            clause = sqla.sql.and_(clause, table.c.name.in_(names))
+        conn.execute(table.delete().where(clause))
+
+
+def _changed_terms(content):
+    return [name for name in TERMS
+            if sqla.orm.attributes.get_history(
+                content, name,
+                passive=sqla.orm.attributes.PASSIVE_NO_INITIALIZE)
+            .has_changes()]
+
+
+def terms_before_flush(session, flush_context, instances):
+    """ Collect content with changed term lists. Mutations of
+    :py:class:`ptah.sqla.MutationList` mark list as changed as well """
+    changes = session._ptah_terms = []
+    for ob in session.new:
+        if isinstance(ob, BaseContent):
+            changes.append((ob, TERMS, True))
+
+    for ob in session.dirty:
+        if isinstance(ob, BaseContent) and ob not in session.deleted:
+            names = _changed_terms(ob)
+            if names:
+                changes.append((ob, names, False))
+
+
+def terms_after_flush(session, flush_context):
+    """ Write index rows of changed content """
+    changes = getattr(session, '_ptah_terms', None)
+    session._ptah_terms = []
+
+    deleted = [ob.__id__ for ob in session.deleted
+               if isinstance(ob, BaseContent)]
+    if deleted:
+        _remove_terms(session, deleted)
+
+    rows = []
+    for ob, names, new in changes or ():
+        if not new:
+            _remove_terms(session, [ob.__id__], names)
+        rows.extend(content_terms(ob, names))
+
+    if rows:
+        session.execute(ContentTerm.__table__.insert(), rows)
+
+
+sqla.event.listen(Session.session_factory, 'before_flush', terms_before_flush)
+sqla.event.listen(Session.session_factory, 'after_flush', terms_after_flush)
+
+
+@ptah.subscriber(ptah.events.ContentsAddedEvent)
+def bulk_terms_handler(ev):
+    """ Index terms of content created with
+    :py:func:`ptah.cms.bulk_create` """
+    rows = []
+    for item in ev.items:
+        rows.extend(record_terms(item['__id__'], item))
+
+    if rows:
+        Session.execute(ContentTerm.__table__.insert(), rows)
+        mark_changed(Session())
+
+
+@ptah.subscriber(ptah.events.ContentsDeletingEvent)
+def contents_terms_handler(ev):
+    """ Remove terms of deleted content, including content removed with
+    set-based :py:func:`ptah.cms.container.delete_subtrees` """
+    uris = list(ev.uris)
+    if not uris:
+        return
+
+    ids = []
+    for idx in range(0, len(uris), TERMS_BATCH):
+        ids.extend(id for id, in Session.query(Node.__id__).filter(
+            Node.__uri__.in_(uris[idx:idx+TERMS_BATCH])))
+
+    if ids:
+        _remove_terms(Session, ids)
+        mark_changed(Session())
+
+
+def _term_query(name, value):
+    return Session.query(ContentTerm.node_id)\
+        .filter(ContentTerm.name == name)\
+        .filter(ContentTerm.value == value)
+
+
+def find_by_term(name, value, offset=0, limit=None):
+    """ Return list of content with `value` in `name` list
+    (`subjects`, `creators` or `contributors`), ordered by creation
+
+    :param name: Name of list attribute
+    :param value: List value
+    :param offset: Number of skipped items
+    :param limit: Page size, `None` means all items
+    """
+    if name not in TERMS:
+        raise ValueError("Unknown term: %s"%name)
+
+    query = Session.query(Node.__uri__)\
+        .filter(Node.__id__.in_(_term_query(name, value).subquery()))\
+        .order_by(Node.__id__).offset(offset)
+    if limit is not None:
+        query = query.limit(limit)
+
+    uris = [uri for uri, in query]
+    items = ptah.resolve_many(uris)
+    return [items[uri] for uri in uris if items[uri] is not None]
+
+
+def count_by_term(name, value):
+    """ Number of content with `value` in `name` list """
+    if name not in TERMS:
+        raise ValueError("Unknown term: %s"%name)
+    return _term_query(name, value).count()
+
+
+def find_by_subject(subject, offset=0, limit=None):
+    """ Content tagged with `subject`, see :py:func:`find_by_term` """
+    return find_by_term('subjects', subject, offset, limit)
+
+
+def find_by_creator(creator, offset=0, limit=None):
+    """ Content created by `creator`, see :py:func:`find_by_term` """
+    return find_by_term('creators', creator, offset, limit)
+
+
+def find_by_contributor(contributor, offset=0, limit=None):
+    """ Content with `contributor`, see :py:func:`find_by_term` """
+    return find_by_term('contributors', contributor, offset, limit)
+
+
+def reindex_terms(batch=TERMS_BATCH):
+    """ Rebuild terms index of all content in batches of `batch` items,
+    each batch is committed separately. Returns number of items. """
+    Session.execute(ContentTerm.__table__.delete())
+    mark_changed(Session())
+    transaction.commit()
+
+    count = 0
+    last = 0
+    while True:
+        items = Session.query(BaseContent)\
+            .options(sqla.orm.undefer_group('json'))\
+            .filter(BaseContent.__id__ > last)\
+            .order_by(BaseContent.__id__).limit(batch).all()
+        if not items:
+            break
+
+        last = items[-1].__id__
+        rows = []
+        for item in items:
+            rows.extend(content_terms(item))
+        if rows:
+            Session.execute(ContentTerm.__table__.insert(), rows)
+            mark_changed(Session())
+        count += len(items)
+
+        transaction.commit()
+
+    return count
@@ -1,7 +1,20 @@
+import os
+import shutil
+import tempfile
 import transaction
 from io import BytesIO
 from pyramid.compat import bytes_
-from ptah.testing import PtahTestCase
+from ptah.testing import PtahTestCase, StatementRecorder
+
+
+class Upload(object):
+    """ non seekable upload stream """
+
+    def __init__(self, data):
+        self.data = BytesIO(bytes_(data, 'utf-8'))
+
+    def read(self, size=-1):
+        return self.data.read(size)
 
 
 class TestBlob(PtahTestCase):
@@ -55,6 +68,20 @@ class TestBlob(PtahTestCase):
         self.assertEqual(blob.__uri__, blob_uri)
         self.assertEqual(blob.read(), bytes_('blob data','utf-8'))
 
+    def test_blob_resolve_many(self):
+        import ptah
+
+        blob1 = ptah.cms.blob_storage.add(BytesIO(bytes_('blob1','utf-8')))
+        blob2 = ptah.cms.blob_storage.add(BytesIO(bytes_('blob2','utf-8')))
+
+        uri1, uri2 = blob1.__uri__, blob2.__uri__
+        transaction.commit()
+
+        blobs = ptah.resolve_many([uri2, uri1])
+        self.assertEqual(list(blobs.keys()), [uri2, uri1])
+        self.assertEqual(blobs[uri1].read(), bytes_('blob1','utf-8'))
+        self.assertEqual(blobs[uri2].read(), bytes_('blob2','utf-8'))
+
     def test_blob_with_parent(self):
         import ptah
 
@@ -99,7 +126,732 @@ class TestBlob(PtahTestCase):
 
         response = blobData(blob, self.request)
         self.assertEqual(response.body, bytes_('blob data','utf-8'))
+        self.assertEqual(response.content_type, 'text/plain')
+        self.assertEqual(response.content_length, 9)
+        self.assertEqual(response.content_disposition, 'filename="test.txt"')
+        self.assertEqual(response.etag, blob.etag)
+        self.assertEqual(response.accept_ranges, 'bytes')
+        self.assertIsNotNone(response.last_modified)
+
+    def _get_data(self, blob, **headers):
+        from pyramid.request import Request
+        from ptah.cms.rest import blobData
+
+        request = Request.blank('/', headers=headers)
+        request.registry = self.registry
+        return request.get_response(blobData(blob, request))
+
+    def test_blob_rest_data_conditional(self):
+        import ptah.cms
+
+        blob = ptah.cms.blob_storage.add(
+            BytesIO(bytes_('blob data','utf-8')), mimetype='text/plain')
+        etag = blob.etag
+
+        response = self._get_data(blob)
+        self.assertEqual(response.status_int, 200)
+        self.assertEqual(response.headers['ETag'], '"%s"'%etag)
+
+        response = self._get_data(blob, **{'If-None-Match': '"%s"'%etag})
+        self.assertEqual(response.status_int, 304)
+        self.assertEqual(response.body, bytes_('','utf-8'))
+
+        response = self._get_data(blob, **{'If-None-Match': '"other"'})
+        self.assertEqual(response.status_int, 200)
+
+        response = self._get_data(
+            blob, **{'If-Modified-Since':
+                     response.headers['Last-Modified']})
+        self.assertEqual(response.status_int, 304)
+
+        # etag changes with data
+        blob.write(bytes_('new data','utf-8'))
+        self.assertNotEqual(blob.etag, etag)
+
+    def test_blob_rest_data_range(self):
+        import ptah.cms
+
+        blob = ptah.cms.blob_storage.add(
+            BytesIO(bytes_('0123456789','utf-8')), mimetype='video/mp4')
+
+        response = self._get_data(blob, Range='bytes=2-5')
+        self.assertEqual(response.status_int, 206)
+        self.assertEqual(response.body, bytes_('2345','utf-8'))
+        self.assertEqual(response.headers['Content-Range'], 'bytes 2-5/10')
+        self.assertEqual(response.content_length, 4)
+
+        response = self._get_data(blob, Range='bytes=7-')
+        self.assertEqual(response.status_int, 206)
+        self.assertEqual(response.body, bytes_('789','utf-8'))
+
+        response = self._get_data(blob, Range='bytes=20-30')
+        self.assertEqual(response.status_int, 416)
+
+    def test_blob_iter(self):
+        from ptah.cms.blob import BlobIter
+
+        data = BytesIO(bytes_('0123456789','utf-8'))
+        self.assertEqual(list(BlobIter(data, block_size=4)),
+                         [bytes_('0123','utf-8'), bytes_('4567','utf-8'),
+                          bytes_('89','utf-8')])
+
+        it = BlobIter(data, block_size=4).app_iter_range(3, 8)
+        self.assertEqual(list(it),
+                         [bytes_('3456','utf-8'), bytes_('7','utf-8')])
+
+        it.close()
+        self.assertTrue(data.closed)
+
+    def test_blob_ingest(self):
+        import hashlib
+        import ptah
+
+        fp = Upload('blob data')
+        value = {'fp': fp, 'filename': 'test.txt',
+                 'mimetype': 'text/plain', 'size': 9}
+
+        blob = ptah.cms.blob_storage.ingest(**value)
+        self.assertEqual(blob.read(), bytes_('blob data','utf-8'))
+        self.assertEqual(blob.size, 9)
+        self.assertEqual(blob.filename, 'test.txt')
+        self.assertEqual(blob.mimetype, 'text/plain')
+        self.assertEqual(
+            blob.hash,
+            hashlib.sha256(bytes_('blob data','utf-8')).hexdigest())
+        self.assertEqual(blob.etag, blob.hash)
+
+    def test_blob_replace(self):
+        import ptah
+
+        blob_uri = ptah.cms.blob_storage.add(
+            BytesIO(bytes_('blob data','utf-8')),
+            filename='test.txt', mimetype='text/plain').__uri__
+        transaction.commit()
+
+        blob = ptah.cms.blob_storage.replace(
+            blob_uri, BytesIO(bytes_('new data!','utf-8')),
+            filename='new.txt')
+        self.assertEqual(blob.__uri__, blob_uri)
+        transaction.commit()
+
+        blob = ptah.resolve(blob_uri)
+        self.assertEqual(blob.read(), bytes_('new data!','utf-8'))
+        self.assertEqual(blob.size, 9)
+        self.assertEqual(blob.filename, 'new.txt')
+        self.assertEqual(blob.mimetype, 'text/plain')
+
+        self.assertIsNone(ptah.cms.blob_storage.replace(
+            'blob-sql:unknown', BytesIO(bytes_('data','utf-8'))))
+
+    def test_blob_remove(self):
+        import ptah
+
+        blob_uri = ptah.cms.blob_storage.add(
+            BytesIO(bytes_('blob data','utf-8'))).__uri__
+        transaction.commit()
+
+        ptah.cms.blob_storage.remove(blob_uri)
+        transaction.commit()
+
+        self.assertIsNone(ptah.resolve(blob_uri))
+        ptah.cms.blob_storage.remove('blob-sql:unknown')
+
+
+class TestChunkedBlob(PtahTestCase):
+
+    def setUp(self):
+        super(TestChunkedBlob, self).setUp()
+
+        from ptah.cms.blob import chunked_blob_storage
+        self.storage = chunked_blob_storage
+
+    def _add(self, data, chunk_size=4, **metadata):
+        blob = self.storage.create()
+        blob.chunk_size = chunk_size
+        blob.write(BytesIO(bytes_(data,'utf-8')))
+        blob.updateMetadata(**metadata)
+        return blob
+
+    def _chunks(self, blob):
+        import ptah
+        from ptah.cms.blob import BlobChunk
+
+        return [data for data, in ptah.cms.Session
+                .query(BlobChunk.data)
+                .filter(BlobChunk.blob_id == blob.__id__)
+                .order_by(BlobChunk.seq)]
+
+    def test_chunkedblob(self):
+        import ptah.cms
+
+        blob = self.storage.add(
+            BytesIO(bytes_('blob data','utf-8')),
+            filename='test.txt', mimetype='text/plain')
+
+        self.assertTrue(ptah.cms.IBlob.providedBy(blob))
+        self.assertTrue(ptah.cms.IBlobStorage.providedBy(self.storage))
+        self.assertTrue(blob.__uri__.startswith('blob-chunked:'))
+        self.assertEqual(blob.read(), bytes_('blob data','utf-8'))
+        self.assertEqual(blob.data, bytes_('blob data','utf-8'))
+        self.assertEqual(blob.size, 9)
+        self.assertEqual(blob.info()['filename'], 'test.txt')
+        self.assertEqual(blob.info()['mimetype'], 'text/plain')
+
+    def test_chunkedblob_create(self):
+        blob = self.storage.create()
+        self.assertEqual(blob.read(), None)
+        self.assertEqual(blob.open().read(), bytes_('','utf-8'))
+
+    def test_chunkedblob_chunks(self):
+        blob = self._add('0123456789')
+
+        self.assertEqual(self._chunks(blob),
+                         [bytes_('0123','utf-8'), bytes_('4567','utf-8'),
+                          bytes_('89','utf-8')])
+        self.assertEqual(blob.size, 10)
+
+        # rewrite
+        blob.write(bytes_('abcde','utf-8'))
+        self.assertEqual(self._chunks(blob),
+                         [bytes_('abcd','utf-8'), bytes_('e','utf-8')])
+        self.assertEqual(blob.read(), bytes_('abcde','utf-8'))
+
+    def test_chunkedblob_short_reads(self):
+        class Stream(object):
+            def __init__(self, data):
+                self.data = BytesIO(bytes_(data,'utf-8'))
+            def read(self, size):
+                return self.data.read(min(size, 3))
+
+        blob = self.storage.create()
+        blob.chunk_size = 4
+        blob.write(Stream('0123456789'))
+
+        self.assertEqual(self._chunks(blob),
+                         [bytes_('0123','utf-8'), bytes_('4567','utf-8'),
+                          bytes_('89','utf-8')])
+
+    def test_chunkedblob_ingest(self):
+        import hashlib
+        from ptah.cms.blob import SQL_CHUNK_SIZE
+
+        data = '0123456789' * 200000
+        fp = Upload(data)
+
+        blob = self.storage.ingest(fp, filename='test.bin')
+        self.assertEqual(blob.size, 2000000)
+        self.assertEqual(blob.filename, 'test.bin')
+        self.assertEqual(
+            blob.hash, hashlib.sha256(bytes_(data,'utf-8')).hexdigest())
+        self.assertEqual(
+            [len(chunk) for chunk in self._chunks(blob)],
+            [SQL_CHUNK_SIZE, 2000000 - SQL_CHUNK_SIZE])
+
+    def test_chunkedblob_file(self):
+        import ptah
+
+        blob = self._add('0123456789')
+        blob_uri = blob.__uri__
+        transaction.commit()
+
+        blob = ptah.resolve(blob_uri)
+        f = blob.open()
+        self.assertEqual(f.read(3), bytes_('012','utf-8'))
+        self.assertEqual(f.read(3), bytes_('345','utf-8'))
+        self.assertEqual(f.tell(), 6)
+        self.assertEqual(f.read(), bytes_('6789','utf-8'))
+        self.assertEqual(f.read(), bytes_('','utf-8'))
+
+        f.seek(5)
+        self.assertEqual(f.read(2), bytes_('56','utf-8'))
+        f.seek(-3, os.SEEK_END)
+        self.assertEqual(f.read(), bytes_('789','utf-8'))
+        f.seek(-2, os.SEEK_CUR)
+        self.assertEqual(f.read(1), bytes_('8','utf-8'))
+
+        f.close()
+        self.assertTrue(f.closed)
+
+    def test_chunkedblob_file_loads_one_chunk(self):
+        blob = self._add('0123456789')
+        blob_uri = blob.__uri__
+        transaction.commit()
+
+        with StatementRecorder(lambda s: 'ptah_blob_chunks' in s) as stmts:
+            f = self.storage.get(blob_uri).open()
+            f.seek(5)
+            self.assertEqual(f.read(2), bytes_('56','utf-8'))
+
+        self.assertEqual(len(stmts), 1)
+
+    def test_chunkedblob_file_after_commit(self):
+        import ptah
+
+        blob = self._add('0123456789', chunk_size=4)
+        blob_uri = blob.__uri__
+        transaction.commit()
+
+        # response app_iter is read after transaction commit
+        f = ptah.resolve(blob_uri).open()
+        self.assertEqual(f.read(2), bytes_('01','utf-8'))
+        transaction.commit()
+
+        self.assertEqual(f.read(), bytes_('23456789','utf-8'))
+        self.assertEqual(transaction.get()._resources, [])
+        self.assertIsNotNone(f._conn)
+
+        f.close()
+        self.assertIsNone(f._conn)
+
+    def test_chunkedblob_rest_range(self):
+        from pyramid.request import Request
+        from ptah.cms.rest import blobData
+
+        blob = self._add('0123456789', mimetype='video/mp4')
+
+        request = Request.blank('/', headers={'Range': 'bytes=3-8'})
+        request.registry = self.registry
+        response = request.get_response(blobData(blob, request))
+        self.assertEqual(response.status_int, 206)
+        self.assertEqual(response.body, bytes_('345678','utf-8'))
+
+    def test_chunkedblob_resolver(self):
+        import ptah
+
+        blob1 = self._add('blob1')
+        blob2 = self._add('blob2')
+        uri1, uri2 = blob1.__uri__, blob2.__uri__
+        transaction.commit()
+
+        self.assertEqual(ptah.resolve(uri1).read(), bytes_('blob1','utf-8'))
+
+        blobs = ptah.resolve_many([uri2, uri1])
+        self.assertEqual(blobs[uri2].read(), bytes_('blob2','utf-8'))
+
+    def test_chunkedblob_getbyparent(self):
+        import ptah
+
+        content = ptah.cms.blob_storage.create()
+        blob = self.storage.add(
+            BytesIO(bytes_('blob data','utf-8')), content)
+
         self.assertEqual(
-            response.headerlist,
-            [('Content-Disposition', bytes_('filename="test.txt"','utf-8')),
-             ('Content-Length', '9')])
+            self.storage.getByParent(content.__uri__).__uri__, blob.__uri__)
+
+    def test_chunkedblob_replace(self):
+        import ptah
+
+        blob_uri = self._add('blob data', filename='test.txt').__uri__
+        transaction.commit()
+
+        blob = self.storage.replace(
+            blob_uri, BytesIO(bytes_('new data','utf-8')),
+            mimetype='text/plain')
+        transaction.commit()
+
+        blob = ptah.resolve(blob_uri)
+        self.assertEqual(blob.read(), bytes_('new data','utf-8'))
+        self.assertEqual(blob.filename, 'test.txt')
+        self.assertEqual(blob.mimetype, 'text/plain')
+
+        self.assertIsNone(self.storage.replace(
+            'blob-chunked:unknown', BytesIO(bytes_('data','utf-8'))))
+
+    def test_chunkedblob_remove(self):
+        import ptah
+        from ptah.cms.blob import BlobChunk
+
+        blob = self._add('0123456789')
+        blob_uri, blob_id = blob.__uri__, blob.__id__
+        transaction.commit()
+
+        self.storage.remove(blob_uri)
+        self.storage.remove('blob-chunked:unknown')
+        transaction.commit()
+
+        self.assertIsNone(ptah.resolve(blob_uri))
+        self.assertEqual(
+            ptah.cms.Session.query(BlobChunk)
+            .filter(BlobChunk.blob_id == blob_id).count(), 0)
+
+
+class TestFsBlob(PtahTestCase):
+
+    def setUp(self):
+        super(TestFsBlob, self).setUp()
+
+        from ptah.cms.blob import fs_blob_storage
+        self.dir = tempfile.mkdtemp()
+        self.storage = fs_blob_storage
+        self.storage.directory = self.dir
+        self.storage.grace = 0
+
+    def tearDown(self):
+        transaction.abort()
+        self.storage.directory = ''
+        self.storage.grace = 3600
+        self.storage.offload = 'none'
+        self.storage.offload_prefix = '/blobs/'
+        shutil.rmtree(self.dir)
+        super(TestFsBlob, self).tearDown()
+
+    def test_fsblob(self):
+        import ptah.cms
+
+        blob = self.storage.add(
+            BytesIO(bytes_('blob data','utf-8')),
+            filename='test.txt', mimetype='text/plain')
+
+        self.assertTrue(ptah.cms.IBlob.providedBy(blob))
+        self.assertTrue(ptah.cms.IBlobStorage.providedBy(self.storage))
+        self.assertTrue(blob.__uri__.startswith('blob-fs:'))
+        self.assertEqual(blob.read(), bytes_('blob data','utf-8'))
+        self.assertEqual(blob.data, bytes_('blob data','utf-8'))
+        self.assertEqual(blob.size, 9)
+        self.assertEqual(blob.info()['filename'], 'test.txt')
+        self.assertEqual(blob.info()['mimetype'], 'text/plain')
+        self.assertEqual(len(blob.hash), 64)
+
+        path = self.storage.path(blob.hash)
+        self.assertTrue(path.startswith(self.dir))
+        with open(path, 'rb') as f:
+            self.assertEqual(f.read(), bytes_('blob data','utf-8'))
+
+        # no temporary files
+        self.assertEqual(os.listdir(os.path.join(self.dir, 'tmp')), [])
+
+    def test_fsblob_create(self):
+        blob = self.storage.create()
+        self.assertEqual(blob.read(), None)
+
+    def test_fsblob_rest_data(self):
+        from pyramid.request import Request
+        from ptah.cms.rest import blobData
+
+        blob = self.storage.add(
+            BytesIO(bytes_('0123456789','utf-8')), mimetype='application/pdf')
+        self.assertEqual(blob.etag, blob.hash)
+
+        wrapped = []
+        def file_wrapper(f, block_size):
+            wrapped.append(f)
+            return iter([f.read()])
+
+        environ = {'wsgi.file_wrapper': file_wrapper}
+
+        request = Request.blank('/', environ=environ)
+        request.registry = self.registry
+        response = request.get_response(blobData(blob, request))
+        self.assertEqual(response.status_int, 200)
+        self.assertEqual(response.body, bytes_('0123456789','utf-8'))
+        self.assertEqual(response.headers['ETag'], '"%s"'%blob.hash)
+        self.assertEqual(len(wrapped), 1)
+
+        # range request uses seekable iterator
+        request = Request.blank('/', environ=environ,
+                                headers={'Range': 'bytes=8-'})
+        request.registry = self.registry
+        response = request.get_response(blobData(blob, request))
+        self.assertEqual(response.status_int, 206)
+        self.assertEqual(response.body, bytes_('89','utf-8'))
+        self.assertEqual(len(wrapped), 1)
+
+    def test_fsblob_ingest(self):
+        import hashlib
+
+        fp = Upload('blob data')
+        blob = self.storage.ingest(fp, mimetype='text/plain', size=9)
+
+        self.assertEqual(blob.read(), bytes_('blob data','utf-8'))
+        self.assertEqual(blob.size, 9)
+        self.assertEqual(blob.mimetype, 'text/plain')
+        self.assertEqual(
+            blob.hash,
+            hashlib.sha256(bytes_('blob data','utf-8')).hexdigest())
+
+    def test_copy_stream(self):
+        import hashlib
+        from ptah.cms.blob import copy_stream
+
+        chunks = []
+        size, hash = copy_stream(Upload('0123456789'), chunks.append, 4)
+        self.assertEqual(size, 10)
+        self.assertEqual(
+            hash, hashlib.sha256(bytes_('0123456789','utf-8')).hexdigest())
+        self.assertEqual(chunks, [bytes_('0123','utf-8'),
+                                  bytes_('4567','utf-8'),
+                                  bytes_('89','utf-8')])
+
+    def test_fsblob_not_configured(self):
+        self.storage.directory = ''
+        self.assertRaises(
+            RuntimeError, self.storage.add, BytesIO(bytes_('data','utf-8')))
+
+    def test_fsblob_dedup(self):
+        blob1 = self.storage.add(BytesIO(bytes_('blob data','utf-8')))
+        blob2 = self.storage.add(BytesIO(bytes_('blob data','utf-8')))
+
+        self.assertNotEqual(blob1.__uri__, blob2.__uri__)
+        self.assertEqual(blob1.hash, blob2.hash)
+
+        files = []
+        for root, dirs, names in os.walk(self.dir):
+            files.extend(name for name in names if name != 'lock')
+        self.assertEqual(files, [blob1.hash])
+
+    def test_fsblob_resolver(self):
+        import ptah
+
+        blob = self.storage.add(BytesIO(bytes_('blob1','utf-8')))
+        blob2 = self.storage.add(BytesIO(bytes_('blob2','utf-8')))
+        uri, uri2 = blob.__uri__, blob2.__uri__
+        transaction.commit()
+
+        blob = ptah.resolve(uri)
+        self.assertEqual(blob.__uri__, uri)
+        self.assertEqual(blob.read(), bytes_('blob1','utf-8'))
+
+        blobs = ptah.resolve_many([uri2, uri])
+        self.assertEqual(blobs[uri2].read(), bytes_('blob2','utf-8'))
+
+    def test_fsblob_getbyparent(self):
+        import ptah
+
+        class MyContent(ptah.cms.Node):
+            __name__ = ''
+            __mapper_args__ = {'polymorphic_identity': 'mycontent'}
+            __uri_factory__ = ptah.UriFactory('test')
+
+        content = MyContent()
+        content_uri = content.__uri__
+        ptah.cms.Session.add(content)
+
+        blob_uri = self.storage.add(
+            BytesIO(bytes_('blob data','utf-8')), content).__uri__
+        transaction.commit()
+
+        self.assertEqual(
+            self.storage.getByParent(content_uri).__uri__, blob_uri)
+
+    def test_fsblob_replace(self):
+        blob = self.storage.add(BytesIO(bytes_('blob data','utf-8')))
+        uri = blob.__uri__
+        transaction.commit()
+
+        old_path = self.storage.path(self.storage.get(uri).hash)
+
+        blob = self.storage.replace(
+            uri, BytesIO(bytes_('new data','utf-8')), filename='new.txt')
+        self.assertEqual(blob.read(), bytes_('new data','utf-8'))
+        self.assertEqual(blob.filename, 'new.txt')
+        self.assertEqual(blob.size, 8)
+
+        # old file is removed after commit
+        self.assertTrue(os.path.exists(old_path))
+        transaction.commit()
+        self.assertFalse(os.path.exists(old_path))
+
+        self.assertIsNone(self.storage.replace(
+            'blob-fs:unknown', BytesIO(bytes_('data','utf-8'))))
+
+    def test_fsblob_remove(self):
+        blob1 = self.storage.add(BytesIO(bytes_('blob data','utf-8')))
+        blob2 = self.storage.add(BytesIO(bytes_('blob data','utf-8')))
+        uri1, uri2 = blob1.__uri__, blob2.__uri__
+        path = self.storage.path(blob1.hash)
+        transaction.commit()
+
+        # file is shared
+        self.storage.remove(uri1)
+        transaction.commit()
+        self.assertIsNone(self.storage.get(uri1))
+        self.assertTrue(os.path.exists(path))
+
+        # aborted remove
+        self.storage.remove(uri2)
+        transaction.abort()
+        self.assertTrue(os.path.exists(path))
+
+        self.storage.remove(uri2)
+        transaction.commit()
+        self.assertFalse(os.path.exists(path))
+
+        self.storage.remove('blob-fs:unknown')
+
+    def test_fsblob_remove_recheck(self):
+        blob = self.storage.add(BytesIO(bytes_('blob data','utf-8')))
+        uri, path = blob.__uri__, self.storage.path(blob.hash)
+        transaction.commit()
+
+        # same data is stored again after release
+        self.storage.remove(uri)
+        self.storage.add(BytesIO(bytes_('blob data','utf-8')))
+        transaction.commit()
+        self.assertTrue(os.path.exists(path))
+
+    def test_fsblob_remove_grace(self):
+        blob = self.storage.add(BytesIO(bytes_('blob data','utf-8')))
+        uri, path = blob.__uri__, self.storage.path(blob.hash)
+        transaction.commit()
+
+        # file stored by concurrent transaction during grace period
+        self.storage.grace = 60
+        self.storage.remove(uri)
+        transaction.commit()
+        self.assertTrue(os.path.exists(path))
+
+        mtime = os.path.getmtime(path) - 120
+        os.utime(path, (mtime, mtime))
+        self.assertEqual(self.storage.collect(), 1)
+        self.assertFalse(os.path.exists(path))
+
+    def test_fsblob_abort(self):
+        blob = self.storage.add(BytesIO(bytes_('blob data','utf-8')))
+        path = self.storage.path(blob.hash)
+        transaction.commit()
+
+        blob = self.storage.add(BytesIO(bytes_('new data','utf-8')))
+        new_path = self.storage.path(blob.hash)
+        self.storage.add(BytesIO(bytes_('blob data','utf-8')))
+        transaction.abort()
+
+        self.assertFalse(os.path.exists(new_path))
+        self.assertTrue(os.path.exists(path))
+
+        # committed transaction keeps files
+        self.storage.add(BytesIO(bytes_('new data','utf-8')))
+        transaction.commit()
+        self.assertTrue(os.path.exists(new_path))
+
+    def test_fsblob_collect(self):
+        blob = self.storage.add(BytesIO(bytes_('blob data','utf-8')))
+        path = self.storage.path(blob.hash)
+        transaction.commit()
+
+        unused = self.storage.path('0'*64)
+        os.makedirs(os.path.dirname(unused))
+        tmp = os.path.join(self.dir, 'tmp', 'tmpfile')
+        for name in (unused, tmp):
+            with open(name, 'wb') as f:
+                f.write(bytes_('data','utf-8'))
+
+        self.storage.grace = 60
+        self.assertEqual(self.storage.collect(), 0)
+
+        self.storage.grace = 0
+        self.assertEqual(self.storage.collect(), 2)
+        self.assertFalse(os.path.exists(unused))
+        self.assertFalse(os.path.exists(tmp))
+        self.assertTrue(os.path.exists(path))
+
+    def test_fsblob_migrate(self):
+        import ptah
+        from ptah.cms.blob import migrate_sql_blobs
+
+        uris = []
+        for idx in range(5):
+            blob = ptah.cms.blob_storage.add(
+                BytesIO(bytes_('blob%s'%idx,'utf-8')),
+                filename='test%s.txt'%idx, mimetype='text/plain')
+            uris.append(blob.__uri__)
+        ptah.cms.blob_storage.create()
+        transaction.commit()
+
+        self.assertEqual(migrate_sql_blobs(2), 6)
+        self.assertEqual(migrate_sql_blobs(2), 0)
+
+        blob = ptah.resolve(uris[3])
+        self.assertIsInstance(blob, ptah.cms.blob.FsBlob)
+        self.assertEqual(blob.__uri__, uris[3])
+        self.assertEqual(blob.read(), bytes_('blob3','utf-8'))
+        self.assertEqual(blob.filename, 'test3.txt')
+        self.assertEqual(blob.mimetype, 'text/plain')
+        self.assertEqual(blob.size, 5)
+
+        blobs = ptah.resolve_many(uris)
+        self.assertEqual([blobs[uri].read() for uri in uris],
+                         [bytes_('blob%s'%idx,'utf-8') for idx in range(5)])
+        self.assertEqual(
+            ptah.cms.Session.query(ptah.cms.blob.Blob).count(), 0)
+
+    def test_fsblob_settings(self):
+        import ptah
+        from ptah.cms.blob import initialized
+
+        self.storage.directory = ''
+
+        BLOB = ptah.get_settings(ptah.CFG_ID_BLOB, self.registry)
+        BLOB['fs_path'] = self.dir
+        BLOB['offload'] = 'x-accel-redirect'
+        BLOB['offload_prefix'] = '/protected/'
+        BLOB['fs_grace'] = 600
+        initialized(
+            ptah.events.SettingsInitializing(self.config, self.registry))
+
+        self.assertEqual(self.storage.directory, self.dir)
+        self.assertEqual(self.storage.grace, 600)
+        self.assertEqual(self.storage.offload, 'x-accel-redirect')
+        self.assertEqual(self.storage.offload_prefix, '/protected/')
+
+    def _nginx(self, response, location):
+        """ X-Accel-Redirect handling of nginx internal location """
+        uri = response.headers.pop('X-Accel-Redirect')
+        self.assertTrue(uri.startswith(location))
+
+        path = os.path.join(self.dir, *uri[len(location):].split('/'))
+        with open(path, 'rb') as f:
+            response.body = f.read()
+        return response
+
+    def test_fsblob_offload_accel_redirect(self):
+        from pyramid.request import Request
+        from ptah.cms.rest import blobData
+
+        self.storage.offload = 'x-accel-redirect'
+        self.storage.offload_prefix = '/protected/'
+
+        blob = self.storage.add(
+            BytesIO(bytes_('blob data','utf-8')),
+            filename='test.txt', mimetype='text/plain')
+
+        request = Request.blank('/')
+        request.registry = self.registry
+        response = blobData(blob, request)
+        self.assertEqual(
+            response.headers['X-Accel-Redirect'],
+            '/protected/%s/%s/%s'%(blob.hash[:2], blob.hash[2:4], blob.hash))
+        self.assertEqual(response.body, bytes_('','utf-8'))
+        self.assertEqual(response.content_type, 'text/plain')
+        self.assertEqual(response.content_disposition, 'filename="test.txt"')
+
+        response = self._nginx(response, '/protected/')
+        self.assertEqual(response.body, bytes_('blob data','utf-8'))
+
+    def test_fsblob_offload_sendfile(self):
+        from ptah.cms.rest import blobData
+
+        self.storage.offload = 'x-sendfile'
+
+        blob = self.storage.add(BytesIO(bytes_('blob data','utf-8')))
+        response = blobData(blob, self.request)
+
+        path = response.headers['X-Sendfile']
+        self.assertEqual(path, self.storage.path(blob.hash))
+        with open(path, 'rb') as f:
+            self.assertEqual(f.read(), bytes_('blob data','utf-8'))
+        self.assertEqual(response.body, bytes_('','utf-8'))
+
+    def test_fsblob_offload_not_fs(self):
+        import ptah
+        from ptah.cms.rest import blobData
+
+        self.storage.offload = 'x-sendfile'
+
+        blob = ptah.cms.blob_storage.add(BytesIO(bytes_('blob data','utf-8')))
+        self.assertIsNone(self.storage.offload_header(blob))
+
+        response = blobData(blob, self.request)
+        self.assertNotIn('X-Sendfile', response.headers)
+        self.assertEqual(response.body, bytes_('blob data','utf-8'))
+
+        self.assertIsNone(self.storage.offload_header(self.storage.create()))
@@ -0,0 +1,245 @@
+import transaction
+import sqlalchemy as sqla
+
+import ptah
+from ptah.testing import PtahTestCase, StatementRecorder
+
+
+class TestBulkCreate(PtahTestCase):
+
+    _init_ptah = False
+
+    def setUp(self):
+        global Page, Folder, OrderedFolder
+        class Page(ptah.cms.Content):
+            __type__ = ptah.cms.Type('page', 'Test Page', permission=None)
+            __uri_factory__ = ptah.UriFactory('cms-page')
+
+        class Folder(ptah.cms.Container):
+            __type__ = ptah.cms.Type('folder', 'Test Folder')
+            __uri_factory__ = ptah.UriFactory('cms-folder')
+
+        class OrderedFolder(ptah.cms.Container):
+            __type__ = ptah.cms.Type('ordered', 'Test Ordered Folder')
+            __uri_factory__ = ptah.UriFactory('cms-ordered')
+            __ordered__ = True
+
+        self.Page = Page
+        self.Folder = Folder
+        self.OrderedFolder = OrderedFolder
+
+        super(TestBulkCreate, self).setUp()
+        self.init_ptah()
+
+    def _folder(self, factory=None):
+        folder = (factory or self.Folder)(title='Folder', __path__='/')
+        ptah.cms.Session.add(folder)
+        ptah.cms.Session.flush()
+        return folder
+
+    def test_bulk_create(self):
+        folder = self._folder()
+        folder_uri = folder.__uri__
+
+        records = [{'__name__': 'page%s'%idx, 'title': 'Page %s'%idx,
+                    'subjects': ['bulk']} for idx in range(5)]
+        result = ptah.cms.bulk_create(folder, self.Page.__type__, records,
+                                      batch=2)
+        self.assertEqual(len(result), 5)
+        self.assertEqual(result.conflicts, [])
+        self.assertEqual(result.errors, [])
+        transaction.commit()
+
+        folder = ptah.resolve(folder_uri)
+        self.assertEqual(list(folder.keys()),
+                         ['page0', 'page1', 'page2', 'page3', 'page4'])
+
+        page = folder['page3']
+        self.assertIsInstance(page, self.Page)
+        self.assertEqual(page.__uri__, result.created[3])
+        self.assertEqual(page.__path__, '/page3/')
+        self.assertEqual(page.__parent_uri__, folder_uri)
+        self.assertEqual(page.title, 'Page 3')
+        self.assertEqual(page.description, '')
+        self.assertEqual(page.subjects, ['bulk'])
+        self.assertEqual(page.__local_roles__, {})
+        self.assertIsNotNone(page.created)
+        self.assertEqual(page.created, page.modified)
+
+        self.assertIs(ptah.resolve(page.__uri__).__parent__, folder)
+
+    def test_bulk_create_type_uri(self):
+        folder = self._folder()
+
+        result = ptah.cms.bulk_create(
+            folder, 'cms-type:page', [{'__name__': 'page', 'title': 'P'}])
+        self.assertEqual(len(result), 1)
+
+        self.assertRaises(
+            ptah.cms.NotFound,
+            ptah.cms.bulk_create, folder, 'cms-type:unknown', [])
+        self.assertRaises(
+            ptah.cms.Error, ptah.cms.bulk_create,
+            self.Page(), self.Page.__type__, [])
+
+    def test_bulk_create_conflicts(self):
+        folder = self._folder()
+        folder['page1'] = self.Page(title='Existing')
+
+        records = [{'__name__': 'page%s'%idx, 'title': 'Page'}
+                   for idx in range(3)]
+        records.append({'__name__': 'page2', 'title': 'Duplicate'})
+        result = ptah.cms.bulk_create(folder, self.Page.__type__, records)
+
+        self.assertEqual(sorted(result.conflicts), ['page1', 'page2'])
+        self.assertEqual(len(result.created), 2)
+        self.assertEqual(folder['page1'].title, 'Existing')
+        self.assertEqual(folder['page2'].title, 'Page')
+
+    def test_bulk_create_validation(self):
+        folder = self._folder()
+
+        records = [{'__name__': 'page', 'title': None},
+                   {'__name__': 'a/b', 'title': 'Page'},
+                   {'title': 'Page'},
+                   {'__name__': 'valid', 'title': 'Page'}]
+        result = ptah.cms.bulk_create(folder, self.Page.__type__, records)
+
+        self.assertEqual(len(result.created), 1)
+        self.assertEqual([name for name, errors in result.errors],
+                         ['page', 'a/b', None])
+        self.assertIn('title', result.errors[0][1])
+        self.assertEqual(result.errors[1][1], {'__name__': 'Invalid name'})
+
+    def test_bulk_create_structural_attrs(self):
+        folder = self._folder()
+        folder_uri = folder.__uri__
+        other = self._folder()
+
+        records = [{'__name__': 'page', 'title': 'Page',
+                    '__parent_uri__': other.__uri__,
+                    '__type_id__': 'cms-type:folder',
+                    '__uri__': 'cms-page:custom',
+                    '__path__': '/other/',
+                    '__owner__': 'user',
+                    '__acls__': ['evil'],
+                    '__local_roles__': {'user': ['role:Manager']},
+                    'publisher': 'Publisher'}]
+        result = ptah.cms.bulk_create(folder, self.Page.__type__, records)
+        self.assertNotEqual(result.created, ['cms-page:custom'])
+        transaction.commit()
+
+        page = ptah.resolve(result.created[0])
+        self.assertIsInstance(page, self.Page)
+        self.assertEqual(page.__parent_uri__, folder_uri)
+        self.assertEqual(page.__type_id__, 'cms-type:page')
+        self.assertEqual(page.__path__, '/page/')
+        self.assertEqual(page.__owner__, '')
+        self.assertEqual(page.__acls__, [])
+        self.assertEqual(page.__local_roles__, {})
+        self.assertEqual(page.publisher, 'Publisher')
+
+    def test_bulk_create_permission(self):
+        folder = self._folder()
+
+        self.Page.__type__.permission = ptah.cms.AddContent
+        self.addCleanup(setattr, self.Page.__type__, 'permission', None)
+
+        self.assertRaises(
+            ptah.cms.Forbidden, ptah.cms.bulk_create,
+            folder, self.Page.__type__, [{'__name__': 'page', 'title': 'P'}])
+
+    def test_bulk_create_ordered(self):
+        folder = self._folder(self.OrderedFolder)
+        folder['first'] = self.Page(title='First')
+        ptah.cms.Session.flush()
+
+        ptah.cms.bulk_create(
+            folder, self.Page.__type__,
+            [{'__name__': 'b', 'title': 'B'}, {'__name__': 'a', 'title': 'A'}])
+        folder['last'] = self.Page(title='Last')
+
+        self.assertEqual(list(folder.keys()), ['first', 'b', 'a', 'last'])
+
+    def test_bulk_create_executemany(self):
+        self._folder()
+        transaction.commit()
+
+        with StatementRecorder(lambda s: s.startswith('INSERT')) as inserts:
+            folder = ptah.cms.Session.query(self.Folder).one()
+            records = [{'__name__': 'page%s'%idx, 'title': 'Page'}
+                       for idx in range(10)]
+            ptah.cms.bulk_create(folder, self.Page.__type__, records,
+                                 batch=5)
+
+        statements = [(statement.split()[2], many)
+                      for statement, many in zip(inserts, inserts.many)]
+        self.assertEqual(statements.count(('ptah_nodes', True)), 2)
+        self.assertEqual(statements.count(('ptah_content', True)), 2)
+
+    def test_bulk_create_event(self):
+        folder = self._folder()
+
+        events = []
+        self.config.add_subscriber(
+            events.append, ptah.events.ContentsAddedEvent)
+
+        result = ptah.cms.bulk_create(
+            folder, self.Page.__type__,
+            [{'__name__': 'page%s'%idx, 'title': 'Page'} for idx in range(3)],
+            batch=2)
+
+        self.assertEqual(len(events), 2)
+        self.assertIs(events[0].container, folder)
+        self.assertIs(events[0].tinfo, self.Page.__type__)
+        self.assertEqual([item['__uri__'] for ev in events
+                          for item in ev.items], result.created)
+
+    def test_bulk_create_indexes(self):
+        folder = self._folder()
+        ptah.cms.bulk_create(
+            folder, self.Page.__type__,
+            [{'__name__': 'page', 'title': 'Bulk python',
+              'subjects': ['python']}])
+        transaction.commit()
+
+        self.assertEqual(len(ptah.cms.search('python')), 1)
+        self.assertEqual(len(ptah.cms.find_by_subject('python')), 1)
+
+
+class TestBulkCreateTypeTable(PtahTestCase):
+
+    _init_ptah = False
+
+    def test_bulk_create_type_table(self):
+        global Document, Folder
+        class Document(ptah.cms.Content):
+            __tablename__ = 'test_bulk_documents'
+            __type__ = ptah.cms.Type(
+                'document', 'Test Document', permission=None)
+            __uri_factory__ = ptah.UriFactory('cms-document')
+
+            text = sqla.Column(sqla.UnicodeText)
+            rating = sqla.Column(sqla.Integer, default=3,
+                                 info={'missing': None})
+
+        class Folder(ptah.cms.Container):
+            __type__ = ptah.cms.Type('folder', 'Test Folder')
+            __uri_factory__ = ptah.UriFactory('cms-folder')
+
+        self.init_ptah()
+
+        folder = Folder(title='Folder', __path__='/')
+        ptah.cms.Session.add(folder)
+
+        result = ptah.cms.bulk_create(
+            folder, Document.__type__,
+            [{'__name__': 'doc1', 'title': 'Doc', 'text': 'Body',
+              'rating': 1},
+             {'__name__': 'doc2', 'title': 'Doc', 'text': 'Body 2'}])
+        transaction.commit()
+
+        doc1, doc2 = [ptah.resolve(uri) for uri in result.created]
+        self.assertEqual((doc1.text, doc1.rating), ('Body', 1))
+        self.assertEqual((doc2.text, doc2.rating), ('Body 2', 3))
+        self.assertEqual(ptah.cms.search_index.count('body'), 2)
@@ -1,13 +1,16 @@
 import transaction
+from io import BytesIO
+from pyramid.compat import bytes_
 
 import ptah
-from ptah.testing import PtahTestCase
+from ptah.cms.content import NULL_POSITION
+from ptah.testing import PtahTestCase, StatementRecorder
 
 
 class TestContainer(PtahTestCase):
 
     def setUp(self):
-        global Content, Container
+        global Content, Container, OrderedContainer
         class Content(ptah.cms.Content):
             __type__ = ptah.cms.Type('content', 'Test Content')
             __uri_factory__ = ptah.UriFactory('cms-content')
@@ -16,8 +19,14 @@ class TestContainer(PtahTestCase):
             __type__ = ptah.cms.Type('container', 'Test Container')
             __uri_factory__ = ptah.UriFactory('cms-container')
 
+        class OrderedContainer(ptah.cms.Container):
+            __type__ = ptah.cms.Type('ordered', 'Test Ordered Container')
+            __uri_factory__ = ptah.UriFactory('cms-ordered')
+            __ordered__ = True
+
         self.Content = Content
         self.Container = Container
+        self.OrderedContainer = OrderedContainer
 
         super(TestContainer, self).setUp()
 
@@ -102,6 +111,181 @@ class TestContainer(PtahTestCase):
         self.assertEqual([c.__uri__ for c in container.values()],
                          [c2.__uri__])
 
+    def test_container_len_contains(self):
+        container = self.Container(__name__ = 'container',
+                                   __path__ = '/container/')
+        ptah.cms.Session.add(container)
+        self.assertEqual(len(container), 0)
+        self.assertTrue(container)
+
+        container['content1'] = self.Content(title='Content1')
+        container['content2'] = self.Content(title='Content2')
+        self.assertEqual(len(container), 2)
+
+        container_uri = container.__uri__
+        transaction.commit()
+
+        container = ptah.resolve(container_uri)
+
+        with StatementRecorder() as statements:
+            self.assertEqual(len(container), 2)
+            self.assertIn('content1', container)
+            self.assertNotIn('content3', container)
+
+        # count and exists queries, keys are not loaded
+        self.assertEqual(len(statements), 3)
+        self.assertIn('count(', statements[0])
+        self.assertIn('EXISTS', statements[1])
+        self.assertFalse(container._v_keys_loaded)
+
+        container['content3'] = self.Content(title='Content3')
+        self.assertIn('content3', container)
+        self.assertEqual(len(container), 3)
+
+        # loaded keys
+        self.assertEqual(len(container.keys()), 3)
+        self.assertIn('content2', container)
+        self.assertNotIn('content4', container)
+
+        del container['content1']
+        self.assertNotIn('content1', container)
+        self.assertEqual(len(container), 2)
+
+    def test_container_indexes(self):
+        from ptah.cms.node import Node
+        from ptah.cms.content import BaseContent
+
+        for table, name in ((Node.__table__, 'parent'),
+                            (BaseContent.__table__, 'name')):
+            indexed = set(col.name for idx in table.indexes
+                          for col in idx.columns)
+            self.assertIn(name, indexed)
+
+    def test_container_json_lists_bulk_load(self):
+        container = self.Container(__name__='container',
+                                   __path__='/container/')
+        ptah.cms.Session.add(container)
+        for idx in range(3):
+            container['c%s'%idx] = self.Content(subjects=['s%s'%idx])
+        uris = [item.__uri__ for item in container.values()]
+        container_uri = container.__uri__
+        transaction.commit()
+
+        # json lists are selected with content, no query per item
+        loaders = (
+            lambda: list(ptah.resolve_many(uris).values()),
+            lambda: list(ptah.cms.query(parent=container_uri)),
+            lambda: ptah.resolve(container_uri).page(3)[0],
+            lambda: ptah.resolve(container_uri).values())
+        for loader in loaders:
+            transaction.commit()
+            items = loader()
+            with StatementRecorder() as statements:
+                self.assertEqual(
+                    sorted(s for item in items for s in item.subjects),
+                    ['s0', 's1', 's2'])
+            self.assertEqual(statements, [])
+
+    def _create_ordered(self, count):
+        container = self.OrderedContainer(
+            __name__ = 'container', __path__ = '/container/')
+        ptah.cms.Session.add(container)
+
+        for idx in range(count):
+            container['c%s'%idx] = self.Content(title='Content')
+
+        container_uri = container.__uri__
+        transaction.commit()
+        return ptah.resolve(container_uri)
+
+    def test_container_ordered(self):
+        container = self._create_ordered(4)
+
+        self.assertEqual(container.keys(), ['c0', 'c1', 'c2', 'c3'])
+        self.assertEqual([c.__position__ for c in container.values()],
+                         [1024, 2048, 3072, 4096])
+        self.assertEqual([c.__name__ for c in container.iter_values(2)],
+                         ['c0', 'c1', 'c2', 'c3'])
+
+        # position index can be used
+        with StatementRecorder() as statements:
+            container.page(2, after=(1024, 0))
+        self.assertIn('ORDER BY ptah_content.position', statements[-1])
+
+        # position of pending items
+        container['c4'] = self.Content(title='Content')
+        container['c5'] = self.Content(title='Content')
+        self.assertEqual(container['c5'].__position__, 6144)
+
+        self.assertRaises(
+            ptah.cms.Error, self.Container().move_to, 'c0', 1)
+        self.assertRaises(
+            ptah.cms.Error, self.Container().reorder, ['c0'])
+
+    def test_container_move_to(self):
+        container = self._create_ordered(4)
+
+        with StatementRecorder(lambda s: s.startswith('UPDATE')) \
+                as statements:
+            container.move_to('c3', 1)
+            self.assertEqual(container.keys(), ['c0', 'c3', 'c1', 'c2'])
+            ptah.cms.Session.flush()
+
+        # only moved item is updated
+        self.assertEqual(len(statements), 1)
+        self.assertEqual(container['c3'].__position__, 1536)
+
+        container.move_to('c2', 0)
+        self.assertEqual(container.keys(), ['c2', 'c0', 'c3', 'c1'])
+
+        container.move_to('c2', 100)
+        self.assertEqual(container.keys(), ['c0', 'c3', 'c1', 'c2'])
+
+        container.move_to('c1', 0)
+        self.assertEqual(container.keys(), ['c1', 'c0', 'c3', 'c2'])
+
+        container_uri = container.__uri__
+        transaction.commit()
+
+        container = ptah.resolve(container_uri)
+        self.assertEqual([c.__name__ for c in container.iter_values()],
+                         ['c1', 'c0', 'c3', 'c2'])
+
+    def test_container_move_to_renumber(self):
+        container = self._create_ordered(3)
+
+        # no gap between c0 and c1
+        container['c1'].__position__ = 1025
+        container.move_to('c2', 1)
+
+        self.assertEqual(container.keys(), ['c0', 'c2', 'c1'])
+        self.assertEqual([c.__position__ for c in container.values()],
+                         [1024, 2048, 3072])
+
+        # children without positions
+        container['c2'].__position__ = NULL_POSITION
+        container.move_to('c0', 1)
+        self.assertEqual(container.keys()[1], 'c0')
+        self.assertEqual([c.__position__ for c in container.values()],
+                         [1024, 2048, 3072])
+
+    def test_container_reorder(self):
+        container = self._create_ordered(4)
+        c3 = container['c3']
+
+        container.reorder(['c2', 'c3', 'c2'])
+        self.assertEqual(container.keys(), ['c2', 'c3', 'c0', 'c1'])
+        self.assertEqual(c3.__position__, 2048)
+        self.assertNotIn(c3, ptah.cms.Session.dirty)
+
+        self.assertRaises(KeyError, container.reorder, ['unknown'])
+
+        container_uri = container.__uri__
+        transaction.commit()
+
+        container = ptah.resolve(container_uri)
+        self.assertEqual(container.keys(), ['c2', 'c3', 'c0', 'c1'])
+
     def test_container_simple_move(self):
         container = self.Container(__name__ = 'container',
                                    __path__ = '/container/')
@@ -282,6 +466,151 @@ class TestContainer(PtahTestCase):
         self.assertEqual(content.__path__,
                          '/container/new-folder/folder2/content/')
 
+    def test_container_rename_subtree_one_update(self):
+        container = self.Container(__name__ = 'container',
+                                   __path__ = '/container/')
+        ptah.cms.Session.add(container)
+        ptah.cms.Session.flush()
+
+        parent = container
+        for idx in range(5):
+            folder = self.Container(title='Folder%s'%idx)
+            ptah.cms.Session.add(folder)
+            ptah.cms.Session.flush()
+            parent['folder%s'%idx] = folder
+            parent = folder
+
+        content = self.Content(title='Content')
+        parent['content'] = content
+
+        content_uri = content.__uri__
+        container_uri = container.__uri__
+        transaction.commit()
+
+        with StatementRecorder(lambda s: s.startswith('UPDATE')) \
+                as statements:
+            content = ptah.resolve(content_uri)
+            container = ptah.resolve(container_uri)
+            folder1 = container['folder0']['folder1']
+            container['new'] = container['folder0']
+
+        # one update for moved container, one for subtree
+        self.assertEqual(len(statements), 2)
+
+        # loaded objects have new path
+        self.assertEqual(folder1.__path__, '/container/new/folder1/')
+        self.assertEqual(
+            content.__path__,
+            '/container/new/folder1/folder2/folder3/folder4/content/')
+        self.assertNotIn(folder1, ptah.cms.Session.dirty)
+        transaction.commit()
+
+        content = ptah.resolve(content_uri)
+        self.assertEqual(
+            content.__path__,
+            '/container/new/folder1/folder2/folder3/folder4/content/')
+
+    def test_container_rename_subtree_like_chars(self):
+        container = self.Container(__name__ = 'container',
+                                   __path__ = '/container/')
+        folder1 = self.Container(title='Folder1')
+        folder2 = self.Container(title='Folder2')
+        content1 = self.Content(title='Content1')
+        content2 = self.Content(title='Content2')
+
+        ptah.cms.Session.add(container)
+        ptah.cms.Session.add(folder1)
+        ptah.cms.Session.add(folder2)
+        ptah.cms.Session.add(content1)
+        ptah.cms.Session.add(content2)
+        ptah.cms.Session.flush()
+
+        container['a_%'] = folder1
+        container['ab%x'] = folder2
+        folder1['content'] = content1
+        folder2['content'] = content2
+
+        uri1 = content1.__uri__
+        uri2 = content2.__uri__
+        container_uri = container.__uri__
+        transaction.commit()
+
+        container = ptah.resolve(container_uri)
+        container['moved'] = container['a_%']
+        transaction.commit()
+
+        self.assertEqual(ptah.resolve(uri1).__path__,
+                         '/container/moved/content/')
+        self.assertEqual(ptah.resolve(uri2).__path__,
+                         '/container/ab%x/content/')
+
+    def test_container_rename_subtree_case(self):
+        container = self.Container(__name__='container',
+                                   __path__='/container/')
+        ptah.cms.Session.add(container)
+        ptah.cms.Session.flush()
+
+        container['folder'] = self.Container(title='Folder')
+        container['folder']['content'] = self.Content(title='Content')
+        container['FOLDER'] = self.Container(title='Other')
+        container['FOLDER']['content'] = self.Content(title='Content')
+        uri1 = container['folder']['content'].__uri__
+        uri2 = container['FOLDER']['content'].__uri__
+        container_uri = container.__uri__
+        transaction.commit()
+
+        container = ptah.resolve(container_uri)
+        container['moved'] = container['folder']
+        transaction.commit()
+
+        self.assertEqual(ptah.resolve(uri1).__path__,
+                         '/container/moved/content/')
+        self.assertEqual(ptah.resolve(uri2).__path__,
+                         '/container/FOLDER/content/')
+
+    def test_container_moved_event_paths(self):
+        container = self.Container(__name__ = 'container',
+                                   __path__ = '/container/')
+        folder = self.Container(title='Folder')
+        ptah.cms.Session.add(container)
+        ptah.cms.Session.add(folder)
+        ptah.cms.Session.flush()
+        container['folder'] = folder
+
+        events = []
+        self.config.add_subscriber(
+            events.append, ptah.events.ContentMovedEvent)
+
+        container['new'] = folder
+        self.assertEqual(len(events), 1)
+        self.assertIs(events[0].object, folder)
+        self.assertEqual(events[0].oldpath, '/container/folder/')
+        self.assertEqual(events[0].newpath, '/container/new/')
+
+    def test_container_move_subtree_resolve_cache(self):
+        from ptah.uri import resolve_cache
+
+        container, uris = self._create_subtree(3, 0)
+        container_uri = container.__uri__
+        transaction.commit()
+
+        resolve_cache.resize(100)
+        try:
+            self.assertEqual(ptah.resolve(uris[2]).__path__,
+                             '/container/folder0/folder1/folder2/')
+            ptah.tldata.clear()
+
+            container = ptah.resolve(container_uri)
+            container['moved'] = container['folder0']
+            transaction.commit()
+            ptah.tldata.clear()
+
+            self.assertEqual(ptah.resolve(uris[2]).__path__,
+                             '/container/moved/folder1/folder2/')
+        finally:
+            resolve_cache.resize(0)
+            resolve_cache.clear()
+
     def test_container_move_self_recursevly(self):
         container = self.Container(__name__ = 'container',
                                    __path__ = '/container/')
@@ -357,6 +686,175 @@ class TestContainer(PtahTestCase):
         self.assertTrue(ptah.resolve(content_uri) is None)
         self.assertTrue(ptah.resolve(folder_uri) is None)
 
+    def test_container_delete_subtree_case(self):
+        container = self.Container(__name__='container',
+                                   __path__='/container/')
+        ptah.cms.Session.add(container)
+        ptah.cms.Session.flush()
+
+        container['folder'] = self.Container(title='Folder')
+        container['folder']['content'] = self.Content(title='Content')
+        container['FOLDER'] = self.Container(title='Other')
+        container['FOLDER']['content'] = self.Content(title='Content')
+        uris = [container['FOLDER'].__uri__,
+                container['FOLDER']['content'].__uri__]
+        container_uri = container.__uri__
+        transaction.commit()
+
+        container = ptah.resolve(container_uri)
+        del container['folder']
+        transaction.commit()
+
+        for uri in uris:
+            self.assertIsNotNone(ptah.resolve(uri))
+        self.assertEqual(ptah.resolve(uris[1]).__path__,
+                         '/container/FOLDER/content/')
+
+    def _create_subtree(self, depth, width):
+        container = self.Container(__name__='container', __path__='/container/')
+        ptah.cms.Session.add(container)
+        ptah.cms.Session.flush()
+
+        uris = []
+        parent = container
+        for idx in range(depth):
+            folder = self.Container(title='Folder%s'%idx)
+            parent['folder%s'%idx] = folder
+            uris.append(folder.__uri__)
+            for cidx in range(width):
+                content = self.Content(title='Content')
+                folder['content%s'%cidx] = content
+                uris.append(content.__uri__)
+            parent = folder
+
+        return container, uris
+
+    def test_container_delete_subtree_batch(self):
+        container, uris = self._create_subtree(4, 3)
+        container_uri = container.__uri__
+        transaction.commit()
+
+        events = []
+        self.config.add_subscriber(
+            events.append, ptah.events.ContentDeletingEvent)
+        self.config.add_subscriber(
+            events.append, ptah.events.ContentsDeletingEvent)
+
+        def deletes(statement):
+            return statement.startswith('DELETE') and \
+                'ptah_search' not in statement and \
+                'ptah_content_terms' not in statement
+
+        with StatementRecorder(deletes) as statements:
+            container = ptah.resolve(container_uri)
+            del container['folder0']
+
+        # subtree from ptah_content and ptah_nodes, folder itself
+        self.assertEqual(len(statements), 4)
+
+        self.assertEqual(len(events), 2)
+        self.assertIsInstance(events[0], ptah.events.ContentDeletingEvent)
+        self.assertEqual(events[0].object.__uri__, uris[0])
+        self.assertIsInstance(events[1], ptah.events.ContentsDeletingEvent)
+        self.assertEqual(sorted(events[1].uris), sorted(uris))
+
+        transaction.commit()
+
+        for uri in uris:
+            self.assertIsNone(ptah.resolve(uri))
+        self.assertEqual(ptah.cms.Session.query(ptah.cms.Node).count(), 1)
+
+    def test_container_delete_subtree_blob(self):
+        container, uris = self._create_subtree(2, 1)
+        folder = container['folder0']['folder1']
+        blob = ptah.cms.blob_storage.add(
+            BytesIO(bytes_('blob data', 'utf-8')), folder)
+        blob_uri = blob.__uri__
+        container_uri = container.__uri__
+        transaction.commit()
+
+        ptah.cms.Session.execute('PRAGMA foreign_keys=ON')
+        try:
+            container = ptah.resolve(container_uri)
+            del container['folder0']
+            transaction.commit()
+        finally:
+            transaction.abort()
+            ptah.cms.Session.execute('PRAGMA foreign_keys=OFF')
+
+        for uri in uris:
+            self.assertIsNone(ptah.resolve(uri))
+
+        blob = ptah.resolve(blob_uri)
+        self.assertIsNotNone(blob)
+        self.assertIsNone(blob.__parent_uri__)
+
+    def test_container_delete_loaded_subtree(self):
+        container, uris = self._create_subtree(3, 2)
+        container_uri = container.__uri__
+        transaction.commit()
+
+        # whole subtree is loaded
+        container = ptah.resolve(container_uri)
+        folder = container['folder0']['folder1']
+        folder.values()
+        folder['folder2'].values()
+
+        del container['folder0']
+        self.assertNotIn(folder, ptah.cms.Session)
+        transaction.commit()
+
+        for uri in uris:
+            self.assertIsNone(ptah.resolve(uri))
+
+    def test_container_batchdelete(self):
+        container, uris = self._create_subtree(2, 2)
+        container['content'] = self.Content(title='Content')
+        container_uri = container.__uri__
+        content_uri = container['content'].__uri__
+        transaction.commit()
+
+        events = []
+        self.config.add_subscriber(
+            events.append, ptah.events.ContentsDeletingEvent)
+
+        ptah.auth_service.set_userid(ptah.SUPERUSER_URI)
+        container = ptah.resolve(container_uri)
+        container.batchdelete([uris[0], content_uri, uris[1], 'unknown'])
+        self.assertEqual(container.keys(), [])
+
+        self.assertEqual(len(events), 1)
+        self.assertEqual(sorted(events[0].uris), sorted(uris+[content_uri]))
+
+        transaction.commit()
+
+        container = ptah.resolve(container_uri)
+        self.assertEqual(container.keys(), [])
+        for uri in uris:
+            self.assertIsNone(ptah.resolve(uri))
+
+    def test_container_batchdelete_permission(self):
+        container, uris = self._create_subtree(1, 2)
+        container_uri = container.__uri__
+        transaction.commit()
+
+        def check_permission(permission, content, *args, **kw):
+            return content.__uri__ != uris[0]
+
+        orig_check_permission = ptah.check_permission
+        ptah.check_permission = check_permission
+        try:
+            container = ptah.resolve(container_uri)
+            self.assertRaises(
+                ptah.cms.Forbidden, container.batchdelete, uris)
+        finally:
+            ptah.check_permission = orig_check_permission
+
+        transaction.commit()
+
+        for uri in uris:
+            self.assertIsNotNone(ptah.resolve(uri))
+
     def test_container_setitem_parent_not_node(self):
         container = self.Container(__name__='container', __path__='/container/')
         content = self.Content(title='Content')
@@ -407,3 +905,91 @@ class TestContainer(PtahTestCase):
         info = container.info()
         self.assertEqual(info['__name__'], 'container')
         self.assertTrue(info['__container__'])
+
+    def test_container_page(self):
+        container = self.Container(__name__='container', __path__='/container/')
+        ptah.cms.Session.add(container)
+
+        for name, title in (('c', 'B'), ('a', 'C'), ('b', 'A'), ('d', 'A')):
+            container[name] = self.Content(title=title)
+
+        container_uri = container.__uri__
+        transaction.commit()
+
+        container = ptah.resolve(container_uri)
+
+        items, after = container.page(2)
+        self.assertEqual([i.__name__ for i in items], ['a', 'b'])
+        self.assertEqual(after[0], 'b')
+        self.assertIs(items[0].__parent__, container)
+
+        items, after = container.page(2, after=after)
+        self.assertEqual([i.__name__ for i in items], ['c', 'd'])
+
+        items, after = container.page(2, after=after)
+        self.assertEqual(items, [])
+        self.assertIsNone(after)
+
+        items, after = container.page(3, 'title')
+        self.assertEqual([i.__name__ for i in items], ['b', 'd', 'c'])
+
+        items, after = container.page(3, 'title', after)
+        self.assertEqual([i.__name__ for i in items], ['a'])
+        self.assertIsNone(after)
+
+        # children are not cached
+        self.assertFalse(container._v_items)
+
+        self.assertRaises(ValueError, container.page, 2, 'unknown')
+        self.assertRaises(ValueError, container.page, 2, 'info')
+
+        # frozen statements are not cached per page size
+        queries = {}
+        for limit in (1, 2, 3):
+            items, after = container.page(limit, queries=queries)
+            self.assertEqual(len(items), limit)
+        self.assertEqual(len(queries), 1)
+
+    def test_container_iter_values(self):
+        container = self.Container(__name__='container', __path__='/container/')
+
+        for idx in range(7):
+            container['content%s'%idx] = self.Content()
+
+        self.assertEqual(
+            [item.__name__ for item in container.iter_values(batch_size=3)],
+            ['content%s'%idx for idx in range(7)])
+        self.assertEqual(
+            [item.__name__ for item in container.iter_values(
+                batch_size=3, after=('content4', 0))],
+            ['content4', 'content5', 'content6'])
+
+    def test_container_iter_values_null_positions(self):
+        container = self.OrderedContainer(
+            __name__='container', __path__='/container/')
+        ptah.cms.Session.add(container)
+
+        for idx in range(5):
+            container['content%s'%idx] = self.Content()
+        ptah.cms.Session.flush()
+
+        # children created before container was ordered
+        table = ptah.cms.BaseContent.__table__
+        ptah.cms.Session.execute(
+            table.update().where(table.c.name.in_(['content1', 'content3']))
+            .values(position=NULL_POSITION))
+        container_uri = container.__uri__
+        transaction.commit()
+
+        container = ptah.resolve(container_uri)
+        self.assertEqual(len(container), 5)
+        self.assertEqual(
+            container.keys(),
+            ['content1', 'content3', 'content0', 'content2', 'content4'])
+
+        self.assertEqual(
+            [item.__name__ for item in container.iter_values(batch_size=1)],
+            container.keys())
+        self.assertEqual(
+            [item.__name__ for item in container.iter_values(batch_size=2)],
+            container.keys())
@@ -94,6 +94,25 @@ class TestContent(PtahTestCase):
 
         self.assertEqual(content.__owner__, 'user')
 
+    def test_content_created_deferred(self):
+        import ptah, ptah.cms
+
+        class MyContent(ptah.cms.Content):
+            __type__ = ptah.cms.Type('mycontent', 'MyContent')
+
+        MyContent.__type__.cls = MyContent
+
+        ptah.auth_service.set_userid('user')
+        ptah.events.defer()
+        try:
+            content = MyContent.__type__.create(title='Content')
+        finally:
+            transaction.abort()
+
+        self.assertEqual(content.__owner__, 'user')
+        self.assertTrue(isinstance(content.created, datetime))
+        self.assertEqual(content.created, content.modified)
+
     def test_content_info(self):
         import ptah, ptah.cms
 
@@ -137,6 +156,72 @@ class TestContent(PtahTestCase):
         self.assertEqual(content.title, 'Test title')
         self.assertTrue(content.modified > modified)
 
+    def test_content_update_deferred(self):
+        import ptah, ptah.cms
+
+        class MyContent(ptah.cms.Content):
+            __type__ = ptah.cms.Type('mycontent', 'MyContent')
+
+        content = MyContent()
+        self.registry.notify(ptah.events.ContentCreatedEvent(content))
+
+        modified = content.modified
+        time.sleep(0.1)
+
+        ptah.events.defer()
+        content.update(title='Test title')
+        self.assertTrue(content.modified > modified)
+        transaction.abort()
+
+    def test_content_json_lists_deferred(self):
+        import ptah, ptah.cms
+
+        class MyContent(ptah.cms.Content):
+            __type__ = ptah.cms.Type('mycontent', 'MyContent')
+
+        content = MyContent(title='Content', subjects=['python'],
+                            __acls__=['acl'])
+        uri = content.__uri__
+        ptah.cms.Session.add(content)
+        transaction.commit()
+
+        content = ptah.cms.Session.query(ptah.cms.Content)\
+            .filter(ptah.cms.Content.__uri__ == uri).one()
+        self.assertIn('__acls__', content.__dict__)
+        self.assertNotIn('subjects', content.__dict__)
+        self.assertNotIn('creators', content.__dict__)
+
+        self.assertEqual(content.subjects, ['python'])
+        self.assertIn('creators', content.__dict__)
+
+    def test_content_json_lists_serializer(self):
+        import ptah, ptah.cms
+        from ptah.testing import StatementRecorder
+
+        class MyContent(ptah.cms.Content):
+            __type__ = ptah.cms.Type('mycontent', 'MyContent')
+
+            def _extra_info(self, info):
+                info['subjects'] = list(self.subjects)
+
+        MyContent.__type__.cls = MyContent
+
+        uris = []
+        for idx in range(3):
+            content = MyContent(subjects=['s%s'%idx])
+            ptah.cms.Session.add(content)
+            uris.append(content.__uri__)
+        transaction.commit()
+
+        # json lists of all items are loaded with one query
+        with StatementRecorder(lambda s: 'subjects' in s) as statements:
+            items = ptah.cms.Session.query(ptah.cms.Content)\
+                .filter(ptah.cms.Content.__uri__.in_(uris)).all()
+            infos = MyContent.__type__.serializer.many(items)
+        self.assertEqual(len(statements), 1)
+        self.assertEqual(sorted(info['subjects'][0] for info in infos),
+                         ['s0', 's1', 's2'])
+
     def test_content_delete(self):
         import ptah, ptah.cms
 
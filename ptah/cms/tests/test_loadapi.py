@@ -2,7 +2,7 @@ import transaction
 from pyramid.httpexceptions import HTTPNotFound, HTTPForbidden
 
 import ptah
-from ptah.testing import PtahTestCase
+from ptah.testing import PtahTestCase, StatementRecorder
 
 
 class TestLoadApi(PtahTestCase):
@@ -53,6 +53,75 @@ class TestLoadApi(PtahTestCase):
         content = ptah.cms.load(c_uri)
         self.assertEqual(content.__parent__.__uri__, co_uri)
 
+    def _create_tree(self):
+        root = Container(__name__='root', __path__='/root/')
+        folder1 = Container(title='Folder1')
+        folder2 = Container(title='Folder2')
+        content = Content(title='Content')
+
+        ptah.cms.Session.add(root)
+        root['folder1'] = folder1
+        folder1['folder2'] = folder2
+        folder2['content'] = content
+
+        uris = (root.__uri__, folder1.__uri__,
+                folder2.__uri__, content.__uri__)
+        transaction.commit()
+
+        ptah.cms.Session.expunge_all()
+        ptah.tldata.clear()
+        return uris
+
+    def _listen_queries(self):
+        queries = StatementRecorder().start()
+        self.addCleanup(queries.stop)
+        return queries
+
+    def test_loadapi_load_parents_one_query(self):
+        r_uri, f1_uri, f2_uri, c_uri = self._create_tree()
+        queries = self._listen_queries()
+
+        content = ptah.resolve(c_uri)
+        del queries[:]
+
+        parents = ptah.cms.load_parents(content)
+
+        self.assertEqual(len(queries), 1)
+        self.assertEqual([p.__uri__ for p in parents],
+                         [f2_uri, f1_uri, r_uri])
+        self.assertEqual(content.__parent__.__uri__, f2_uri)
+        self.assertEqual(content.__parent__.__parent__.__uri__, f1_uri)
+        self.assertEqual(
+            content.__parent__.__parent__.__parent__.__uri__, r_uri)
+
+    def test_loadapi_load_parents_partial(self):
+        r_uri, f1_uri, f2_uri, c_uri = self._create_tree()
+
+        folder1 = ptah.resolve(f1_uri)
+        folder1.__parent__ = parent = object()
+
+        content = ptah.resolve(c_uri)
+        parents = ptah.cms.load_parents(content)
+
+        self.assertEqual([p.__uri__ for p in parents], [f2_uri, f1_uri])
+        self.assertIs(folder1.__parent__, parent)
+
+    def test_loadapi_load_parents_stale_path(self):
+        r_uri, f1_uri, f2_uri, c_uri = self._create_tree()
+
+        folder2 = ptah.resolve(f2_uri)
+        folder2.__path__ = '/other/'
+        transaction.commit()
+
+        ptah.cms.Session.expunge_all()
+        ptah.tldata.clear()
+
+        content = ptah.resolve(c_uri)
+        parents = ptah.cms.load_parents(content)
+
+        self.assertEqual([p.__uri__ for p in parents],
+                         [f2_uri, f1_uri, r_uri])
+
     def test_loadapi_load_permission(self):
         import ptah
 
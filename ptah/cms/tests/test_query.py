@@ -0,0 +1,193 @@
+import transaction
+from datetime import datetime, timedelta
+
+import ptah
+from ptah.testing import PtahTestCase, StatementRecorder
+
+
+class TestContentQuery(PtahTestCase):
+
+    _init_ptah = False
+
+    def setUp(self):
+        global Page, Folder
+        class Page(ptah.cms.Content):
+            __type__ = ptah.cms.Type('page', 'Test Page')
+            __uri_factory__ = ptah.UriFactory('cms-page')
+
+        class Folder(ptah.cms.Container):
+            __type__ = ptah.cms.Type('folder', 'Test Folder')
+            __uri_factory__ = ptah.UriFactory('cms-folder')
+
+        self.Page = Page
+        self.Folder = Folder
+
+        super(TestContentQuery, self).setUp()
+        self.init_ptah()
+
+    def _create(self):
+        self.now = now = datetime(2012, 1, 10)
+
+        root = self.Folder(title='Root', __path__='/')
+        ptah.cms.Session.add(root)
+
+        root['folder'] = folder = self.Folder(title='Folder')
+        root['p0'] = self.Page(title='Page 0', __owner__='user1')
+        for idx in range(1, 6):
+            folder['p%s'%idx] = self.Page(title='Page %s'%idx)
+        ptah.cms.Session.flush()
+
+        for idx, page in enumerate(folder.values()):
+            page.modified = now - timedelta(days=idx)
+            page.__owner__ = 'user%s'%(idx % 2)
+        folder['p1'].effective = now + timedelta(days=1)
+        folder['p2'].expires = now - timedelta(days=1)
+        folder['p3'].effective = now - timedelta(days=1)
+        folder['p3'].expires = now + timedelta(days=1)
+
+        uri = root.__uri__
+        transaction.commit()
+        return uri
+
+    def _names(self, items):
+        return [item.__name__ for item in items]
+
+    def test_query_type(self):
+        self._create()
+
+        result = ptah.cms.query(type=self.Page.__type__)
+        self.assertEqual(len(result), 6)
+        self.assertEqual(self._names(result),
+                         ['p0', 'p1', 'p2', 'p3', 'p4', 'p5'])
+
+        result = ptah.cms.query(type=self.Folder)
+        self.assertEqual(self._names(result), [None, 'folder'])
+
+        result = ptah.cms.query(type='cms-type:folder')
+        self.assertEqual(len(result), 2)
+
+    def test_query_parent_path(self):
+        uri = self._create()
+        folder = ptah.resolve(uri)['folder']
+
+        result = ptah.cms.query(parent=uri)
+        self.assertEqual(self._names(result), ['folder', 'p0'])
+
+        result = ptah.cms.query(path=folder.__path__, type=self.Page)
+        self.assertEqual(self._names(result), ['p1', 'p2', 'p3', 'p4', 'p5'])
+
+        # content with path itself is not below path
+        result = ptah.cms.query(path=folder.__path__)
+        self.assertEqual(self._names(result), ['p1', 'p2', 'p3', 'p4', 'p5'])
+
+        result = ptah.cms.query(path='/fold%')
+        self.assertEqual(len(result), 0)
+
+        # prefix is case-sensitive
+        root = ptah.resolve(uri)
+        root['FOLDER'] = self.Folder(title='Other')
+        root['FOLDER']['p6'] = self.Page(title='Page 6')
+        transaction.commit()
+
+        result = ptah.cms.query(path='/folder/')
+        self.assertEqual(self._names(result), ['p1', 'p2', 'p3', 'p4', 'p5'])
+
+    def test_query_owner(self):
+        self._create()
+
+        result = ptah.cms.query(owner='user1')
+        self.assertEqual(self._names(result), ['p0', 'p2', 'p4'])
+
+    def test_query_modified(self):
+        self._create()
+        now = self.now
+
+        result = ptah.cms.query(modified_after=now - timedelta(days=2))
+        self.assertEqual(self._names(result), ['p1', 'p2', 'p3'])
+
+        result = ptah.cms.query(modified_after=now - timedelta(days=2),
+                                modified_before=now)
+        self.assertEqual(self._names(result), ['p2', 'p3'])
+
+    def test_query_effective(self):
+        self._create()
+
+        result = ptah.cms.query(effective=self.now, type=self.Page)
+        self.assertEqual(self._names(result), ['p0', 'p3', 'p4', 'p5'])
+
+    def test_query_order(self):
+        self._create()
+
+        result = ptah.cms.query(path='/folder/', order='modified')
+        self.assertEqual(self._names(result),
+                         ['p5', 'p4', 'p3', 'p2', 'p1'])
+
+        result = ptah.cms.query(path='/folder/', order='-title')
+        self.assertEqual(self._names(result),
+                         ['p5', 'p4', 'p3', 'p2', 'p1'])
+
+        self.assertRaises(ValueError, ptah.cms.query, order='unknown')
+
+    def test_query_paginated(self):
+        self._create()
+
+        result = ptah.cms.query(type=self.Page)
+        self.assertEqual(self._names(result[1:3]), ['p1', 'p2'])
+        self.assertEqual(self._names(result[4:]), ['p4', 'p5'])
+        self.assertEqual(self._names(result[:2]), ['p0', 'p1'])
+        self.assertEqual(result[3:3], [])
+        self.assertEqual(result[2].__name__, 'p2')
+        self.assertEqual(result.first().__name__, 'p0')
+
+        self.assertEqual(self._names(result.page(1, 4)),
+                         ['p0', 'p1', 'p2', 'p3'])
+        self.assertEqual(self._names(result.page(2, 4)), ['p4', 'p5'])
+        self.assertEqual(result.page(3, 4), [])
+
+        self.assertRaises(IndexError, result.__getitem__, 10)
+        self.assertRaises(IndexError, result.__getitem__, -1)
+        self.assertRaises(ValueError, result.__getitem__, slice(0, 4, 2))
+        self.assertRaises(ValueError, result.__getitem__, slice(-2, None))
+
+        self.assertIsNone(ptah.cms.query(owner='unknown').first())
+
+    def test_query_lazy(self):
+        self._create()
+
+        with StatementRecorder() as statements:
+            result = ptah.cms.query(type=self.Page)
+            self.assertEqual(statements, [])
+
+            self.assertEqual(result.uris(1, 2), result.uris()[1:3])
+            self.assertEqual(len(statements), 2)
+            self.assertIn('LIMIT', statements[0])
+
+            len(result)
+            len(result)
+            self.assertEqual(len(statements), 3)
+
+    def test_query_compiled(self):
+        from ptah.cms.query import _compiled
+
+        q1 = ptah.cms.query(type='cms-type:page', owner='user1')
+        q2 = ptah.cms.query(owner='user2', type='cms-type:folder')
+        q3 = ptah.cms.query(owner='user2', order='-modified')
+
+        self.assertIs(q1.compiled, q2.compiled)
+        self.assertIsNot(q1.compiled, q3.compiled)
+        self.assertIn((('owner', 'type'), 'id', False), _compiled)
+        self.assertIn((('owner',), 'modified', True), _compiled)
+
+    def test_query_indexes(self):
+        from ptah.cms.node import Node
+        from ptah.cms.content import BaseContent
+
+        indexed = set(col.name for idx in BaseContent.__table__.indexes
+                      for col in idx.columns)
+        for name in ('path', 'modified', 'effective', 'expires'):
+            self.assertIn(name, indexed)
+
+        indexed = set(col.name for idx in Node.__table__.indexes
+                      for col in idx.columns)
+        for name in ('type', 'owner'):
+            self.assertIn(name, indexed)
@@ -0,0 +1,284 @@
+import transaction
+import sqlalchemy as sqla
+
+import ptah
+from ptah.testing import PtahTestCase, StatementRecorder
+
+
+class TestSearchIndex(PtahTestCase):
+
+    _init_ptah = False
+
+    def setUp(self):
+        global Page, Folder
+        class Page(ptah.cms.Content):
+            __type__ = ptah.cms.Type('page', 'Test Page')
+            __uri_factory__ = ptah.UriFactory('cms-page')
+
+        class Folder(ptah.cms.Container):
+            __type__ = ptah.cms.Type('folder', 'Test Folder')
+            __uri_factory__ = ptah.UriFactory('cms-folder')
+
+        self.Page = Page
+        self.Folder = Folder
+
+        super(TestSearchIndex, self).setUp()
+        self.init_ptah()
+
+    def _create(self):
+        root = self.Folder(title='Root')
+        ptah.cms.Session.add(root)
+
+        root['folder'] = folder = self.Folder(title='Folder')
+
+        folder['p1'] = self.Page(title='Python tutorial',
+                                 description='Learn programming')
+        folder['p2'] = self.Page(title='Cooking',
+                                 description='Recipes with python sauce')
+        folder['p3'] = self.Page(
+            title='Gardening',
+            description='Garden with snake, python and other animals')
+        uri = folder.__uri__
+        transaction.commit()
+        return uri
+
+    def test_search_searchable_text(self):
+        from ptah.cms.search import searchable_text
+
+        page = self.Page(title='Title')
+        self.assertEqual(searchable_text(page), ('Title', '', ''))
+
+    def test_search_ranked(self):
+        self._create()
+
+        items = ptah.cms.search('python')
+        self.assertEqual([i.__name__ for i in items], ['p1', 'p2', 'p3'])
+        self.assertEqual(ptah.cms.search_index.count('python'), 3)
+
+        items = ptah.cms.search('snake garden')
+        self.assertEqual([i.__name__ for i in items], ['p3'])
+
+        self.assertEqual(ptah.cms.search('unknown'), [])
+        self.assertEqual(ptah.cms.search('  "*'), [])
+        self.assertEqual(ptah.cms.search_index.count('"*'), 0)
+
+    def test_search_ranks(self):
+        self._create()
+
+        ranks = [rank for uri, rank in ptah.cms.search_index.search('python')]
+        self.assertEqual(ranks, sorted(ranks, reverse=True))
+
+    def test_search_paginated(self):
+        self._create()
+
+        items = ptah.cms.search('python', offset=1, limit=1)
+        self.assertEqual([i.__name__ for i in items], ['p2'])
+
+        items = ptah.cms.search('python', offset=2, limit=5)
+        self.assertEqual([i.__name__ for i in items], ['p3'])
+
+    def test_search_modified(self):
+        uri = self._create()
+
+        page = ptah.resolve(uri)['p2']
+        page.update(title='Cooking', description='Recipes')
+        transaction.commit()
+
+        items = ptah.cms.search('python')
+        self.assertEqual([i.__name__ for i in items], ['p1', 'p3'])
+        self.assertEqual(ptah.cms.search_index.count('recipes'), 1)
+
+    def test_search_deleted(self):
+        uri = self._create()
+
+        folder = ptah.resolve(uri)
+        del folder['p1']
+        transaction.commit()
+
+        items = ptah.cms.search('python')
+        self.assertEqual([i.__name__ for i in items], ['p2', 'p3'])
+
+    def test_search_deleted_subtree(self):
+        uri = self._create()
+
+        folder = ptah.resolve(uri)
+        folder.delete()
+        transaction.commit()
+
+        self.assertEqual(ptah.cms.search('python'), [])
+
+    def test_search_deferred(self):
+        uri = self._create()
+
+        with StatementRecorder(
+                lambda s: s.startswith('INSERT INTO ptah_search')) \
+                as statements:
+            ptah.events.defer()
+            folder = ptah.resolve(uri)
+            for page in folder.values():
+                page.update(title='Page', description='Deferred')
+                page.update(title='Page', description='Deferred update')
+            transaction.commit()
+
+        self.assertEqual(len(statements), 1)
+        self.assertEqual(ptah.cms.search_index.count('deferred'), 3)
+
+    def test_search_deferred_deleted(self):
+        uri = self._create()
+
+        ptah.events.defer()
+        folder = ptah.resolve(uri)
+        folder['p4'] = self.Page(title='Python', description='Deleted')
+        ptah.cms.Session.flush()
+        del folder['p4']
+        transaction.commit()
+
+        self.assertEqual(ptah.cms.search_index.count('deleted'), 0)
+        self.assertEqual(ptah.cms.search_index.count('python'), 3)
+
+    def test_search_registry_notify(self):
+        uri = self._create()
+
+        folder = ptah.resolve(uri)
+        page = folder['p1']
+        page.title = 'Notified'
+        self.registry.notify(ptah.events.ContentModifiedEvent(page))
+        transaction.commit()
+
+        items = ptah.cms.search('notified')
+        self.assertEqual([i.__name__ for i in items], ['p1'])
+
+    def test_search_disabled(self):
+        from ptah.cms.search import search_index
+
+        self.addCleanup(setattr, search_index, 'enabled', True)
+        search_index.enabled = False
+
+        self._create()
+
+        self.assertEqual(ptah.cms.search('python'), [])
+        self.assertEqual(search_index.count('python'), 0)
+
+    def test_search_index_unavailable(self):
+        from ptah.cms.search import search_index, create_index
+
+        class Dialect(object):
+            name = 'sqlite'
+
+        class Connection(object):
+            dialect = Dialect()
+
+            def execute(self, sql):
+                raise sqla.exc.OperationalError(
+                    sql, {}, Exception('no such module: fts5'))
+
+        self.addCleanup(search_index.available.__setitem__, 'sqlite', True)
+        create_index(None, Connection())
+        self.assertFalse(search_index.available['sqlite'])
+        self.assertIsNone(search_index.backend())
+
+        # content is created without index
+        self._create()
+        self.assertEqual(ptah.cms.search('python'), [])
+        self.assertEqual(search_index.count('python'), 0)
+
+    def test_search_index_missing_table(self):
+        from ptah.cms.search import search_index
+
+        self.addCleanup(search_index.available.__setitem__, 'sqlite', True)
+        search_index.available.pop('sqlite', None)
+        self.assertIsNotNone(search_index.backend())
+        self.assertTrue(search_index.available['sqlite'])
+
+        ptah.cms.Session.execute('DROP TABLE ptah_search')
+        transaction.commit()
+        self.addCleanup(search_index.backends['sqlite'].create,
+                        ptah.cms.Session.bind)
+
+        search_index.available.pop('sqlite')
+        self.assertIsNone(search_index.backend())
+
+        self._create()
+        self.assertEqual(ptah.cms.search('python'), [])
+
+    def test_search_settings(self):
+        from ptah.cms.search import search_index
+
+        self.addCleanup(setattr, search_index, 'enabled', True)
+        self.assertTrue(search_index.enabled)
+
+        PTAH = ptah.get_settings(ptah.CFG_ID_PTAH, self.registry)
+        PTAH['search_index'] = False
+        self.registry.notify(
+            ptah.events.SettingsInitializing(self.config, self.registry))
+
+        self.assertFalse(search_index.enabled)
+
+    def test_search_reindex(self):
+        from ptah.cms.search import search_index
+
+        self.addCleanup(setattr, search_index, 'enabled', True)
+        search_index.enabled = False
+        self._create()
+        search_index.enabled = True
+
+        self.assertEqual(ptah.cms.search('python'), [])
+
+        self.assertEqual(ptah.cms.reindex(batch=2), 5)
+        items = ptah.cms.search('python')
+        self.assertEqual([i.__name__ for i in items], ['p1', 'p2', 'p3'])
+
+        # reindex replaces documents
+        self.assertEqual(ptah.cms.reindex(), 5)
+        self.assertEqual(ptah.cms.search_index.count('python'), 3)
+
+    def test_search_unsupported_dialect(self):
+        from ptah.cms.search import search_index
+
+        class Dialect(object):
+            name = 'unknown'
+
+        class Bind(object):
+            dialect = Dialect()
+
+        self.assertIsNone(search_index.backend(Bind()))
+        self.assertIsNotNone(search_index.backend())
+
+    def test_search_postgres_backend(self):
+        from ptah.cms.search import PostgresSearchBackend
+
+        statements = []
+
+        class Connection(object):
+            def execute(self, sql):
+                statements.append(sql)
+
+        backend = PostgresSearchBackend()
+        backend.create(Connection())
+        backend.drop(Connection())
+
+        self.assertIn('TSVECTOR', statements[0])
+        self.assertIn('USING gin(document)', statements[1])
+        self.assertEqual(statements[2], 'DROP TABLE IF EXISTS ptah_search')
+
+
+class TestSearchableText(PtahTestCase):
+
+    _init_ptah = False
+
+    def test_searchable_text_fields(self):
+        from ptah.cms.search import searchable_text
+
+        global Document
+        class Document(ptah.cms.Content):
+            __tablename__ = 'test_search_documents'
+            __type__ = ptah.cms.Type('document', 'Test Document')
+
+            text = sqla.Column(sqla.UnicodeText)
+            rating = sqla.Column(sqla.Integer)
+
+        self.init_ptah()
+
+        doc = Document(title='Title', description='Desc', text='Body',
+                       rating=5)
+        self.assertEqual(searchable_text(doc), ('Title', 'Desc', 'Body'))
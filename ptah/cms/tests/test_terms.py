@@ -0,0 +1,183 @@
+import transaction
+
+import ptah
+from ptah.testing import PtahTestCase, StatementRecorder
+
+
+class TestContentTerms(PtahTestCase):
+
+    _init_ptah = False
+
+    def setUp(self):
+        global Page, Folder
+        class Page(ptah.cms.Content):
+            __type__ = ptah.cms.Type('page', 'Test Page')
+            __uri_factory__ = ptah.UriFactory('cms-page')
+
+        class Folder(ptah.cms.Container):
+            __type__ = ptah.cms.Type('folder', 'Test Folder')
+            __uri_factory__ = ptah.UriFactory('cms-folder')
+
+        self.Page = Page
+        self.Folder = Folder
+
+        super(TestContentTerms, self).setUp()
+        self.init_ptah()
+
+    def _create(self):
+        root = self.Folder(title='Root')
+        ptah.cms.Session.add(root)
+
+        root['folder'] = folder = self.Folder(title='Folder')
+        folder['p1'] = self.Page(subjects=['python', 'web'],
+                                 creators=['user1'])
+        folder['p2'] = self.Page(subjects=['python'],
+                                 creators=['user2'], contributors=['user1'])
+        folder['p3'] = self.Page(subjects=['cooking', 'python', 'python'])
+        uri = root.__uri__
+        transaction.commit()
+        return uri
+
+    def _names(self, items):
+        return [item.__name__ for item in items]
+
+    def test_terms_content_terms(self):
+        from ptah.cms.terms import content_terms
+
+        page = self.Page(subjects=['b', 'a', 'b', 1], creators=['user'])
+        page.__id__ = 10
+        self.assertEqual(
+            content_terms(page),
+            [{'node_id': 10, 'name': 'subjects', 'value': 'a'},
+             {'node_id': 10, 'name': 'subjects', 'value': 'b'},
+             {'node_id': 10, 'name': 'creators', 'value': 'user'}])
+
+    def test_terms_long_value(self):
+        from ptah.cms.terms import TERM_LENGTH, record_terms
+
+        long = 'a'*(TERM_LENGTH + 1)
+        self.assertEqual(
+            record_terms(10, {'subjects': [long, 'a'*TERM_LENGTH]}),
+            [{'node_id': 10, 'name': 'subjects', 'value': 'a'*TERM_LENGTH}])
+
+        root = self.Folder(title='Root')
+        ptah.cms.Session.add(root)
+        root['page'] = self.Page(subjects=[long, 'python'])
+        transaction.commit()
+
+        self.assertEqual(self._names(ptah.cms.find_by_subject('python')),
+                         ['page'])
+        self.assertEqual(ptah.cms.find_by_subject(long), [])
+
+    def test_terms_find(self):
+        self._create()
+
+        self.assertEqual(self._names(ptah.cms.find_by_subject('python')),
+                         ['p1', 'p2', 'p3'])
+        self.assertEqual(self._names(ptah.cms.find_by_subject('web')),
+                         ['p1'])
+        self.assertEqual(self._names(ptah.cms.find_by_creator('user1')),
+                         ['p1'])
+        self.assertEqual(
+            self._names(ptah.cms.find_by_contributor('user1')), ['p2'])
+        self.assertEqual(ptah.cms.find_by_subject('unknown'), [])
+
+        self.assertEqual(ptah.cms.count_by_term('subjects', 'python'), 3)
+        self.assertEqual(ptah.cms.count_by_term('creators', 'user3'), 0)
+
+    def test_terms_find_paginated(self):
+        self._create()
+
+        self.assertEqual(
+            self._names(ptah.cms.find_by_subject('python', 1, 1)), ['p2'])
+        self.assertEqual(
+            self._names(ptah.cms.find_by_subject('python', offset=2)),
+            ['p3'])
+
+    def test_terms_unknown(self):
+        self.assertRaises(
+            ValueError, ptah.cms.find_by_term, 'title', 'python')
+        self.assertRaises(
+            ValueError, ptah.cms.count_by_term, 'title', 'python')
+
+    def test_terms_set(self):
+        uri = self._create()
+
+        page = ptah.resolve(uri)['folder']['p1']
+        page.subjects = ['web']
+        transaction.commit()
+
+        self.assertEqual(self._names(ptah.cms.find_by_subject('python')),
+                         ['p2', 'p3'])
+        self.assertEqual(self._names(ptah.cms.find_by_creator('user1')),
+                         ['p1'])
+
+    def test_terms_mutation(self):
+        uri = self._create()
+
+        page = ptah.resolve(uri)['folder']['p2']
+        page.subjects.append('web')
+        del page.creators[0]
+        transaction.commit()
+
+        self.assertEqual(self._names(ptah.cms.find_by_subject('web')),
+                         ['p1', 'p2'])
+        self.assertEqual(ptah.cms.find_by_creator('user2'), [])
+
+    def test_terms_not_loaded(self):
+        uri = self._create()
+
+        with StatementRecorder(lambda s: 'ptah_content_terms' in s) \
+                as statements:
+            page = ptah.resolve(uri)['folder']['p1']
+            page.title = 'New title'
+            ptah.cms.Session.flush()
+
+        self.assertEqual(statements, [])
+
+    def test_terms_delete(self):
+        uri = self._create()
+
+        folder = ptah.resolve(uri)['folder']
+        del folder['p1']
+        transaction.commit()
+
+        self.assertEqual(self._names(ptah.cms.find_by_subject('python')),
+                         ['p2', 'p3'])
+
+    def test_terms_delete_subtree(self):
+        uri = self._create()
+
+        root = ptah.resolve(uri)
+        del root['folder']
+        transaction.commit()
+
+        self.assertEqual(ptah.cms.find_by_subject('python'), [])
+        self.assertEqual(ptah.cms.count_by_term('subjects', 'python'), 0)
+
+    def test_terms_session_delete(self):
+        from ptah.cms.terms import ContentTerm
+
+        page = self.Page(subjects=['python'])
+        ptah.cms.Session.add(page)
+        transaction.commit()
+
+        page = ptah.cms.Session.query(self.Page).one()
+        ptah.cms.Session.delete(page)
+        transaction.commit()
+
+        self.assertEqual(ptah.cms.Session.query(ContentTerm).count(), 0)
+
+    def test_terms_reindex(self):
+        from ptah.cms.terms import ContentTerm, reindex_terms
+
+        self._create()
+
+        ptah.cms.Session.query(ContentTerm).delete()
+        transaction.commit()
+        self.assertEqual(ptah.cms.find_by_subject('python'), [])
+
+        self.assertEqual(reindex_terms(batch=2), 5)
+        self.assertEqual(self._names(ptah.cms.find_by_subject('python')),
+                         ['p1', 'p2', 'p3'])
+        self.assertEqual(ptah.cms.Session.query(ContentTerm).count(), 8)
@@ -154,6 +154,72 @@ class TestTypeInfo(PtahTestCase):
         self.assertEqual(MyContainer.__type__.list_types(container),
                          [MyContent.__type__])
 
+    def test_tinfo_allowed_cache(self):
+        import ptah.cms
+        from ptah.cms.tinfo import allowed_types_cache
+
+        global MyContent, MyContent2, MyContainer
+        class MyContent(ptah.cms.Content):
+            __type__ = ptah.cms.Type('mycontent', 'Content',
+                                     permission='Protected')
+        class MyContent2(ptah.cms.Content):
+            __type__ = ptah.cms.Type('mycontent2', 'Content',
+                                     permission='Protected')
+        class MyContainer(ptah.cms.Container):
+            __type__ = ptah.cms.Type('mycontainer', 'Container')
+
+        role = ptah.Role('editor', 'Editor')
+        acl = ptah.ACL('protected', 'Protected')
+        acl.allow(role, 'Protected')
+        self.init_ptah()
+
+        checks = []
+        orig_check_permission = ptah.check_permission
+        def check_permission(permission, content, *args, **kw):
+            if permission == 'Protected':
+                checks.append(permission)
+            return orig_check_permission(permission, content, *args, **kw)
+
+        ptah.check_permission = check_permission
+        try:
+            container = MyContainer()
+            tinfo = MyContainer.__type__
+
+            self.assertEqual(tinfo.list_types(container), [])
+            self.assertEqual(checks, ['Protected'])
+
+            # cached
+            self.assertEqual(tinfo.list_types(container), [])
+            self.assertFalse(MyContent.__type__.is_allowed(container))
+            self.assertEqual(len(checks), 1)
+
+            # principal
+            ptah.auth_service.set_userid('user')
+            self.assertEqual(tinfo.list_types(container), [])
+            self.assertEqual(len(checks), 2)
+
+            # local roles
+            container.__local_roles__ = {'user': [role.id]}
+            self.assertEqual(tinfo.list_types(container), [])
+            self.assertEqual(len(checks), 3)
+
+            # container acls
+            container.__acls__ = ['protected']
+            self.assertEqual(
+                sorted(t.name for t in tinfo.list_types(container)),
+                ['mycontent', 'mycontent2'])
+            self.assertTrue(MyContent.__type__.is_allowed(container))
+            self.assertEqual(len(checks), 4)
+
+            # acl map
+            acl.unset(role.id, 'Protected')
+            self.assertEqual(tinfo.list_types(container), [])
+            self.assertEqual(len(checks), 5)
+        finally:
+            ptah.check_permission = orig_check_permission
+
+        self.assertTrue(allowed_types_cache.hits >= 3)
+
     def test_tinfo_conflicts(self):
         import ptah.cms
 
@@ -216,6 +282,173 @@ class TestTypeInfo(PtahTestCase):
         c = ptah.resolve(c_uri)
         self.assertTrue(isinstance(c, MyContent))
 
+    def test_tinfo_resolver_cache(self):
+        import ptah, ptah.cms
+        from ptah.uri import resolve_cache
+
+        global MyContent
+        class MyContent(ptah.cms.Content):
+            __type__ = ptah.cms.Type('mycontent2', 'MyContent')
+
+        self.init_ptah()
+
+        content = MyContent.__type__.create(title='Test content')
+        content.subjects = ['subject']
+        c_uri = content.__uri__
+        ptah.cms.Session.add(content)
+        transaction.commit()
+
+        resolve_cache.resize(10)
+        try:
+            c = ptah.resolve(c_uri)
+            self.assertIs(ptah.resolve(c_uri), c)
+            transaction.commit()
+
+            # cached object is merged into new session
+            ptah.tldata.clear()
+            hits = resolve_cache.hits
+            c = ptah.resolve(c_uri)
+            self.assertEqual(resolve_cache.hits, hits + 1)
+            self.assertTrue(isinstance(c, MyContent))
+            self.assertIn(c, ptah.cms.Session)
+            self.assertEqual(c.title, 'Test content')
+
+            c.subjects.append('subject2')
+            c.update(title='Modified')
+            transaction.commit()
+
+            c = ptah.resolve(c_uri)
+            self.assertEqual(c.title, 'Modified')
+            self.assertEqual(c.subjects, ['subject', 'subject2'])
+        finally:
+            resolve_cache.resize(0)
+            resolve_cache.clear()
+
+    def test_tinfo_resolve_many(self):
+        import ptah, ptah.cms
+
+        global MyContent
+        class MyContent(ptah.cms.Content):
+            __type__ = ptah.cms.Type('mycontent2', 'MyContent')
+
+        self.init_ptah()
+
+        c1 = MyContent.__type__.create(title='Test content1')
+        c2 = MyContent.__type__.create(title='Test content2')
+        c1_uri, c2_uri = c1.__uri__, c2.__uri__
+        ptah.cms.Session.add(c1)
+        ptah.cms.Session.add(c2)
+        transaction.commit()
+
+        res = ptah.resolve_many(
+            [c2_uri, 'cms-mycontent2:unknown', c1_uri])
+        self.assertEqual(
+            list(res.keys()), [c2_uri, 'cms-mycontent2:unknown', c1_uri])
+        self.assertEqual(res[c1_uri].title, 'Test content1')
+        self.assertEqual(res[c2_uri].title, 'Test content2')
+        self.assertIsNone(res['cms-mycontent2:unknown'])
+
+    def _old_info(self, content):
+        import ptah.cms
+        from ptah.cms.node import Node
+
+        info = Node.info(content)
+        info['__name__'] = content.__name__
+        info['__content__'] = True
+        info['__container__'] = isinstance(content, ptah.cms.BaseContainer)
+        content._extra_info(info)
+        return info
+
+    def test_tinfo_serializer(self):
+        import ptah, ptah.cms
+
+        MySchema = ptah.cms.ContentSchema + form.Fieldset(
+            form.IntegerField('count'),
+            form.LinesField('subjects'))
+
+        global MyContent, MyContainer
+        class MyContent(ptah.cms.Content):
+            __type__ = ptah.cms.Type('mycontent2', 'MyContent',
+                                     fieldset=MySchema)
+            count = 10
+
+        class MyContainer(ptah.cms.Container):
+            __type__ = ptah.cms.Type('mycontainer', 'MyContainer')
+
+        self.init_ptah()
+
+        tinfo = MyContent.__type__
+        serializer = tinfo.serializer
+        self.assertIs(tinfo.serializer, serializer)
+        self.assertEqual(
+            [name for name, d, s in serializer.fields if s is None],
+            ['title', 'description'])
+
+        container = MyContainer.__type__.create(title='Container')
+        content = tinfo.create(title='Test content')
+        content.subjects = ['s1', 's2']
+        container['content'] = content
+
+        info = content.info()
+        self.assertEqual(info, self._old_info(content))
+        self.assertEqual(list(info.keys()), list(self._old_info(content)))
+        self.assertEqual(info['count'], '10')
+        self.assertEqual(info['subjects'], 's1\ns2')
+        self.assertEqual(info['__parents__'], [container.__uri__])
+        self.assertFalse(info['__container__'])
+
+        info = container.info()
+        self.assertEqual(info, self._old_info(container))
+        self.assertTrue(info['__container__'])
+
+    def test_tinfo_serializer_many(self):
+        import ptah, ptah.cms
+
+        global MyContent, MyContainer
+        class MyContent(ptah.cms.Content):
+            __type__ = ptah.cms.Type('mycontent2', 'MyContent')
+
+        class MyContainer(ptah.cms.Container):
+            __type__ = ptah.cms.Type('mycontainer', 'MyContainer')
+
+        self.init_ptah()
+
+        container = MyContainer.__type__.create(title='Container')
+        ptah.cms.Session.add(container)
+        for idx in range(3):
+            container['c%s'%idx] = MyContent.__type__.create(
+                title='Content %s'%idx)
+        container_uri = container.__uri__
+        transaction.commit()
+
+        container = ptah.resolve(container_uri)
+        items = container.values()
+
+        infos = MyContent.__type__.serializer.many(items)
+        self.assertEqual([info['title'] for info in infos],
+                         ['Content 0', 'Content 1', 'Content 2'])
+        self.assertEqual(infos, [self._old_info(item) for item in items])
+        for item in items:
+            self.assertEqual(item.__parent__.__uri__, container_uri)
+
+    def test_tinfo_serializer_extra_info(self):
+        import ptah, ptah.cms
+
+        global MyContent
+        class MyContent(ptah.cms.Content):
+            __type__ = ptah.cms.Type('mycontent2', 'MyContent')
+
+            def _extra_info(self, info):
+                super(MyContent, self)._extra_info(info)
+                info['extra'] = True
+
+        self.init_ptah()
+
+        content = MyContent.__type__.create(title='Test content')
+        self.assertTrue(MyContent.__type__.serializer.extra_info)
+        self.assertTrue(content.info()['extra'])
+        self.assertEqual(content.info()['title'], 'Test content')
+
     def test_tinfo_fieldset(self):
         import ptah, ptah.cms
 
@@ -1,4 +1,8 @@
+import os
+import shutil
+import tempfile
 import transaction
+from zope.sqlalchemy import mark_changed
 from pyramid.interfaces import ITraverser
 
 import ptah
@@ -9,10 +13,13 @@ from ptah.testing import PtahTestCase
 class TestTraverser(PtahTestCase):
 
     def setUp(self):
-        global ApplicationRoot
+        global ApplicationRoot, Folder
         class ApplicationRoot(ptah.cms.ApplicationRoot):
             __type__ = ptah.cms.Type('traverserapp')
 
+        class Folder(ptah.cms.Container):
+            __type__ = ptah.cms.Type('traverserfolder')
+
         super(TestTraverser, self).setUp()
 
     def _create_content(self):
@@ -187,3 +194,272 @@ class TestTraverser(PtahTestCase):
         self.assertEqual(info['context'].__uri__, self.content_uri)
         self.assertEqual(info['view_name'], 'index.html')
         self.assertEqual(info['traversed'], ('folder','content'))
+
+    def _create_folders(self):
+        from ptah.uri import resolve_cache
+        from ptah.cms.traverser import traverse_cache
+
+        traverse_cache.resize(100)
+        self.addCleanup(traverse_cache.resize, 0)
+        traverse_cache.clear()
+        traverse_cache.hits = traverse_cache.misses = 0
+
+        resolve_cache.resize(100)
+        self.addCleanup(resolve_cache.clear)
+        self.addCleanup(resolve_cache.resize, 0)
+
+        self.factory = ptah.cms.ApplicationFactory(
+            ApplicationRoot, '/test', 'root', 'Root App')
+        root = self.factory()
+        root['folder'] = Folder()
+        root['folder']['content'] = Folder()
+        self.folder_uri = root['folder'].__uri__
+        self.content_uri = root['folder']['content'].__uri__
+        transaction.commit()
+
+        ptah.resolve_many([self.folder_uri, self.content_uri])
+
+    def _traverse(self, path):
+        request = self.make_request(environ={'PATH_INFO': path})
+        root = self.factory(request)
+        return self.registry.getAdapter(root, ITraverser)(request)
+
+    def test_traverser_cache(self):
+        from ptah.cms.traverser import traverse_cache
+        self._create_folders()
+
+        info = self._traverse('/test/folder/content/index.html')
+        self.assertEqual(traverse_cache.stats()['misses'], 1)
+        self.assertEqual(traverse_cache.stats()['size'], 1)
+
+        info = self._traverse('/test/folder/content/index.html')
+        self.assertEqual(traverse_cache.stats()['hits'], 1)
+        self.assertEqual(info['context'].__uri__, self.content_uri)
+        self.assertEqual(info['context'].__parent__.__uri__, self.folder_uri)
+        self.assertIs(info['context'].__parent__.__parent__, info['root'])
+        self.assertEqual(info['view_name'], 'index.html')
+        self.assertEqual(info['traversed'], ('folder','content'))
+
+        # not found content is cached too
+        self._traverse('/test/unknown')
+        info = self._traverse('/test/unknown')
+        self.assertIs(info['context'], info['root'])
+        self.assertEqual(traverse_cache.stats()['hits'], 2)
+
+    def test_traverser_cache_uri_cache(self):
+        from ptah.uri import resolve_cache
+        from ptah.cms.traverser import traverse_cache
+        self._create_folders()
+
+        self._traverse('/test/folder/content/')
+
+        # content is not in uri resolver cache, cache hit would query db
+        resolve_cache.clear()
+        info = self._traverse('/test/folder/content/')
+        self.assertEqual(info['context'].__uri__, self.content_uri)
+        self.assertEqual(traverse_cache.stats()['hits'], 0)
+        self.assertEqual(traverse_cache.stats()['misses'], 2)
+
+        ptah.resolve_many([self.folder_uri, self.content_uri])
+        info = self._traverse('/test/folder/content/')
+        self.assertEqual(info['context'].__uri__, self.content_uri)
+        self.assertEqual(traverse_cache.stats()['hits'], 1)
+
+    def test_traverser_cache_ttl(self):
+        from ptah.cms.traverser import traverse_cache
+        self._create_folders()
+        traverse_cache.resize(100, 60)
+
+        self._traverse('/test/folder/other/')
+        key = '%sfolder/other/'%self.factory().__path__
+        item = traverse_cache.lru[key]
+
+        # content added by other process, events are not received
+        root = self.factory()
+        root['folder']['other'] = Folder()
+        other_uri = root['folder']['other'].__uri__
+        transaction.commit()
+        traverse_cache.lru[key] = item
+
+        info = self._traverse('/test/folder/other/')
+        self.assertEqual(info['context'].__uri__, self.folder_uri)
+        self.assertEqual(info['view_name'], 'other')
+
+        # entry expired
+        generation, expires, chain = item
+        traverse_cache.lru[key] = (generation, expires - 61, chain)
+
+        info = self._traverse('/test/folder/other/')
+        self.assertEqual(info['context'].__uri__, other_uri)
+
+        # no expiration
+        traverse_cache.resize(100, 0)
+        traverse_cache.clear()
+        self._traverse('/test/folder/other/')
+        self.assertEqual(traverse_cache.lru[key][1], 0)
+
+    def test_traverser_cache_disabled(self):
+        from ptah.cms.traverser import traverse_cache
+        self._create_folders()
+        traverse_cache.resize(0)
+
+        self._traverse('/test/folder/')
+        info = self._traverse('/test/folder/')
+        self.assertEqual(info['context'].__uri__, self.folder_uri)
+        self.assertEqual(traverse_cache.stats(),
+                         {'hits': 0, 'misses': 0, 'size': 0, 'maxsize': 0})
+
+    def test_traverser_cache_events(self):
+        from ptah.cms.traverser import traverse_cache
+        self._create_folders()
+
+        self._traverse('/test/folder/content/')
+        self._traverse('/test/folder/other/')
+        self._traverse('/test/index.html')
+        self.assertEqual(traverse_cache.stats()['size'], 3)
+
+        # moved
+        root = self.factory()
+        root['new'] = root['folder']
+        self.assertEqual(traverse_cache.stats()['size'], 1)
+        transaction.commit()
+
+        info = self._traverse('/test/new/content/')
+        self.assertEqual(info['context'].__uri__, self.content_uri)
+
+        # added
+        self._traverse('/test/new/other/')
+        root = self.factory()
+        root['new']['other'] = Folder()
+        ptah.cms.Session.flush()
+
+        info = self._traverse('/test/new/other/')
+        self.assertEqual(info['context'].__uri__,
+                         root['new']['other'].__uri__)
+        transaction.commit()
+
+        # deleted
+        root = self.factory()
+        del root['new']
+        transaction.commit()
+
+        info = self._traverse('/test/new/content/')
+        self.assertIs(info['context'], info['root'])
+        self.assertEqual(info['view_name'], 'new')
+
+    def test_traverser_cache_stale(self):
+        from ptah.uri import resolve_cache
+        from ptah.cms.traverser import traverse_cache
+        self._create_folders()
+
+        self._traverse('/test/folder/content/')
+
+        # content moved without events
+        table = ptah.cms.BaseContent.__table__
+        ptah.cms.Session.execute(
+            table.update().where(table.c.name == 'content')
+                .values(path = '/moved/'))
+        mark_changed(ptah.cms.Session())
+        transaction.commit()
+
+        resolve_cache.invalidate(self.content_uri)
+        ptah.resolve(self.content_uri)
+
+        info = self._traverse('/test/folder/content/')
+        self.assertEqual(info['context'].__uri__, self.folder_uri)
+        self.assertEqual(info['view_name'], 'content')
+        self.assertEqual(traverse_cache.stats()['hits'], 0)
+
+    def test_traverser_cache_concurrent_invalidate(self):
+        from ptah.sharedcache import SharedCache
+        from ptah.cms.traverser import traverse_cache
+        self._create_folders()
+
+        dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, dir)
+        traverse_cache.backend = SharedCache(os.path.join(dir, 'cache'), 16)
+        self.addCleanup(setattr, traverse_cache, 'backend', None)
+
+        root = self.factory()
+        parents = [root['folder']]
+        key = '%sfolder/'%root.__path__
+
+        # content loaded before invalidation is not cached
+        generation = traverse_cache.generation()
+        traverse_cache.invalidate('/unknown/')
+        traverse_cache.set(key, parents, generation)
+        self.assertEqual(traverse_cache.stats()['size'], 0)
+        self.assertIsNone(traverse_cache.backend.get(key))
+
+        traverse_cache.set(key, parents, traverse_cache.generation())
+        self.assertEqual(traverse_cache.stats()['size'], 1)
+        self.assertIsNotNone(traverse_cache.backend.get(key))
+
+    def test_traverser_cache_settings(self):
+        from ptah.cms.traverser import traverse_cache, initialized
+
+        self.assertEqual(traverse_cache.size, 0)
+
+        PTAH = ptah.get_settings(ptah.CFG_ID_PTAH, self.registry)
+        PTAH['traverse_cache_size'] = 20
+        initialized(
+            ptah.events.SettingsInitializing(self.config, self.registry))
+        self.addCleanup(traverse_cache.resize, 0)
+
+        self.assertEqual(traverse_cache.size, 20)
+
+    def test_traverser_cache_shared(self):
+        from ptah.sharedcache import SharedCache
+        from ptah.cms.traverser import TraverseCache, traverse_cache
+
+        self._create_folders()
+
+        dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, dir)
+        path = os.path.join(dir, 'cache')
+
+        # other process
+        other = TraverseCache(10)
+        other.backend = SharedCache(path, 16)
+
+        traverse_cache.backend = SharedCache(path, 16)
+        self.addCleanup(setattr, traverse_cache, 'backend', None)
+
+        self._traverse('/test/folder/content/')
+        self.assertEqual(traverse_cache.stats()['misses'], 1)
+
+        key = '%sfolder/content/'%self.factory().__path__
+        parents = other.get(key)
+        self.assertEqual([p.__uri__ for p in parents],
+                         [self.content_uri, self.folder_uri])
+        self.assertEqual(other.stats()['hits'], 1)
+
+        # invalidation in one process drops entries in other process
+        traverse_cache.invalidate('/unknown/')
+        self.assertIsNone(other.get(key))
+
+        traverse_cache.resize(0)
+        self._traverse('/test/folder/content/')
+        info = self._traverse('/test/folder/content/')
+        self.assertEqual(info['context'].__uri__, self.content_uri)
+        self.assertEqual(traverse_cache.stats()['hits'], 1)
+
+    def test_traverser_cache_shared_settings(self):
+        from ptah.cms.traverser import traverse_cache, initialized
+
+        dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, dir)
+
+        PTAH = ptah.get_settings(ptah.CFG_ID_PTAH, self.registry)
+        PTAH['traverse_cache_file'] = os.path.join(dir, 'cache')
+        PTAH['traverse_cache_slots'] = 32
+        initialized(
+            ptah.events.SettingsInitializing(self.config, self.registry))
+        self.addCleanup(setattr, traverse_cache, 'backend', None)
+
+        self.assertEqual(traverse_cache.backend.slots, 32)
+
+        PTAH['traverse_cache_file'] = ''
+        initialized(
+            ptah.events.SettingsInitializing(self.config, self.registry))
+        self.assertIsNone(traverse_cache.backend)
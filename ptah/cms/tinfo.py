@@ -1,14 +1,17 @@
 """ type implementation """
-import sys, logging
+import sys, logging, threading
 import sqlalchemy as sqla
+from collections import OrderedDict
 from zope.interface import implementer
 from pyramid.compat import string_types
-from pyramid.threadlocal import get_current_registry
+from pyramid.location import lineage
 
 import ptah
 from ptah import config
-from ptah.cms.node import Session
-from ptah.cms.content import Content
+from ptah.form.fields import InputField
+from ptah.cms.node import Session, load_parents
+from ptah.cms.content import Content, BaseContent
+from ptah.cms.content import JSON_LISTS, load_json_lists
 from ptah.cms.container import BaseContainer
 from ptah.cms.security import build_class_actions
 from ptah.cms.interfaces import Forbidden, ContentSchema, ITypeInformation
@@ -72,9 +75,18 @@ class TypeInformation(object):
         self.title = title
         self.fieldset = fieldset
 
+    _serializer = None
+
+    @property
+    def serializer(self):
+        """ :py:class:`InfoSerializer` for type, compiled on first use """
+        if self._serializer is None:
+            self._serializer = InfoSerializer(self)
+        return self._serializer
+
     def create(self, **data):
         content = self.cls(**data)
-        get_current_registry().notify(ptah.events.ContentCreatedEvent(content))
+        ptah.events.notify(ptah.events.ContentCreatedEvent(content))
         return content
 
     def is_allowed(self, container):
@@ -82,9 +94,20 @@ class TypeInformation(object):
             return False
 
         if self.permission:
-            return ptah.check_permission(self.permission, container)
+            return self._is_allowed(
+                container, allowed_types_cache.permissions(container))
         return True
 
+    def _is_allowed(self, container, allowed):
+        if not self.permission:
+            return True
+
+        result = allowed.get(self.permission)
+        if result is None:
+            result = allowed[self.permission] = bool(
+                ptah.check_permission(self.permission, container))
+        return result
+
     def check_context(self, container):
         if not self.is_allowed(container):
             raise Forbidden()
@@ -96,6 +119,7 @@ class TypeInformation(object):
 
         types = []
         all_types = config.get_cfg_storage(TYPES_DIR_ID)
+        allowed = allowed_types_cache.permissions(container)
 
         if self.filter_content_types:
             allowed_types = self.allowed_content_types
@@ -106,16 +130,184 @@ class TypeInformation(object):
                 if isinstance(tinfo, string_types):
                     tinfo = all_types.get('cms-type:%s'%tinfo)
 
-                if tinfo and tinfo.is_allowed(container):
+                if tinfo and tinfo._is_allowed(container, allowed):
                     types.append(tinfo)
         else:
             for tinfo in all_types.values():
-                if tinfo.global_allow and tinfo.is_allowed(container):
+                if tinfo.global_allow and \
+                        tinfo._is_allowed(container, allowed):
                     types.append(tinfo)
 
         return types
 
 
+def _acl_key(location):
+    """ hashable key of location acl, `None` if acl can't be cached """
+    if isinstance(_class_attr(type(location), '__acl__'),
+                  ptah.ACLsProperty):
+        return tuple(getattr(location, '__acls__', None) or ())
+
+    acl = getattr(location, '__acl__', ())
+    if isinstance(acl, ptah.ACL):
+        return acl.id
+    if not acl:
+        return ()
+    return None
+
+
+class AllowedTypesCache(object):
+    """ Cache of content type permission checks.
+
+    Results of :py:meth:`TypeInformation.is_allowed` are stored per
+    container type, effective principals with local roles and ACL maps
+    of container lineage, so changes of `__local_roles__`, `__acls__`
+    or owner of container and its parents select new entry. ACL maps
+    modifications change :py:func:`ptah.security.get_acls_version`.
+    Cache keeps at most `size` entries.
+    """
+
+    def __init__(self, size=1000):
+        self.size = size
+        self.hits = 0
+        self.lock = threading.Lock()
+        self.data = OrderedDict()
+
+    def key(self, container):
+        """ Return cache key for container, `None` if container
+        security can't be cached """
+        userid = ptah.auth_service.get_effective_userid()
+
+        principals = set([ptah.Everyone.id])
+        if userid is not None:
+            principals.update((ptah.Authenticated.id, userid))
+            principals.update(
+                ptah.get_local_roles(userid, context=container))
+
+        acls = []
+        for location in lineage(container):
+            acl = _acl_key(location)
+            if acl is None:
+                return None
+            acls.append(acl)
+
+        return (container.__type_id__, tuple(sorted(principals)),
+                tuple(acls), ptah.security.get_acls_version())
+
+    def permissions(self, container):
+        """ Return dict of permission check results for container """
+        key = self.key(container)
+        if key is None:
+            return {}
+
+        with self.lock:
+            allowed = self.data.pop(key, None)
+            if allowed is None:
+                allowed = {}
+            else:
+                self.hits += 1
+
+            self.data[key] = allowed
+            while len(self.data) > self.size:
+                self.data.popitem(False)
+
+        return allowed
+
+    def clear(self):
+        with self.lock:
+            self.data = OrderedDict()
+
+
+allowed_types_cache = AllowedTypesCache()
+
+
+def _class_attr(cls, name):
+    for klass in cls.__mro__:
+        if name in klass.__dict__:
+            return klass.__dict__[name]
+
+
+class InfoSerializer(object):
+    """ Compiled content info serializer. Fieldset is bound once,
+    info is built directly from content attributes, fields with
+    identity serialization are copied as is.
+
+    .. code-block:: python
+
+        info = tinfo.serializer(content)
+        infos = tinfo.serializer.many(items)
+
+    """
+
+    def __init__(self, tinfo):
+        self.tinfo = tinfo
+
+        identity = _class_attr(InputField, 'serialize')
+
+        self.fields = []
+        for field in tinfo.fieldset.bind().fields():
+            serialize = field.serialize
+            if _class_attr(field.__class__, 'serialize') is identity:
+                serialize = None
+            self.fields.append((field.name, field.default, serialize))
+
+        cls = tinfo.cls
+        self.container = cls is not None and issubclass(cls, BaseContainer)
+        self.extra_info = cls is not None and \
+            _class_attr(cls, '_extra_info') is not \
+            _class_attr(BaseContent, '_extra_info')
+        self.json_lists = self.extra_info or any(
+            name in JSON_LISTS for name, default, serialize in self.fields)
+
+    def __call__(self, content, parents=None):
+        """ Serialize content, `parents` is list of parents uris """
+        if parents is None:
+            parents = [p.__uri__ for p in load_parents(content)]
+
+        info = OrderedDict(
+            (('__type__', content.__type_id__),
+             ('__content__', True),
+             ('__uri__', content.__uri__),
+             ('__parents__', parents),
+             ('__name__', content.__name__),
+             ('__container__', self.container),
+             ))
+
+        if self.extra_info:
+            content._extra_info(info)
+            return info
+
+        for name, default, serialize in self.fields:
+            val = getattr(content, name, default)
+            info[name] = val if serialize is None else serialize(val)
+
+        info['view'] = content.view
+        info['created'] = content.created
+        info['modified'] = content.modified
+        info['effective'] = content.effective
+        info['expires'] = content.expires
+        return info
+
+    def many(self, items):
+        """ Serialize list of content, parents are loaded once
+        for each container """
+        if self.json_lists:
+            load_json_lists(items)
+
+        infos = []
+        parents = {}
+        for item in items:
+            key = item.__parent_uri__
+            if key not in parents:
+                parents[key] = (
+                    [p.__uri__ for p in load_parents(item)], item.__parent__)
+            elif item.__parent__ is None:
+                item.__parent__ = parents[key][1]
+
+            infos.append(self(item, parents[key][0]))
+
+        return infos
+
+
 def Type(name, title=None, fieldset=None, **kw):
     """ Declare new type. This function has to be called within a content
     class declaration.
@@ -149,9 +341,17 @@ def Type(name, title=None, fieldset=None, **kw):
         def resolve_content(uri):
             return typeinfo.cls.__uri_sql_get__.first(uri=uri)
 
+        def resolve_contents(uris):
+            cls = typeinfo.cls
+            return dict((item.__uri__, item) for item in
+                        Session.query(cls)
+                        .options(sqla.orm.undefer_group('json'))
+                        .filter(cls.__uri__.in_(uris)))
+
         resolve_content.__doc__ = 'CMS Content resolver for %s type'%title
 
-        ptah.register_uri_resolver('cms-%s'%name, resolve_content, depth=2)
+        ptah.register_uri_resolver(
+            'cms-%s'%name, resolve_content, depth=2, batch=resolve_contents)
 
     # config actino and introspection info
     discr = (TYPES_DIR_ID, name)
@@ -200,6 +400,7 @@ def register_type_impl(
 
     tinfo.cls = cls
     tinfo.permission = permission
+    tinfo._serializer = None
 
     config.get_cfg_storage(TYPES_DIR_ID)[tinfo.__uri__] = tinfo
 
@@ -1,14 +1,186 @@
 """ content traverser """
+import json
+import time
+import threading
+from collections import OrderedDict
 from sqlalchemy import sql
 from zope import interface
 from pyramid.interfaces import ITraverser
 from pyramid.traversal import traversal_path, ResourceTreeTraverser
 
 import ptah
+from ptah.uri import resolve_cache
+from ptah.sharedcache import SharedCache
 from ptah.cms.node import Session
 from ptah.cms.content import BaseContent
 from ptah.cms.interfaces import IApplicationRoot
 
+_marker = object()
+
+
+class TraverseCache(object):
+    """ Content traversal cache.
+
+    Bounded LRU cache shared by all threads of process, it maps
+    normalized content path of request to chain of `(path, uri)` of
+    found content, deepest first. Cache hit is only possible if all
+    content of chain is in uri resolver cache
+    (`ptah.uri_cache_size` setting), so cache hit doesn't query
+    database, otherwise content is loaded with regular path query.
+    Cache is disabled by default, use `ptah.traverse_cache_size`
+    setting to enable it. Entries expire after `ttl` seconds
+    (`ptah.traverse_cache_ttl` setting), so content added by other
+    processes is found after `ttl`.
+
+    Optional `backend` is :py:class:`ptah.sharedcache.SharedCache`
+    shared by all processes on host (`ptah.traverse_cache_file`
+    setting). Process entries are valid only for current backend
+    generation.
+
+    Entries are evicted by path prefix on content events, shared
+    backend is invalidated as whole.
+    """
+
+    backend = None
+
+    def __init__(self, size=0, ttl=60):
+        self.size = size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.version = 0
+        self.lock = threading.Lock()
+        self.lru = OrderedDict()
+
+    def _generation(self):
+        return 0 if self.backend is None else self.backend.generation
+
+    def generation(self):
+        """ Return current generation of cache, capture it before
+        content is loaded and pass it to :py:meth:`set` """
+        return (self.version, self._generation())
+
+    def _store(self, path, chain, generation, expires, version=None):
+        if self.size:
+            with self.lock:
+                if version is not None and version != self.version:
+                    return
+                self.lru.pop(path, None)
+                self.lru[path] = (generation, expires, chain)
+                while len(self.lru) > self.size:
+                    self.lru.popitem(False)
+
+    def _lookup(self, path):
+        version, generation = self.generation()
+        now = time.time()
+
+        with self.lock:
+            item = self.lru.pop(path, _marker)
+            if item is not _marker and item[0] == generation and \
+                    not (item[1] and item[1] < now):
+                self.lru[path] = item
+                return item[2]
+
+        if self.backend is not None:
+            data = self.backend.get(path)
+            if data is not None:
+                expires, chain = json.loads(data.decode('utf-8'))
+                if not (expires and expires < now):
+                    chain = tuple(tuple(rec) for rec in chain)
+                    self._store(path, chain, generation, expires, version)
+                    return chain
+
+        return _marker
+
+    def get(self, path):
+        """ Return list of cached content for path, or `None` """
+        if not self.size and self.backend is None:
+            return None
+
+        chain = self._lookup(path)
+        if chain is not _marker:
+            uris = [uri for _p, uri in chain]
+
+            # resolve content only if it doesn't query database
+            if all(resolve_cache.contains(uri) for uri in uris):
+                obs = ptah.resolve_many(uris)
+
+                parents = []
+                for p, uri in chain:
+                    ob = obs.get(uri)
+                    if ob is None or ob.__path__ != p:
+                        break
+                    parents.append(ob)
+                else:
+                    self.hits += 1
+                    return parents
+
+                with self.lock:
+                    self.lru.pop(path, None)
+
+        self.misses += 1
+        return None
+
+    def set(self, path, parents, generation=None):
+        """ Cache content for path, `generation` is result of
+        :py:meth:`generation` captured before content was loaded.
+        Content is not cached if cache has been invalidated since. """
+        if not self.size and self.backend is None:
+            return
+
+        if generation is None:
+            generation = self.generation()
+        version, generation = generation
+
+        expires = time.time() + self.ttl if self.ttl else 0
+        chain = tuple((p.__path__, p.__uri__) for p in parents)
+        self._store(path, chain, generation, expires, version)
+
+        if self.backend is not None:
+            self.backend.set(
+                path, json.dumps([expires, chain]).encode('utf-8'),
+                generation)
+
+    def invalidate(self, prefix):
+        """ Evict all paths which start with `prefix` """
+        if not prefix:
+            return
+
+        with self.lock:
+            self.version += 1
+            for path in [p for p in self.lru if p.startswith(prefix)]:
+                del self.lru[path]
+
+        if self.backend is not None:
+            self.backend.invalidate()
+
+    def clear(self):
+        with self.lock:
+            self.version += 1
+            self.lru.clear()
+
+        if self.backend is not None:
+            self.backend.invalidate()
+
+    def resize(self, size, ttl=None):
+        """ Set size of cache, `0` disables cache. `ttl` is time to
+        live of cached path in seconds, `0` means no expiration """
+        with self.lock:
+            self.size = size
+            if ttl is not None:
+                self.ttl = ttl
+            while len(self.lru) > size:
+                self.lru.popitem(False)
+
+    def stats(self):
+        return {'hits': self.hits,
+                'misses': self.misses,
+                'size': len(self.lru),
+                'maxsize': self.size}
+
+
+traverse_cache = TraverseCache()
+
 
 @ptah.adapter(IApplicationRoot)
 @interface.implementer(ITraverser)
@@ -20,7 +192,7 @@ class ContentTraverser(object):
     def __init__(self, root):
         self.root = root
 
-    def __call__(self, request, queries=_path_queries):
+    def __call__(self, request, queries=_path_queries, cache=traverse_cache):
         environ = request.environ
         context = root = self.root
 
@@ -44,15 +216,19 @@ class ContentTraverser(object):
                 idx += 1
 
         if idx:
-            if idx not in queries:
-                bindparams = [sql.bindparam(str(p)) for p in range(idx)]
+            generation = cache.generation()
+            parents = cache.get(current)
+            if parents is None:
+                if idx not in queries:
+                    bindparams = [sql.bindparam(str(p)) for p in range(idx)]
 
-                queries[idx] = ptah.QueryFreezer(
-                    lambda: Session.query(BaseContent)\
-                        .filter(BaseContent.__path__.in_(bindparams))
-                        .order_by(sql.desc(BaseContent.__path__)))
+                    queries[idx] = ptah.QueryFreezer(
+                        lambda: Session.query(BaseContent)\
+                            .filter(BaseContent.__path__.in_(bindparams))
+                            .order_by(sql.desc(BaseContent.__path__)))
 
-            parents = queries[idx].all(**paths)
+                parents = queries[idx].all(**paths)
+                cache.set(current, parents, generation)
         else:
             parents = []
 
@@ -87,3 +263,39 @@ class ContentTraverser(object):
                     'virtual_root': root,
                     'virtual_root_path': (),
                     'root': root}
+
+
+@ptah.subscriber(ptah.events.ContentAddedEvent)
+@ptah.subscriber(ptah.events.ContentDeletingEvent)
+def content_traverse_handler(ev):
+    """ Evict content subtree from traversal cache """
+    traverse_cache.invalidate(getattr(ev.object, '__path__', None))
+
+
+@ptah.subscriber(ptah.events.ContentsAddedEvent)
+def contents_traverse_handler(ev):
+    """ Evict container subtree of bulk created content """
+    traverse_cache.invalidate(getattr(ev.container, '__path__', None))
+
+
+@ptah.subscriber(ptah.events.ContentMovedEvent)
+def content_moved_traverse_handler(ev):
+    """ Evict old and new content subtree from traversal cache """
+    traverse_cache.invalidate(ev.oldpath)
+    traverse_cache.invalidate(
+        ev.newpath or getattr(ev.object, '__path__', None))
+
+
+@ptah.subscriber(ptah.events.SettingsInitializing)
+def initialized(ev):
+    PTAH = ptah.get_settings(ptah.CFG_ID_PTAH, ev.registry)
+    traverse_cache.resize(
+        PTAH['traverse_cache_size'], PTAH['traverse_cache_ttl'])
+
+    if traverse_cache.backend is not None:
+        traverse_cache.backend.close()
+        traverse_cache.backend = None
+
+    if PTAH['traverse_cache_file']:
+        traverse_cache.backend = SharedCache(
+            PTAH['traverse_cache_file'], PTAH['traverse_cache_slots'])
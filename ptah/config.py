@@ -15,9 +15,11 @@ from venusian.advice import getFrameInfo
 ATTACH_ATTR = '__ptah_actions__'
 ID_ADAPTER = 'ptah.config:adapter'
 ID_SUBSCRIBER = 'ptah.config:subscriber'
+ID_BATCH_SUBSCRIBER = 'ptah.config:batch-subscriber'
 
 __all__ = ('initialize', 'get_cfg_storage', 'StopException',
-           'event', 'adapter', 'subscriber', 'shutdown', 'shutdown_handler',
+           'event', 'adapter', 'subscriber', 'batch_subscriber',
+           'shutdown', 'shutdown_handler',
            'Action', 'ClassAction', 'DirectiveInfo', 'LayerWrapper')
 
 log = logging.getLogger('ptah')
@@ -131,6 +133,35 @@ def subscriber(*args):
     return wrapper
 
 
+def batch_subscriber(event):
+    """ Register batch event subscriber. Subscriber is called with list
+    of `event` instances dispatched with :py:func:`ptah.events.notify`,
+    in deferred mode with all events collected in transaction. """
+    info = DirectiveInfo(allowed_scope=('module', 'function call'))
+
+    def wrapper(func):
+        discr = (ID_BATCH_SUBSCRIBER, func, event)
+
+        intr = Introspectable(
+            ID_BATCH_SUBSCRIBER, discr, 'Batch subscriber', ID_SUBSCRIBER)
+        intr['required'] = (event,)
+        intr['handler'] = func
+        intr['codeinfo'] = info.codeinfo
+
+        def _register(cfg, func, event):
+            storage = cfg.get_cfg_storage(ID_BATCH_SUBSCRIBER)
+            storage.setdefault(event, []).append(func)
+
+        info.attach(
+            Action(
+                _register, (func, event),
+                discriminator=discr, introspectables=(intr,))
+            )
+        return func
+
+    return wrapper
+
+
 def _getProvides(factory):
     p = list(implementedBy(factory))
     if len(p) == 1:
@@ -1,6 +1,13 @@
-from ptah import config
+import transaction
+from collections import OrderedDict
+from sqlalchemy.orm import object_session
+from sqlalchemy.orm.exc import NO_STATE
+from sqlalchemy.orm.attributes import instance_state
+from pyramid.threadlocal import get_current_registry
 from zope.interface.interfaces import ObjectEvent
 
+from ptah import config
+
 
 class event(object):
     """ Register event object, it is used for introspection only. """
@@ -151,7 +158,10 @@ class ContentEvent(ObjectEvent):
 @event('Content created event')
 class ContentCreatedEvent(ContentEvent):
     """ Event thrown by
-        :py:class:`ptah.cms.TypeInformation` """
+        :py:class:`ptah.cms.TypeInformation`. Subscribers initialize
+        state of new content, so event is never deferred """
+
+    immediate = True
 
 
 @event('Content added event')
@@ -159,10 +169,42 @@ class ContentAddedEvent(ContentEvent):
     """ Unused event.  To be removed """
 
 
+@event('Contents added event')
+class ContentsAddedEvent(object):
+    """ :py:func:`ptah.cms.bulk_create` will notify for each inserted
+        batch. `items` is a list of dicts with `__id__`, `__uri__`,
+        `__name__`, `__path__` and column values of created content
+        of `tinfo` type """
+
+    container = None
+    tinfo = None
+    items = ()
+
+    def __init__(self, container, tinfo, items):
+        self.container = container
+        self.tinfo = tinfo
+        self.items = items
+
+
 @event('Content moved event')
 class ContentMovedEvent(ContentEvent):
     """ :py:class:`ptah.cms.Container` will
-        notify when content has moved."""
+        notify when content has moved. Event is sent only for
+        moved content, paths of whole subtree are changed
+        from `oldpath` to `newpath` prefix."""
+
+    oldpath = ''
+    newpath = ''
+
+    def __init__(self, object, oldpath='', newpath=''):
+        super(ContentMovedEvent, self).__init__(object)
+        self.oldpath = oldpath
+        self.newpath = newpath
+
+    def merge(self, event):
+        """ Collapse with earlier queued `event`, content is moved
+        from first `oldpath` to last `newpath` """
+        self.oldpath = event.oldpath
 
 
 @event('Content modified event')
@@ -175,3 +217,120 @@ class ContentModifiedEvent(ContentEvent):
 class ContentDeletingEvent(ContentEvent):
     """ :py:class:`ptah.cms.Container` will
         notify when content deleted """
+
+
+@event('Contents deleting event')
+class ContentsDeletingEvent(object):
+    """ :py:class:`ptah.cms.Container` will notify once for whole
+        deleted subtree, `uris` is a list of all deleted content uris """
+
+    uris = ()
+
+    def __init__(self, uris):
+        self.uris = uris
+
+
+# deferred dispatch
+
+#: Defer events for all transactions, set by `ptah.deferred_events` setting
+DEFERRED = False
+
+
+def removed(ob):
+    """ Object is mapped and deleted or detached from its session """
+    try:
+        state = instance_state(ob)
+    except NO_STATE:
+        return False
+
+    if state.deleted:
+        return True
+
+    session = object_session(ob)
+    if session is None:
+        return state.key is not None
+    return ob in session.deleted
+
+
+class EventQueue(object):
+    """ Events collected in transaction. Events of same type for same
+    object are collapsed, last event is kept at position of first one,
+    event with `merge()` method gets previous event. Queue is
+    dispatched by before commit hook of transaction, events of objects
+    removed from session meanwhile are dropped. """
+
+    def __init__(self, registry):
+        self.registry = registry
+        self.events = OrderedDict()
+
+    def add(self, event):
+        ob = getattr(event, 'object', event)
+        key = (event.__class__, id(ob))
+
+        previous = self.events.get(key)
+        if previous is not None and hasattr(event, 'merge'):
+            event.merge(previous)
+        self.events[key] = event
+
+    def __len__(self):
+        return len(self.events)
+
+    def dispatch(self):
+        # subscribers can send new events
+        while self.events:
+            events = [ev for ev in self.events.values()
+                      if not removed(getattr(ev, 'object', ev))]
+            self.events.clear()
+            dispatch(events, self.registry)
+
+
+def get_queue(create=False):
+    """ Return event queue of current transaction """
+    txn = transaction.get()
+    queue = getattr(txn, '_ptah_events', None)
+    if queue is None and create:
+        queue = txn._ptah_events = EventQueue(get_current_registry())
+        txn.addBeforeCommitHook(queue.dispatch)
+    return queue
+
+
+def defer():
+    """ Defer :py:func:`notify` events until commit of current
+    transaction """
+    return get_queue(True)
+
+
+def dispatch(events, registry=None):
+    """ Notify subscribers of each event, then batch subscribers with
+    list of events of its type. Events get true `dispatched` attribute,
+    subscribers can skip events handled by batch subscriber """
+    if registry is None:
+        registry = get_current_registry()
+
+    batches = OrderedDict()
+    for event in events:
+        event.dispatched = True
+        registry.notify(event)
+        batches.setdefault(event.__class__, []).append(event)
+
+    storage = config.get_cfg_storage(
+        config.ID_BATCH_SUBSCRIBER, registry)
+    for cls, items in batches.items():
+        for required, handlers in storage.items():
+            if issubclass(cls, required):
+                for handler in handlers:
+                    handler(items)
+
+
+def notify(event, registry=None):
+    """ Send event. Event is queued if deferred dispatch is enabled
+    with :py:func:`defer` or `ptah.deferred_events` setting, unless
+    event has true `immediate` attribute """
+    queue = None
+    if not getattr(event, 'immediate', False):
+        queue = get_queue(DEFERRED)
+
+    if queue is not None:
+        queue.add(event)
+    else:
+        dispatch((event,), registry)
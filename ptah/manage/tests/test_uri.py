@@ -19,6 +19,22 @@ class TestUriView(PtahTestCase):
         self.assertEqual(view.data[0]['name'],
                          'ptah.authentication.superuser_resolver')
 
+    def test_uri_view_caches(self):
+        from ptah.manage.uri import UriResolver
+        from ptah.cms.traverser import traverse_cache
+
+        traverse_cache.resize(10)
+        self.addCleanup(traverse_cache.resize, 0)
+        traverse_cache.hits, traverse_cache.misses = 3, 1
+
+        view = UriResolver(None, DummyRequest())
+        view.update()
+
+        self.assertEqual(view.caches[0]['title'], 'Uri resolver')
+        self.assertEqual(view.caches[1]['title'], 'Content traversal')
+        self.assertEqual(view.caches[1]['maxsize'], 10)
+        self.assertEqual(view.caches[1]['ratio'], 75.0)
+
     def test_uri_handler(self):
         from ptah.manage.uri import UriResolver
 
@@ -5,7 +5,8 @@ from pyramid.httpexceptions import HTTPFound
 
 import ptah
 from ptah import form, config, manage
-from ptah.uri import ID_RESOLVER
+from ptah.uri import ID_RESOLVER, resolve_cache
+from ptah.cms.traverser import traverse_cache
 from ptah.manage.manage import PtahManageRoute, get_manage_url
 
 
@@ -40,6 +41,15 @@ class UriResolver(form.Form):
     def update(self):
         res = super(UriResolver, self).update()
 
+        self.caches = caches = []
+        for title, cache in (('Uri resolver', resolve_cache),
+                             ('Content traversal', traverse_cache)):
+            stats = cache.stats()
+            total = stats['hits'] + stats['misses']
+            stats['title'] = title
+            stats['ratio'] = (100.0 * stats['hits'] / total) if total else 0.0
+            caches.append(stats)
+
         uri = self.uri
         if uri is None:
             uri = [self.request.GET.get('uri','')]
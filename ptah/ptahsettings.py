@@ -40,6 +40,73 @@ ptah.register_settings(
                         '"0" means do not poll'),
         default = 0),
 
+    ptah.form.IntegerField(
+        'uri_cache_size',
+        title = _('Uri resolver cache size.'),
+        description = _('Maximum number of resolved objects cached '
+                        'per process. "0" means do not cache'),
+        default = 0),
+
+    ptah.form.IntegerField(
+        'uri_cache_ttl',
+        title = _('Uri resolver cache ttl (seconds).'),
+        description = _('How long resolved object is cached per '
+                        'process. "0" means do not expire'),
+        default = 60),
+
+    ptah.form.IntegerField(
+        'uri_negative_ttl',
+        title = _('Unresolvable uri cache ttl (seconds).'),
+        description = _('How long uri which can not be resolved is '
+                        'remembered. "0" means do not cache'),
+        default = 0),
+
+    ptah.form.IntegerField(
+        'traverse_cache_size',
+        title = _('Content traversal cache size.'),
+        description = _('Maximum number of content traversal results '
+                        'cached per process. "0" means do not cache'),
+        default = 0),
+
+    ptah.form.IntegerField(
+        'traverse_cache_ttl',
+        title = _('Content traversal cache ttl (seconds).'),
+        description = _('How long content traversal result is cached. '
+                        '"0" means do not expire'),
+        default = 60),
+
+    ptah.form.TextField(
+        'traverse_cache_file',
+        title = _('Shared content traversal cache file.'),
+        description = _('Path to memory-mapped file shared by all '
+                        'processes on host. Empty means do not share'),
+        default = ''),
+
+    ptah.form.IntegerField(
+        'traverse_cache_slots',
+        title = _('Shared content traversal cache slots.'),
+        description = _('Number of entries in shared cache file.'),
+        default = 65536),
+
+    ptah.form.BoolField(
+        'uri_ordered',
+        title = _('Time ordered uris'),
+        description = _('Generate time ordered uris for new objects.'),
+        default = False),
+
+    ptah.form.BoolField(
+        'search_index',
+        title = _('Full-text search index'),
+        description = _('Index content on add, modify and delete.'),
+        default = True),
+
+    ptah.form.BoolField(
+        'deferred_events',
+        title = _('Deferred content events'),
+        description = _('Collapse content events and send them '
+                        'before transaction commit.'),
+        default = False),
+
     ptah.form.TextField(
         'manage',
         title = 'Ptah manage id',
@@ -98,11 +165,56 @@ ptah.register_settings(
         title = 'Cache',
         description = 'Eanble SQLAlchemy statement caching'),
 
+    ptah.form.ChoiceField(
+        'json',
+        title = 'JSON codec',
+        description = 'Codec for json columns ("auto", "ujson", '\
+            '"simplejson", "json"), "auto" uses fastest installed codec',
+        vocabulary = ptah.form.SimpleVocabulary.from_values(
+            "auto", "ujson", "simplejson", "json"),
+        default = 'auto'),
+
     title = 'SQLAlchemy settings',
     description = 'Configuration settings for a SQLAlchemy database engine.'
     )
 
 
+ptah.register_settings(
+    ptah.CFG_ID_BLOB,
+
+    ptah.form.TextField(
+        'fs_path',
+        default = '',
+        title = 'Filesystem blob storage path',
+        description = 'Directory for blob-fs storage files.'),
+
+    ptah.form.IntegerField(
+        'fs_grace',
+        default = 3600,
+        title = 'Unused blob file grace period (seconds)',
+        description = 'Unused blob-fs file is removed only if it was '\
+            'not stored during this period.'),
+
+    ptah.form.ChoiceField(
+        'offload',
+        title = 'Blob download offload',
+        description = 'Let front-end server send blob-fs files '\
+            '("none", "x-sendfile", "x-accel-redirect")',
+        vocabulary = ptah.form.SimpleVocabulary.from_values(
+            "none", "x-sendfile", "x-accel-redirect"),
+        default = 'none'),
+
+    ptah.form.TextField(
+        'offload_prefix',
+        default = '/blobs/',
+        title = 'X-Accel-Redirect location',
+        description = 'Internal nginx location mapped to blob-fs path.'),
+
+    title = 'Blob storage settings',
+    description = 'Configuration settings for blob storages.'
+    )
+
+
 ptah.register_settings(
     ptah.CFG_ID_FORMAT,
 
@@ -220,8 +332,19 @@ def initialized(ev):
     PTAH['full_email_address'] = formataddr(
         (PTAH['email_from_name'], PTAH['email_from_address']))
 
+    # uri resolver cache
+    ptah.uri.resolve_cache.resize(
+        PTAH['uri_cache_size'], PTAH['uri_cache_ttl'])
+    ptah.uri.negative_cache.configure(PTAH['uri_negative_ttl'])
+    ptah.UriFactory.ordered = PTAH['uri_ordered']
+
+    # content events
+    ptah.events.DEFERRED = PTAH['deferred_events']
+
     # sqla
     SQLA = ptah.get_settings(ptah.CFG_ID_SQLA, ev.registry)
+    ptah.sqla.set_json_codec(SQLA['json'])
+
     url = SQLA['url']
     if url:
         engine_args = {}
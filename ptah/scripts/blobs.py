@@ -0,0 +1,58 @@
+""" blob storage commands """
+import argparse
+from pyramid.paster import bootstrap
+
+from ptah.cms.blob import fs_blob_storage, migrate_sql_blobs
+from ptah.cms.blob import upgrade_blob_tables
+
+
+def main(init=True):
+    args = MigrateBlobsCommand.parser.parse_args()
+
+    if init: # pragma: no cover
+        env = bootstrap(args.config)
+
+    cmd = MigrateBlobsCommand(args)
+    cmd.run()
+
+    if init: # pragma: no cover
+        env['closer']()
+
+
+class MigrateBlobsCommand(object):
+    """ 'migrate-blobs' command"""
+
+    parser = argparse.ArgumentParser(
+        description="move blob-sql blobs to filesystem blob storage")
+    parser.add_argument('config', metavar='config',
+                        help='Configuration file')
+    parser.add_argument('-b', '--batch', type=int,
+                        dest='batch', default=100,
+                        help='Number of blobs moved in one transaction')
+    parser.add_argument('--gc', action='store_true', dest='gc',
+                        help='Remove unused files of filesystem storage')
+    parser.add_argument('--upgrade', action='store_true', dest='upgrade',
+                        help='Add missing columns to existing blob tables')
+
+    def __init__(self, args):
+        self.options = args
+
+    def run(self):
+        if self.options.upgrade:
+            added = upgrade_blob_tables()
+            print ('Added columns: %s'%(', '.join(added) or 'none'))
+            return
+
+        if not fs_blob_storage.directory:
+            print ('Filesystem blob storage path is not configured, '
+                   'set "blob.fs_path" setting.')
+            return
+
+        if self.options.gc:
+            count = fs_blob_storage.collect()
+            print ('%s unused files removed from %s'%(
+                count, fs_blob_storage.directory))
+            return
+
+        count = migrate_sql_blobs(self.options.batch)
+        print ('%s blobs moved to %s'%(count, fs_blob_storage.directory))
@@ -0,0 +1,47 @@
+""" search and terms index commands """
+import argparse
+from pyramid.paster import bootstrap
+
+from ptah.cms.search import search_index, reindex
+from ptah.cms.terms import reindex_terms
+
+
+def main(init=True):
+    args = ReindexCommand.parser.parse_args()
+
+    if init: # pragma: no cover
+        env = bootstrap(args.config)
+
+    cmd = ReindexCommand(args)
+    cmd.run()
+
+    if init: # pragma: no cover
+        env['closer']()
+
+
+class ReindexCommand(object):
+    """ 'reindex-content' command"""
+
+    parser = argparse.ArgumentParser(
+        description="rebuild content full-text search and terms index")
+    parser.add_argument('config', metavar='config',
+                        help='Configuration file')
+    parser.add_argument('-b', '--batch', type=int,
+                        dest='batch', default=500,
+                        help='Number of content items indexed in one '
+                        'transaction')
+
+    def __init__(self, args):
+        self.options = args
+
+    def run(self):
+        count = reindex_terms(self.options.batch)
+        print ('%s content items terms indexed'%count)
+
+        if search_index.backend() is None:
+            print ('Full-text search index is disabled or database '
+                   'is not supported.')
+            return
+
+        count = reindex(self.options.batch)
+        print ('%s content items indexed'%count)
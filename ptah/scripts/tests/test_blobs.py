@@ -0,0 +1,98 @@
+import os
+import sys
+import shutil
+import tempfile
+
+import ptah
+from ptah.scripts import blobs
+from ptah.testing import PtahTestCase
+from pyramid.compat import NativeIO
+
+
+class TestMigrateBlobsCommand(PtahTestCase):
+
+    def setUp(self):
+        super(TestMigrateBlobsCommand, self).setUp()
+
+        from ptah.cms.blob import fs_blob_storage
+        self.dir = tempfile.mkdtemp()
+        self.storage = fs_blob_storage
+        self.storage.directory = ''
+
+    def tearDown(self):
+        self.storage.directory = ''
+        shutil.rmtree(self.dir)
+        super(TestMigrateBlobsCommand, self).tearDown()
+
+    def _run(self, *args):
+        sys.argv[1:] = ['config.ini'] + list(args)
+
+        stdout = sys.stdout
+        out = NativeIO()
+        sys.stdout = out
+
+        blobs.main(False)
+        sys.stdout = stdout
+
+        return out.getvalue()
+
+    def test_migrate_blobs_not_configured(self):
+        val = self._run()
+        self.assertIn('blob storage path is not configured', val)
+
+    def test_migrate_blobs_command(self):
+        import transaction
+        from pyramid.compat import bytes_
+
+        for idx in range(3):
+            blob = ptah.cms.blob_storage.create()
+            blob.write(bytes_('blob data %s'%idx, 'utf-8'))
+        transaction.commit()
+
+        self.storage.directory = self.dir
+
+        val = self._run('-b', '2')
+        self.assertIn('3 blobs moved to %s'%self.dir, val)
+        self.assertTrue(os.path.isdir(os.path.join(self.dir, 'tmp')))
+
+    def test_migrate_blobs_gc(self):
+        self.storage.directory = self.dir
+        self.storage.grace = 0
+        self.addCleanup(setattr, self.storage, 'grace', 3600)
+
+        path = self.storage.path('0'*64)
+        os.makedirs(os.path.dirname(path))
+        open(path, 'wb').close()
+
+        val = self._run('--gc')
+        self.assertIn('1 unused files removed from %s'%self.dir, val)
+        self.assertFalse(os.path.exists(path))
+
+    def test_migrate_blobs_upgrade(self):
+        import transaction
+        from pyramid.compat import bytes_
+        from sqlalchemy.engine.reflection import Inspector
+        from ptah.cms.blob import Blob
+
+        # blobs table of 0.1
+        Blob.__table__.drop()
+        ptah.cms.Session.execute(
+            'CREATE TABLE ptah_blobs (id INTEGER NOT NULL PRIMARY KEY, '
+            'mimetype VARCHAR, filename VARCHAR, size INTEGER, data BLOB)')
+        transaction.commit()
+
+        val = self._run('--upgrade')
+        self.assertIn(
+            'Added columns: ptah_blobs.hash, ptah_blobs.modified', val)
+
+        inspector = Inspector.from_engine(ptah.cms.Session.bind)
+        self.assertIn('ix_ptah_blobs_hash',
+                      [idx['name'] for idx in
+                       inspector.get_indexes('ptah_blobs')])
+
+        blob = ptah.cms.blob_storage.create()
+        blob.write(bytes_('blob data', 'utf-8'))
+        transaction.commit()
+
+        val = self._run('--upgrade')
+        self.assertIn('Added columns: none', val)
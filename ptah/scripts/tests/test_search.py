@@ -0,0 +1,56 @@
+import sys
+import transaction
+
+import ptah
+from ptah.scripts import search
+from ptah.testing import PtahTestCase
+from pyramid.compat import NativeIO
+
+
+class TestReindexCommand(PtahTestCase):
+
+    _init_ptah = False
+
+    def setUp(self):
+        global Page
+        class Page(ptah.cms.Content):
+            __type__ = ptah.cms.Type('page', 'Test Page')
+            __uri_factory__ = ptah.UriFactory('cms-page')
+
+        super(TestReindexCommand, self).setUp()
+        self.init_ptah()
+
+    def _run(self, *args):
+        sys.argv[1:] = ['config.ini'] + list(args)
+
+        stdout = sys.stdout
+        out = NativeIO()
+        sys.stdout = out
+
+        search.main(False)
+        sys.stdout = stdout
+
+        return out.getvalue()
+
+    def test_reindex_disabled(self):
+        from ptah.cms.search import search_index
+
+        self.addCleanup(setattr, search_index, 'enabled', True)
+        search_index.enabled = False
+
+        val = self._run()
+        self.assertIn('search index is disabled', val)
+
+    def test_reindex_command(self):
+        page = Page(title='Python tutorial')
+        ptah.cms.Session.add(page)
+        transaction.commit()
+
+        ptah.cms.search_index.clear()
+        transaction.commit()
+        self.assertEqual(ptah.cms.search('python'), [])
+
+        val = self._run('-b', '1')
+        self.assertIn('1 content items terms indexed', val)
+        self.assertIn('1 content items indexed', val)
+        self.assertEqual(ptah.cms.search_index.count('python'), 1)
@@ -25,6 +25,25 @@ def get_acls():
     return config.get_cfg_storage(ID_ACL)
 
 
+_acls_version = 0
+
+def get_acls_version():
+    """ return version of ACL maps, version is changed on any
+    ACL map modification """
+    return _acls_version
+
+
+def acls_changed():
+    """ invalidate caches of computed permissions """
+    global _acls_version
+    _acls_version += 1
+
+
+def register_acl(cfg, acl):
+    cfg.get_cfg_storage(ID_ACL)[acl.id] = acl
+    acls_changed()
+
+
 def get_roles():
     """ return list of registered roles """
     return config.get_cfg_storage(ID_ROLE)
@@ -96,8 +115,7 @@ class ACL(list):
 
         info.attach(
             config.Action(
-                lambda config, p: \
-                    config.get_cfg_storage(ID_ACL).update({id: p}),
+                register_acl,
                 (self,), discriminator=discr, introspectables=(intr,))
             )
         self.directiveInfo = info
@@ -127,6 +145,7 @@ class ACL(list):
             rec[2] = ALL_PERMISSIONS
         else:
             rec[2].update(permissions)
+        acls_changed()
 
     def deny(self, role, *permissions):
         """ Deny permissions for role """
@@ -146,6 +165,7 @@ class ACL(list):
             rec[2] = ALL_PERMISSIONS
         else:
             rec[2].update(permissions)
+        acls_changed()
 
     def unset(self, role, *permissions):
         """ Unset any previously defined permissions """
@@ -165,6 +185,7 @@ class ACL(list):
             if rec[2]:
                 records.append(rec)
         self[:] = records
+        acls_changed()
 
 
 class ACLsMerge(object):
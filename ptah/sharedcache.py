@@ -0,0 +1,167 @@
+""" shared memory-mapped cache """
+import os
+import mmap
+import zlib
+import struct
+import threading
+from hashlib import md5
+
+try:
+    import fcntl
+except ImportError: # pragma: no cover
+    fcntl = None
+
+MAGIC = b'PTAHSC01'
+HEADER = struct.Struct('!8sIIQ')
+SLOT = struct.Struct('!IQHH')
+PROBES = 8
+
+
+class SharedCache(object):
+    """ Cache shared by all processes on host.
+
+    Cache is stored in memory-mapped file, file contains header with
+    table geometry and generation counter, and fixed size open-addressing
+    table of `slots` slots, `slot_size` bytes each. Each slot contains
+    crc, generation, key and value. Slot is valid only if its generation
+    is equal to generation in header and crc matches, so readers never
+    see partially written slots and :py:meth:`invalidate` drops whole
+    cache by incrementing generation.
+
+    Keys are text strings, values are bytes. Values which do not fit
+    into slot are not cached.
+
+    :param path: Path to cache file, file is created if it doesn't exist
+    :param slots: Number of slots
+    :param slot_size: Size of slot in bytes
+    """
+
+    def __init__(self, path, slots=65536, slot_size=512):
+        self.path = path
+        self.slots = slots
+        self.slot_size = slot_size
+        self.lock = threading.Lock()
+
+        size = HEADER.size + slots * slot_size
+
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            self._lock(fd)
+            try:
+                header = os.read(fd, HEADER.size)
+                if len(header) == HEADER.size:
+                    magic, fslots, fsize, gen = HEADER.unpack(header)
+                    if (magic, fslots, fsize) != (MAGIC, slots, slot_size):
+                        header = b''
+
+                if len(header) != HEADER.size:
+                    os.ftruncate(fd, 0)
+                    os.ftruncate(fd, size)
+                    os.lseek(fd, 0, os.SEEK_SET)
+                    os.write(fd, HEADER.pack(MAGIC, slots, slot_size, 1))
+            finally:
+                self._unlock(fd)
+
+            self.map = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+
+    def _lock(self, fd):
+        if fcntl is not None:
+            fcntl.lockf(fd, fcntl.LOCK_EX)
+
+    def _unlock(self, fd):
+        if fcntl is not None:
+            fcntl.lockf(fd, fcntl.LOCK_UN)
+
+    @property
+    def generation(self):
+        return HEADER.unpack_from(self.map, 0)[3]
+
+    def _offsets(self, key):
+        idx = int(md5(key).hexdigest()[:8], 16) % self.slots
+        for probe in range(min(PROBES, self.slots)):
+            yield HEADER.size + ((idx + probe) % self.slots) * self.slot_size
+
+    def _read(self, offset, generation):
+        crc, gen, klen, vlen = SLOT.unpack_from(self.map, offset)
+        if gen != generation or \
+                SLOT.size + klen + vlen > self.slot_size:
+            return None, None
+
+        start = offset + SLOT.size
+        data = self.map[start:start + klen + vlen]
+        if crc != zlib.crc32(struct.pack('!Q', gen) + data) & 0xffffffff:
+            return None, None
+
+        return data[:klen], data[klen:]
+
+    def get(self, key, default=None):
+        """ Return value for `key` """
+        key = key.encode('utf-8')
+        generation = self.generation
+
+        for offset in self._offsets(key):
+            k, value = self._read(offset, generation)
+            if k is None:
+                break
+            if k == key:
+                return value
+
+        return default
+
+    def set(self, key, value, generation=None):
+        """ Store value for `key`.
+
+        `generation` is generation captured before value was loaded,
+        if cache has been invalidated since then value is not stored,
+        slot is tagged with captured generation anyway, so concurrent
+        invalidation makes it invalid.
+        """
+        key = key.encode('utf-8')
+        if SLOT.size + len(key) + len(value) > self.slot_size:
+            return False
+
+        if generation is None:
+            generation = self.generation
+        elif generation != self.generation:
+            return False
+
+        data = key + value
+
+        with self.lock:
+            target = None
+            for offset in self._offsets(key):
+                k, v = self._read(offset, generation)
+                if k is None or k == key:
+                    target = offset
+                    break
+            if target is None:
+                # table is full, replace first slot
+                target = next(self._offsets(key))
+
+            crc = zlib.crc32(struct.pack('!Q', generation) + data) & 0xffffffff
+            start = target + SLOT.size
+            self.map[target:start] = SLOT.pack(0, 0, 0, 0)
+            self.map[start:start + len(data)] = data
+            self.map[target:start] = SLOT.pack(
+                crc, generation, len(key), len(value))
+
+        return True
+
+    def invalidate(self):
+        """ Invalidate all entries, increments generation counter """
+        with self.lock:
+            fd = os.open(self.path, os.O_RDWR)
+            try:
+                self._lock(fd)
+                try:
+                    magic, slots, size, gen = HEADER.unpack_from(self.map, 0)
+                    HEADER.pack_into(self.map, 0, magic, slots, size, gen+1)
+                finally:
+                    self._unlock(fd)
+            finally:
+                os.close(fd)
+
+    def close(self):
+        self.map.close()
@@ -28,7 +28,10 @@ class QueryFreezer(object):
     def reset(self):
         self.data = local()
 
-    def iter(self, **params):
+    def compile(self):
+        """ Build and compile query, it is done once per thread.
+        Returns thread local data with `query`, `mapper`, `querycontext`
+        and frozen statement `stmt` """
         data = self.data
         if not hasattr(data, 'query'):
             data.query = self.builder()
@@ -36,15 +39,24 @@ class QueryFreezer(object):
             data.querycontext = data.query._compile_context()
             data.querycontext.statement.use_labels = True
             data.stmt = data.querycontext.statement
+        return data
+
+    def execute(self, stmt, params):
+        """ Execute frozen statement or statement derived from it,
+        for example with applied limit, return query instances """
+        data = self.compile()
 
         conn = data.query._connection_from_session(
             mapper=data.mapper,
-            clause=data.stmt,
+            clause=stmt,
             close_with_result=True)
 
-        result = conn.execute(data.stmt, **params)
+        result = conn.execute(stmt, **params)
         return data.query.instances(result, data.querycontext)
 
+    def iter(self, **params):
+        return self.execute(self.compile().stmt, params)
+
     def one(self, **params):
         ret = list(self.iter(**params))
 
@@ -68,19 +80,49 @@ class QueryFreezer(object):
         return list(self.iter(**params))
 
 
+JSON_CODECS = ('ujson', 'simplejson', 'json')
+
+json_codec = json
+
+
+def set_json_codec(name='auto'):
+    """ Set module used for encoding and decoding json columns.
+    With `auto` first installed of `ujson`, `simplejson` and `json`
+    is used, stdlib `json` is used if codec is not installed.
+    Returns codec module. """
+    global json_codec
+
+    names = JSON_CODECS if name == 'auto' else (name,)
+    for name in names:
+        try:
+            json_codec = __import__(name)
+            break
+        except ImportError:
+            continue
+    else:
+        json_codec = json
+
+    return json_codec
+
+
 class JsonType(TypeDecorator):
-    """Represents an immutable structure as a json-encoded string."""
+    """Represents an immutable structure as a json-encoded string.
+
+    Values are decoded with :py:data:`json_codec`. To decode value
+    only when attribute of loaded instance is read, map column with
+    :py:func:`sqlalchemy.orm.deferred`.
+    """
 
     impl = VARCHAR
 
     def process_bind_param(self, value, dialect):
         if value is not None:
-            value = json.dumps(value)
+            value = json_codec.dumps(value)
         return value
 
     def process_result_value(self, value, dialect):
         if value is not None:
-            value = json.loads(value)
+            value = json_codec.loads(value)
         return value
 
 
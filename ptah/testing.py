@@ -4,6 +4,7 @@ import unittest
 import sqlahelper
 import sqlalchemy
 import transaction
+from sqlalchemy import event
 from pyramid import testing
 from pyramid.interfaces import \
      IRequest, IAuthenticationPolicy, IAuthorizationPolicy
@@ -14,6 +15,53 @@ import ptah
 from ptah import config
 
 
+class StatementRecorder(list):
+    """ Records sql statements executed by engine, use it as context
+    manager or call :py:meth:`start` and :py:meth:`stop`. Optional
+    `filter` receives statement and returns `True` if statement is
+    recorded. `executemany` flags of statements are in `many` list.
+
+    .. code-block:: python
+
+        with StatementRecorder(lambda s: s.startswith('UPDATE')) as stmts:
+            container.move_to('item', 1)
+
+        self.assertEqual(len(stmts), 1)
+    """
+
+    def __init__(self, filter=None, engine=None):
+        super(StatementRecorder, self).__init__()
+        self.filter = filter
+        self.engine = engine
+        self.many = []
+
+    def start(self):
+        if self.engine is None:
+            self.engine = sqlahelper.get_engine()
+
+        def listener(conn, cursor, statement, parameters, context, many):
+            if self.filter is None or self.filter(statement):
+                self.append(statement)
+                self.many.append(many)
+            return statement, parameters
+
+        # engine wraps listener without retval, then it can not be removed
+        self._listener = listener
+        event.listen(self.engine, 'before_cursor_execute', listener,
+                     retval=True)
+        return self
+
+    def stop(self):
+        self.engine.dispatch.before_cursor_execute.remove(
+            self._listener, self.engine)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+
 class PtahTestCase(unittest.TestCase):
 
     _init_ptah = True
@@ -79,6 +127,7 @@ class PtahTestCase(unittest.TestCase):
 
         import ptah.security
         ptah.security.DEFAULT_ACL[:] = []
+        ptah.security.acls_changed()
 
         from ptah.config import ATTACH_ATTR
 
@@ -51,3 +51,156 @@ class TestEvent(ptah.PtahTestCase):
             (ptah.event.ID_EVENT, name))
         self.assertIsNotNone(intr)
         self.assertIs(intr['ev'].factory, TestEvent)
+
+
+class TestDeferredEvents(ptah.PtahTestCase):
+
+    _init_ptah = False
+
+    def setUp(self):
+        super(TestDeferredEvents, self).setUp()
+
+        global TestEvent, TestSubEvent
+        class TestEvent(object):
+            def __init__(self, object):
+                self.object = object
+
+        class TestSubEvent(TestEvent):
+            pass
+
+        self.events = events = []
+        self.batches = batches = []
+
+        @ptah.subscriber(TestEvent)
+        def handler(ev):
+            events.append(ev)
+
+        @ptah.batch_subscriber(TestEvent)
+        def batch_handler(items):
+            batches.append(items)
+
+        self.init_ptah()
+
+    def tearDown(self):
+        import transaction
+        transaction.abort()
+        ptah.events.DEFERRED = False
+        super(TestDeferredEvents, self).tearDown()
+
+    def test_event_notify(self):
+        ev = TestEvent(object())
+        ptah.events.notify(ev)
+
+        self.assertEqual(self.events, [ev])
+        self.assertEqual(self.batches, [[ev]])
+
+    def test_event_batch_subclass(self):
+        ev = TestSubEvent(object())
+        ptah.events.notify(ev)
+
+        self.assertEqual(self.batches, [[ev]])
+
+    def test_event_batch_intr(self):
+        intr = [i['introspectable'] for i in
+                self.registry.introspector.get_category(
+                    ptah.config.ID_BATCH_SUBSCRIBER)
+                if i['introspectable']['required'] == (TestEvent,)]
+        self.assertEqual(len(intr), 1)
+        self.assertEqual(intr[0]['handler'].__name__, 'batch_handler')
+
+    def test_event_deferred(self):
+        import transaction
+
+        ob1, ob2 = object(), object()
+
+        queue = ptah.events.defer()
+        self.assertIs(ptah.events.defer(), queue)
+
+        ev1 = TestEvent(ob1)
+        ev2 = TestEvent(ob2)
+        ev3 = TestEvent(ob1)
+        ev4 = TestSubEvent(ob1)
+        for ev in (ev1, ev2, ev3, ev4):
+            ptah.events.notify(ev)
+
+        self.assertEqual(self.events, [])
+        self.assertEqual(len(queue), 3)
+
+        transaction.commit()
+
+        self.assertEqual(self.events, [ev3, ev2, ev4])
+        self.assertEqual(self.batches, [[ev3, ev2], [ev4]])
+
+        # queue is bound to transaction
+        ptah.events.notify(ev1)
+        self.assertEqual(self.events, [ev3, ev2, ev4, ev1])
+
+    def test_event_deferred_moved(self):
+        ob = object()
+        queue = ptah.events.EventQueue(self.registry)
+        queue.add(ptah.events.ContentMovedEvent(ob, '/a/', '/b/'))
+        queue.add(ptah.events.ContentMovedEvent(ob, '/b/', '/c/'))
+
+        self.assertEqual(len(queue), 1)
+        ev = list(queue.events.values())[0]
+        self.assertEqual((ev.oldpath, ev.newpath), ('/a/', '/c/'))
+
+    def test_event_deferred_immediate(self):
+        import transaction
+
+        class ImmediateEvent(TestEvent):
+            immediate = True
+
+        ptah.events.defer()
+        ev = ImmediateEvent(object())
+        ptah.events.notify(ev)
+
+        self.assertEqual(self.events, [ev])
+        self.assertEqual(self.batches, [[ev]])
+        self.assertEqual(len(ptah.events.get_queue()), 0)
+
+        transaction.commit()
+        self.assertEqual(self.events, [ev])
+
+    def test_event_deferred_abort(self):
+        import transaction
+
+        ptah.events.defer()
+        ptah.events.notify(TestEvent(object()))
+        transaction.abort()
+        transaction.commit()
+
+        self.assertEqual(self.events, [])
+        self.assertIsNone(ptah.events.get_queue())
+
+    def test_event_deferred_nested(self):
+        import transaction
+
+        ob = object()
+        sub = TestSubEvent(ob)
+        self.config.add_subscriber(
+            lambda ev: ev is not sub and ptah.events.notify(sub), TestEvent)
+
+        ptah.events.defer()
+        ev = TestEvent(ob)
+        ptah.events.notify(ev)
+        transaction.commit()
+
+        self.assertEqual(self.events, [ev, sub])
+        self.assertEqual(self.batches, [[ev], [sub]])
+
+    def test_event_deferred_setting(self):
+        import transaction
+
+        PTAH = ptah.get_settings(ptah.CFG_ID_PTAH, self.registry)
+        PTAH['deferred_events'] = True
+        self.registry.notify(
+            ptah.events.SettingsInitializing(self.config, self.registry))
+        self.assertTrue(ptah.events.DEFERRED)
+
+        ev = TestEvent(object())
+        ptah.events.notify(ev)
+        self.assertEqual(self.events, [])
+
+        transaction.commit()
+        self.assertEqual(self.events, [ev])
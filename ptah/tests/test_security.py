@@ -55,6 +55,27 @@ class TestACL(PtahTestCase):
 
         self.assertRaises(ConfigurationConflictError, self.init_ptah)
 
+    def test_acl_version(self):
+        import ptah
+        from ptah.security import get_acls_version
+
+        version = get_acls_version()
+        pmap = ptah.ACL('map', 'acl map')
+        self.init_ptah()
+        self.assertTrue(get_acls_version() > version)
+
+        version = get_acls_version()
+        pmap.allow('role:test', 'perm1')
+        self.assertTrue(get_acls_version() > version)
+
+        version = get_acls_version()
+        pmap.deny('role:test', 'perm2')
+        self.assertTrue(get_acls_version() > version)
+
+        version = get_acls_version()
+        pmap.unset(None, 'perm1')
+        self.assertTrue(get_acls_version() > version)
+
     def test_acl_allow(self):
         import ptah
 
@@ -0,0 +1,122 @@
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+
+class TestSharedCache(TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'cache')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def _make_one(self, slots=64, slot_size=128):
+        from ptah.sharedcache import SharedCache
+
+        cache = SharedCache(self.path, slots, slot_size)
+        self.addCleanup(cache.close)
+        return cache
+
+    def test_sharedcache_get_set(self):
+        cache = self._make_one()
+
+        self.assertIsNone(cache.get('key'))
+        self.assertEqual(cache.get('key', 'default'), 'default')
+
+        self.assertTrue(cache.set('key', b'value'))
+        self.assertEqual(cache.get('key'), b'value')
+
+        cache.set('key', b'new value')
+        self.assertEqual(cache.get('key'), b'new value')
+
+        cache.set('/path/', b'path')
+        self.assertEqual(cache.get('/path/'), b'path')
+
+    def test_sharedcache_file_size(self):
+        from ptah.sharedcache import HEADER
+
+        self._make_one(64, 128)
+        self.assertEqual(os.path.getsize(self.path), HEADER.size + 64*128)
+
+    def test_sharedcache_value_too_big(self):
+        cache = self._make_one(slot_size=64)
+
+        self.assertFalse(cache.set('key', b'x'*64))
+        self.assertIsNone(cache.get('key'))
+
+    def test_sharedcache_shared(self):
+        cache1 = self._make_one()
+        cache2 = self._make_one()
+
+        cache1.set('key', b'value')
+        self.assertEqual(cache2.get('key'), b'value')
+
+        cache2.invalidate()
+        self.assertIsNone(cache1.get('key'))
+        self.assertEqual(cache1.generation, cache2.generation)
+
+    def test_sharedcache_invalidate(self):
+        cache = self._make_one()
+        generation = cache.generation
+
+        cache.set('key', b'value')
+        cache.invalidate()
+
+        self.assertEqual(cache.generation, generation + 1)
+        self.assertIsNone(cache.get('key'))
+
+        cache.set('key', b'value2')
+        self.assertEqual(cache.get('key'), b'value2')
+
+    def test_sharedcache_set_generation(self):
+        cache = self._make_one()
+        generation = cache.generation
+
+        # value loaded before concurrent invalidation is not stored
+        cache.invalidate()
+        self.assertFalse(cache.set('key', b'stale', generation))
+        self.assertIsNone(cache.get('key'))
+
+        self.assertTrue(cache.set('key', b'value', cache.generation))
+        self.assertEqual(cache.get('key'), b'value')
+
+    def test_sharedcache_reopen(self):
+        cache = self._make_one()
+        cache.set('key', b'value')
+        cache.close()
+
+        cache = self._make_one()
+        self.assertEqual(cache.get('key'), b'value')
+
+        # different geometry
+        cache = self._make_one(slots=32)
+        self.assertIsNone(cache.get('key'))
+
+    def test_sharedcache_collisions(self):
+        cache = self._make_one(slots=4)
+
+        for idx in range(4):
+            cache.set('key%s'%idx, b'value')
+
+        for idx in range(4):
+            self.assertEqual(cache.get('key%s'%idx), b'value')
+
+        # table is full
+        cache.set('key4', b'value4')
+        self.assertEqual(cache.get('key4'), b'value4')
+        self.assertEqual(
+            len([idx for idx in range(4)
+                 if cache.get('key%s'%idx) is not None]), 3)
+
+    def test_sharedcache_corrupted_slot(self):
+        from ptah.sharedcache import HEADER, SLOT
+
+        cache = self._make_one(slots=1)
+        cache.set('key', b'value')
+
+        offset = HEADER.size + SLOT.size + 3
+        cache.map[offset:offset+1] = b'X'
+        self.assertIsNone(cache.get('key'))
@@ -221,6 +221,35 @@ class TestQueryFreezer(PtahTestCase):
         rec = sql_get.one(name='test')
         self.assertEqual(rec.name, 'test')
 
+    def test_freezer_execute(self):
+        import ptah
+
+        class Test(SqlaBase):
+            __tablename__ = 'test13'
+
+            id = sqla.Column('id', sqla.Integer, primary_key=True)
+            name = sqla.Column(sqla.Unicode())
+
+        SqlaBase.metadata.create_all()
+        transaction.commit()
+
+        sql_get = ptah.QueryFreezer(
+            lambda: Session.query(Test)
+            .filter(Test.name == sqla.sql.bindparam('name'))
+            .order_by(Test.id))
+
+        for idx in range(3):
+            Session.add(Test(name='test'))
+        Session.flush()
+
+        data = sql_get.compile()
+        self.assertIs(sql_get.compile(), data)
+
+        stmt = data.stmt.offset(1)
+        self.assertEqual(
+            [rec.id for rec in sql_get.execute(stmt, {'name': 'test'})],
+            [2, 3])
+
 
 class TestJsonDict(PtahTestCase):
 
@@ -301,3 +330,92 @@ class TestJsonList(PtahTestCase):
 
         rec = Session.query(Test).filter_by(id = id).one()
         self.assertEqual(rec.data, ['test'])
+
+
+class TestJsonType(PtahTestCase):
+
+    def _make_table(self, tablename):
+        import ptah
+
+        class Test(SqlaBase):
+            __tablename__ = tablename
+
+            id = sqla.Column('id', sqla.Integer, primary_key=True)
+            name = sqla.Column(sqla.Unicode())
+            data = sqla.Column(ptah.JsonListType())
+
+        SqlaBase.metadata.create_all()
+        transaction.commit()
+        return Test
+
+    def test_jsontype_columns(self):
+        Test = self._make_table('test18')
+
+        rec = Test()
+        rec.data = ['test']
+        Session.add(rec)
+        transaction.commit()
+
+        # column queries return decoded values
+        self.assertEqual(Session.query(Test.data).all(), [(['test'],)])
+        self.assertEqual(
+            list(Session.execute(sqla.select([Test.__table__.c.data]))),
+            [(['test'],)])
+
+    def test_jsontype(self):
+        from ptah.sqla import JsonType
+
+        tp = JsonType()
+        self.assertEqual(tp.process_bind_param([1], None), '[1]')
+        self.assertEqual(tp.process_result_value('[1]', None), [1])
+        self.assertIsNone(tp.process_result_value(None, None))
+        self.assertIsNone(tp.process_bind_param(None, None))
+
+
+class TestJsonCodec(PtahTestCase):
+
+    _init_ptah = False
+
+    def tearDown(self):
+        import json, sys
+        from ptah import sqla
+
+        sys.modules.pop('ujson', None)
+        sqla.json_codec = json
+        super(TestJsonCodec, self).tearDown()
+
+    def test_json_codec(self):
+        import json, sys, types
+        from ptah import sqla
+
+        self.assertIs(sqla.set_json_codec('json'), json)
+        self.assertIs(sqla.json_codec, json)
+
+        # not installed
+        self.assertIs(sqla.set_json_codec('unknown'), json)
+
+        # auto
+        ujson = types.ModuleType('ujson')
+        ujson.loads = json.loads
+        ujson.dumps = json.dumps
+        sys.modules['ujson'] = ujson
+
+        self.assertIs(sqla.set_json_codec('auto'), ujson)
+        self.assertIs(sqla.set_json_codec('json'), json)
+
+    def test_json_codec_settings(self):
+        import json, sys, types
+        import ptah
+        from ptah import sqla
+
+        ujson = types.ModuleType('ujson')
+        sys.modules['ujson'] = ujson
+
+        self.init_ptah()
+        self.assertIs(sqla.json_codec, ujson)
+
+        SQLA = ptah.get_settings(ptah.CFG_ID_SQLA, self.registry)
+        SQLA['json'] = 'json'
+        self.registry.notify(
+            ptah.events.SettingsInitializing(self.config, self.registry))
+        self.assertIs(sqla.json_codec, json)
@@ -81,6 +81,346 @@ class TestUri(PtahTestCase):
 
         self.assertRaises(ConfigurationConflictError, self.init_ptah)
 
+    def test_uri_resolve_many(self):
+        import ptah
+
+        def resolver1(uri):
+            return 'Resolved1:%s'%uri
+
+        calls = []
+        def batch2(uris):
+            calls.append(list(uris))
+            return dict((uri, 'Batch2:%s'%uri) for uri in uris
+                        if uri != 'test2:unknown')
+
+        ptah.register_uri_resolver('test1', resolver1)
+        ptah.register_uri_resolver('test2', resolver1, batch=batch2)
+
+        self.init_ptah()
+
+        res = ptah.resolve_many(
+            ['test2:1', 'test1:1', 'unknown:1', 'test2:2',
+             'test2:unknown', None, 'test1:1'])
+
+        self.assertEqual(
+            list(res.items()),
+            [('test2:1', 'Batch2:test2:1'),
+             ('test1:1', 'Resolved1:test1:1'),
+             ('unknown:1', None),
+             ('test2:2', 'Batch2:test2:2'),
+             ('test2:unknown', None),
+             (None, None)])
+        self.assertEqual(calls, [['test2:1', 'test2:2', 'test2:unknown']])
+
+    def test_uri_resolve_many_chunks(self):
+        import ptah
+        from ptah import uri
+
+        calls = []
+        def batch(uris):
+            calls.append(len(uris))
+            return dict((uri, uri) for uri in uris)
+
+        @ptah.resolver('test', batch=batch)
+        def resolver(uri): # pragma: no cover
+            return uri
+
+        self.init_ptah()
+
+        orig = uri.BATCH_SIZE
+        uri.BATCH_SIZE = 2
+        try:
+            res = ptah.resolve_many(['test:1', 'test:2', 'test:3'])
+        finally:
+            uri.BATCH_SIZE = orig
+
+        self.assertEqual(list(res.values()), ['test:1', 'test:2', 'test:3'])
+        self.assertEqual(calls, [2, 1])
+
+    def test_uri_resolve_many_pyramid(self):
+        import ptah
+
+        def resolver1(uri): # pragma: no cover
+            return 'Resolved'
+
+        def batch1(uris):
+            return dict((uri, 'Resolved-batch') for uri in uris)
+
+        config = testing.setUp()
+        config.include('ptah')
+        config.ptah_uri_resolver('test1', resolver1, batch1)
+        config.commit()
+
+        self.assertEqual(
+            dict(ptah.resolve_many(['test1:uri'])),
+            {'test1:uri': 'Resolved-batch'})
+
+    def test_uri_resolve_cache(self):
+        import ptah
+        from ptah.uri import resolve_cache
+
+        calls = []
+        def resolver(uri):
+            calls.append(uri)
+            if uri != 'test:unknown':
+                return 'Resolved:%s'%uri
+
+        ptah.register_uri_resolver('test', resolver)
+        self.init_ptah()
+
+        hits, misses = resolve_cache.hits, resolve_cache.misses
+
+        self.assertEqual(ptah.resolve('test:1'), 'Resolved:test:1')
+        self.assertEqual(ptah.resolve('test:1'), 'Resolved:test:1')
+        self.assertEqual(
+            list(ptah.resolve_many(['test:1', 'test:2']).values()),
+            ['Resolved:test:1', 'Resolved:test:2'])
+        self.assertEqual(ptah.resolve('test:2'), 'Resolved:test:2')
+        self.assertIsNone(ptah.resolve('test:unknown'))
+        self.assertIsNone(ptah.resolve('test:unknown'))
+
+        self.assertEqual(
+            calls, ['test:1', 'test:2', 'test:unknown', 'test:unknown'])
+        self.assertEqual(resolve_cache.hits - hits, 3)
+        self.assertEqual(resolve_cache.misses - misses, 4)
+
+        # new request
+        ptah.tldata.clear()
+        ptah.resolve('test:1')
+        self.assertEqual(calls[-1], 'test:1')
+
+    def test_uri_resolve_cache_lru(self):
+        import ptah
+        from ptah.uri import resolve_cache
+
+        calls = []
+        def resolver(uri):
+            calls.append(uri)
+            return 'Resolved:%s'%uri
+
+        ptah.register_uri_resolver('test', resolver)
+        self.init_ptah()
+
+        resolve_cache.resize(2)
+        try:
+            ptah.resolve('test:1')
+            ptah.resolve('test:2')
+            ptah.resolve('test:3')
+
+            ptah.tldata.clear()
+            self.assertEqual(ptah.resolve('test:3'), 'Resolved:test:3')
+            self.assertEqual(ptah.resolve('test:2'), 'Resolved:test:2')
+            self.assertEqual(ptah.resolve('test:1'), 'Resolved:test:1')
+            self.assertEqual(
+                calls, ['test:1', 'test:2', 'test:3', 'test:1'])
+            self.assertEqual(list(resolve_cache.lru.keys()),
+                             ['test:2', 'test:1'])
+            self.assertEqual(resolve_cache.stats()['size'], 2)
+        finally:
+            resolve_cache.resize(0)
+            resolve_cache.clear()
+
+    def test_uri_resolve_cache_request_size(self):
+        import ptah
+        from ptah.uri import resolve_cache
+
+        calls = []
+        def resolver(uri):
+            calls.append(uri)
+            return 'Resolved:%s'%uri
+
+        ptah.register_uri_resolver('test', resolver)
+        self.init_ptah()
+
+        resolve_cache.request_size = 2
+        try:
+            ptah.resolve('test:1')
+            ptah.resolve('test:2')
+            ptah.resolve('test:1')
+            ptah.resolve('test:3')
+
+            self.assertEqual(list(resolve_cache._request_map().keys()),
+                             ['test:1', 'test:3'])
+            ptah.resolve('test:1')
+            ptah.resolve('test:2')
+            self.assertEqual(
+                calls, ['test:1', 'test:2', 'test:3', 'test:2'])
+        finally:
+            resolve_cache.request_size = ptah.uri.REQUEST_CACHE_SIZE
+            resolve_cache.clear()
+
+    def test_uri_resolve_cache_ttl(self):
+        import ptah
+        from ptah.uri import resolve_cache
+
+        calls = []
+        def resolver(uri):
+            calls.append(uri)
+            return 'Resolved:%s'%uri
+
+        ptah.register_uri_resolver('test', resolver)
+        self.init_ptah()
+
+        resolve_cache.resize(10, 60)
+        try:
+            ptah.resolve('test:1')
+            ptah.resolve('test:2')
+
+            # expire test:1
+            expires, item = resolve_cache.lru['test:1']
+            resolve_cache.lru['test:1'] = (expires - 61, item)
+
+            ptah.tldata.clear()
+            self.assertEqual(ptah.resolve('test:1'), 'Resolved:test:1')
+            self.assertEqual(ptah.resolve('test:2'), 'Resolved:test:2')
+            self.assertEqual(calls, ['test:1', 'test:2', 'test:1'])
+
+            # no expiration
+            resolve_cache.resize(10, 0)
+            ptah.resolve_many(['test:3'])
+            self.assertEqual(resolve_cache.lru['test:3'][0], 0)
+        finally:
+            resolve_cache.resize(0, 60)
+            resolve_cache.clear()
+
+    def test_uri_resolve_cache_contains(self):
+        import ptah
+        from ptah.uri import resolve_cache
+
+        ptah.register_uri_resolver('test', lambda uri: 'Resolved:%s'%uri)
+        self.init_ptah()
+
+        self.assertFalse(resolve_cache.contains('test:1'))
+        ptah.resolve('test:1')
+        self.assertTrue(resolve_cache.contains('test:1'))
+
+        resolve_cache.resize(10, 60)
+        try:
+            ptah.resolve('test:2')
+            ptah.tldata.clear()
+            self.assertFalse(resolve_cache.contains('test:1'))
+            self.assertTrue(resolve_cache.contains('test:2'))
+
+            # expired
+            expires, item = resolve_cache.lru['test:2']
+            resolve_cache.lru['test:2'] = (expires - 61, item)
+            hits, misses = resolve_cache.hits, resolve_cache.misses
+            self.assertFalse(resolve_cache.contains('test:2'))
+            self.assertEqual((resolve_cache.hits, resolve_cache.misses),
+                             (hits, misses))
+        finally:
+            resolve_cache.resize(0, 60)
+            resolve_cache.clear()
+
+    def test_uri_resolve_cache_events(self):
+        import ptah
+        from ptah.uri import resolve_cache
+
+        class Ob(object):
+            def __init__(self, uri):
+                self.__uri__ = uri
+
+        calls = []
+        def resolver(uri):
+            calls.append(uri)
+            return Ob(uri)
+
+        ptah.register_uri_resolver('test', resolver)
+        self.init_ptah()
+
+        for ev in (ptah.events.ContentModifiedEvent,
+                   ptah.events.ContentMovedEvent,
+                   ptah.events.ContentDeletingEvent):
+            ob = ptah.resolve('test:1')
+            self.assertIs(ptah.resolve('test:1'), ob)
+            self.registry.notify(ev(ob))
+            self.assertIsNot(ptah.resolve('test:1'), ob)
+
+        ob = ptah.resolve('test:1')
+        self.registry.notify(ptah.events.PrincipalAddedEvent(ob))
+        self.assertIsNot(ptah.resolve('test:1'), ob)
+
+        ob = ptah.resolve('test:1')
+        self.registry.notify(ptah.events.ContentsDeletingEvent(['test:1']))
+        self.assertIsNot(ptah.resolve('test:1'), ob)
+        self.assertEqual(len(calls), 6)
+
+    def test_uri_negative_cache(self):
+        import ptah
+        from ptah.uri import negative_cache
+
+        calls = []
+        def resolver(uri):
+            calls.append(uri)
+
+        ptah.register_uri_resolver('test', resolver)
+        self.init_ptah()
+
+        negative_cache.configure(60)
+        hits = negative_cache.hits
+        try:
+            self.assertIsNone(ptah.resolve('test:1'))
+            self.assertIsNone(ptah.resolve('test:1'))
+            self.assertEqual(
+                dict(ptah.resolve_many(['test:1', 'test:2'])),
+                {'test:1': None, 'test:2': None})
+            self.assertIsNone(ptah.resolve('test:2'))
+            self.assertEqual(calls, ['test:1', 'test:2'])
+            self.assertEqual(negative_cache.hits - hits, 3)
+
+            # expired
+            negative_cache.schemas['test']['test:1'] = 0
+            self.assertIsNone(ptah.resolve('test:1'))
+            self.assertEqual(calls, ['test:1', 'test:2', 'test:1'])
+        finally:
+            negative_cache.configure(0)
+
+    def test_uri_negative_cache_size(self):
+        from ptah.uri import negative_cache
+
+        negative_cache.configure(60, 2)
+        try:
+            negative_cache.add('test', 'test:1')
+            negative_cache.add('test', 'test:2')
+            negative_cache.add('test', 'test:3')
+            negative_cache.add('other', 'other:1')
+
+            self.assertFalse(negative_cache.check('test', 'test:1'))
+            self.assertTrue(negative_cache.check('test', 'test:2'))
+            self.assertTrue(negative_cache.check('test', 'test:3'))
+            self.assertTrue(negative_cache.check('other', 'other:1'))
+        finally:
+            negative_cache.configure(0, 10000)
+
+        self.assertFalse(negative_cache.check('test', 'test:3'))
+
+    def test_uri_negative_cache_events(self):
+        import ptah
+        from ptah.uri import negative_cache
+
+        class Ob(object):
+            __uri__ = 'test:1'
+
+        objects = {}
+        ptah.register_uri_resolver('test', objects.get)
+        self.init_ptah()
+
+        negative_cache.configure(60)
+        try:
+            for ev in (ptah.events.ContentCreatedEvent,
+                       ptah.events.ContentAddedEvent):
+                objects.clear()
+                ptah.tldata.clear()
+                self.assertIsNone(ptah.resolve('test:1'))
+
+                ob = objects['test:1'] = Ob()
+                self.assertIsNone(ptah.resolve('test:1'))
+
+                self.registry.notify(ev(ob))
+                self.assertIs(ptah.resolve('test:1'), ob)
+        finally:
+            negative_cache.configure(0)
+
     def test_uri_extract_type(self):
         import ptah
 
@@ -99,3 +439,37 @@ class TestUri(PtahTestCase):
         self.assertTrue(u1.startswith('test:'))
         self.assertTrue(u2.startswith('test:'))
         self.assertTrue(u1 != u2)
+
+    def test_uri_uri_generator_ordered(self):
+        import ptah
+        from ptah import uri
+
+        factory = ptah.UriFactory('test', ordered=True)
+
+        orig = uri.time.time
+        try:
+            uri.time.time = lambda: 1000.0
+            u1 = factory()
+            uri.time.time = lambda: 1000.001
+            u2 = factory()
+        finally:
+            uri.time.time = orig
+
+        self.assertTrue(u1.startswith('test:000000'))
+        self.assertEqual(len(u1), len(ptah.UriFactory('test')()))
+        self.assertTrue(u1 < u2)
+        self.assertEqual(int(u1[5:17], 16), 1000000)
+
+    def test_uri_uri_generator_ordered_settings(self):
+        import ptah
+
+        factory1 = ptah.UriFactory('test')
+        factory2 = ptah.UriFactory('test', ordered=False)
+
+        self._settings = {'ptah.uri_ordered': 'true'}
+        self.init_ptah()
+        try:
+            self.assertTrue(factory1.ordered)
+            self.assertFalse(factory2.ordered)
+        finally:
+            ptah.UriFactory.ordered = False
@@ -1,9 +1,30 @@
 """ uri resolver """
+import os
+import time
 import uuid
+import binascii
+import threading
+import sqlahelper
+from collections import OrderedDict
+from sqlalchemy import orm
+from sqlalchemy.orm import attributes
+from sqlalchemy.orm.properties import ColumnProperty
+
 import ptah
-from ptah import config
+from ptah import config, events
 
 ID_RESOLVER = 'ptah:resolver'
+ID_BATCH_RESOLVER = 'ptah:batch-resolver'
+
+#: max number of uris passed to batch resolver at once
+BATCH_SIZE = 500
+
+#: max number of objects in per request cache
+REQUEST_CACHE_SIZE = 10000
+
+Session = sqlahelper.get_session()
+
+_marker = object()
 
 
 def resolve(uri):
@@ -12,6 +33,8 @@ def resolve(uri):
     Uri contains two parts, `schema` and `uuid`. `schema` is used for
     resolver selection. `uuid` is resolver specific data. By default
     uuid is a uuid.uuid4 string.
+
+    Resolved objects are cached, see :py:class:`ptah.uri.ResolveCache`
     """
     if not uri:
         return
@@ -21,12 +44,391 @@ def resolve(uri):
     except ValueError:
         return None
 
+    ob = resolve_cache.get(uri)
+    if ob is not _marker:
+        return ob
+
     try:
-        return config.get_cfg_storage(ID_RESOLVER)[schema](uri)
+        resolver = config.get_cfg_storage(ID_RESOLVER)[schema]
     except KeyError:
-        pass
+        return None
 
-    return None
+    if negative_cache.check(schema, uri):
+        return None
+
+    ob = resolver(uri)
+    if ob is not None:
+        resolve_cache.set(uri, ob)
+    else:
+        negative_cache.add(schema, uri)
+    return ob
+
+
+def resolve_many(uris):
+    """ Resolve sequence of uris, return ordered mapping of uri to
+    resolved object (`None` for unresolvable uris).
+
+    Uris are grouped by schema. If batch resolver is registered for
+    schema, it receives list of uris and returns mapping of uri to
+    object, otherwise regular resolver is called for each uri.
+    """
+    result = OrderedDict()
+    schemas = OrderedDict()
+
+    for uri in uris:
+        if uri in result:
+            continue
+
+        result[uri] = None
+        schema = extract_uri_schema(uri)
+        if schema is not None:
+            ob = resolve_cache.get(uri)
+            if ob is not _marker:
+                result[uri] = ob
+            elif not negative_cache.check(schema, uri):
+                schemas.setdefault(schema, []).append(uri)
+
+    resolvers = config.get_cfg_storage(ID_RESOLVER)
+    batch_resolvers = config.get_cfg_storage(ID_BATCH_RESOLVER)
+
+    for schema, items in schemas.items():
+        batch = batch_resolvers.get(schema)
+        if batch is not None:
+            for idx in range(0, len(items), BATCH_SIZE):
+                for uri, ob in batch(items[idx:idx+BATCH_SIZE]).items():
+                    if uri in result and ob is not None:
+                        result[uri] = ob
+                        resolve_cache.set(uri, ob)
+
+        else:
+            resolver = resolvers.get(schema)
+            if resolver is None:
+                continue
+
+            for uri in items:
+                ob = resolver(uri)
+                if ob is not None:
+                    result[uri] = ob
+                    resolve_cache.set(uri, ob)
+
+        for uri in items:
+            if result[uri] is None:
+                negative_cache.add(schema, uri)
+
+    return result
+
+
+def _copy_value(value):
+    if isinstance(value, dict):
+        return dict((key, _copy_value(val)) for key, val in value.items())
+    if isinstance(value, list):
+        return [_copy_value(val) for val in value]
+    return value
+
+
+class ResolveCache(object):
+    """ Resolved objects cache.
+
+    Cache contains two levels, per request identity map (it is stored
+    in :py:data:`ptah.tldata`, it is cleared for each new request and
+    keeps `request_size` recently used objects, so it doesn't grow
+    without bound in scripts) and optional bounded LRU cache shared by
+    all threads of process.
+    LRU cache is disabled by default, use `ptah.uri_cache_size`
+    setting to enable it. LRU entries expire after `ttl` seconds
+    (`ptah.uri_cache_ttl` setting), so changes made by other processes
+    are visible after `ttl`.
+
+    Cache stores sqlalchemy mapped objects as snapshot of loaded column
+    attributes, on cache hit snapshot is merged into current session
+    without database query.
+
+    Cached objects are evicted on content and principal events, moved
+    content evicts all cached content below its old path.
+    """
+
+    tldata_key = '__ptah_uri_cache__'
+
+    def __init__(self, size=0, ttl=60, request_size=REQUEST_CACHE_SIZE):
+        self.size = size
+        self.ttl = ttl
+        self.request_size = request_size
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.lru = OrderedDict()
+
+    def _request_map(self):
+        data = ptah.tldata.get(self.tldata_key)
+        if data is None:
+            data = OrderedDict()
+            ptah.tldata.set(self.tldata_key, data)
+        return data
+
+    def _request_set(self, data, uri, ob):
+        data.pop(uri, None)
+        data[uri] = ob
+        while len(data) > self.request_size:
+            data.popitem(False)
+
+    def get(self, uri):
+        """ Return cached object or `ptah.uri._marker` """
+        data = self._request_map()
+
+        ob = data.get(uri, _marker)
+        if ob is not _marker:
+            try:
+                session = orm.object_session(ob)
+            except orm.exc.UnmappedInstanceError:
+                self.hits += 1
+                self._request_set(data, uri, ob)
+                return ob
+
+            if session is not None and session is Session():
+                self.hits += 1
+                self._request_set(data, uri, ob)
+                return ob
+            del data[uri]
+
+        if self.size:
+            with self.lock:
+                item = self.lru.pop(uri, _marker)
+                if item is not _marker:
+                    expires, item = item
+                    if expires and expires < time.time():
+                        item = _marker
+                    else:
+                        self.lru[uri] = (expires, item)
+
+            if item is not _marker:
+                ob = self._restore(item)
+                self._request_set(data, uri, ob)
+                self.hits += 1
+                return ob
+
+        self.misses += 1
+        return _marker
+
+    def contains(self, uri):
+        """ Check if `uri` is resolvable from cache without database
+        query, statistics are not changed """
+        ob = self._request_map().get(uri, _marker)
+        if ob is not _marker:
+            try:
+                session = orm.object_session(ob)
+            except orm.exc.UnmappedInstanceError:
+                return True
+
+            if session is not None and session is Session():
+                return True
+
+        if self.size:
+            with self.lock:
+                item = self.lru.get(uri)
+            if item is not None and not (item[0] and item[0] < time.time()):
+                return True
+
+        return False
+
+    def set(self, uri, ob):
+        self._request_set(self._request_map(), uri, ob)
+
+        if self.size:
+            item = self._snapshot(ob)
+            expires = time.time() + self.ttl if self.ttl else 0
+            with self.lock:
+                self.lru.pop(uri, None)
+                self.lru[uri] = (expires, item)
+                while len(self.lru) > self.size:
+                    self.lru.popitem(False)
+
+    def invalidate(self, uri):
+        """ Evict uri from request and process caches """
+        self._request_map().pop(uri, None)
+
+        with self.lock:
+            self.lru.pop(uri, None)
+
+    def invalidate_path(self, path):
+        """ Evict content with `__path__` below `path` from
+        process cache """
+        with self.lock:
+            for uri, (expires, (info, values)) in list(self.lru.items()):
+                if info is not None and \
+                        (values.get('__path__') or '').startswith(path):
+                    del self.lru[uri]
+
+    def clear(self):
+        ptah.tldata.set(self.tldata_key, OrderedDict())
+
+        with self.lock:
+            self.lru.clear()
+
+    def resize(self, size, ttl=None):
+        """ Set size of process LRU cache, `0` disables LRU cache.
+        `ttl` is time to live of cached object in seconds,
+        `0` means no expiration """
+        with self.lock:
+            self.size = size
+            if ttl is not None:
+                self.ttl = ttl
+            while len(self.lru) > size:
+                self.lru.popitem(False)
+
+    def stats(self):
+        return {'hits': self.hits,
+                'misses': self.misses,
+                'size': len(self.lru),
+                'maxsize': self.size}
+
+    def _snapshot(self, ob):
+        try:
+            state = attributes.instance_state(ob)
+        except orm.exc.NO_STATE:
+            return (None, ob)
+
+        mapper = state.manager.mapper
+        values = dict(
+            (prop.key, _copy_value(state.dict[prop.key]))
+            for prop in mapper.iterate_properties
+            if isinstance(prop, ColumnProperty) and prop.key in state.dict)
+
+        return ((mapper.class_manager, state.key), values)
+
+    def _restore(self, item):
+        info, values = item
+        if info is None:
+            return values
+
+        manager, key = info
+        ob = manager.new_instance()
+        state = attributes.instance_state(ob)
+        state.key = key
+        attributes.instance_dict(ob).update(
+            (name, _copy_value(value)) for name, value in values.items())
+
+        return Session.merge(ob, load=False)
+
+
+resolve_cache = ResolveCache()
+
+
+class NegativeCache(object):
+    """ Cache of unresolvable uris.
+
+    Uris which resolver could not resolve are remembered for `ttl`
+    seconds, so repeated lookups of same uri do not hit resolver.
+    Uris are stored per schema, each schema keeps at most `size` uris.
+    Cache is disabled by default, use `ptah.uri_negative_ttl` setting
+    to enable it. Uri is removed from cache on content created
+    and content added events.
+    """
+
+    def __init__(self, ttl=0, size=10000):
+        self.ttl = ttl
+        self.size = size
+        self.hits = 0
+        self.lock = threading.Lock()
+        self.schemas = {}
+
+    def check(self, schema, uri):
+        """ Check if uri is known as unresolvable """
+        if not self.ttl:
+            return False
+
+        data = self.schemas.get(schema)
+        if not data:
+            return False
+
+        with self.lock:
+            expires = data.get(uri)
+            if expires is None:
+                return False
+
+            if expires < time.time():
+                del data[uri]
+                return False
+
+        self.hits += 1
+        return True
+
+    def add(self, schema, uri):
+        if not self.ttl:
+            return
+
+        with self.lock:
+            data = self.schemas.get(schema)
+            if data is None:
+                data = self.schemas[schema] = OrderedDict()
+
+            data.pop(uri, None)
+            data[uri] = time.time() + self.ttl
+            while len(data) > self.size:
+                data.popitem(False)
+
+    def discard(self, uri):
+        schema = extract_uri_schema(uri)
+
+        data = self.schemas.get(schema)
+        if data:
+            with self.lock:
+                data.pop(uri, None)
+
+    def clear(self):
+        with self.lock:
+            self.schemas = {}
+
+    def configure(self, ttl, size=None):
+        """ Set ttl in seconds, `0` disables cache """
+        with self.lock:
+            self.ttl = ttl
+            if size is not None:
+                self.size = size
+            self.schemas = {}
+
+
+negative_cache = NegativeCache()
+
+
+@config.subscriber(events.ContentModifiedEvent)
+@config.subscriber(events.ContentDeletingEvent)
+@config.subscriber(events.ContentMovedEvent)
+def content_cache_handler(ev):
+    """ Evict content from resolve cache """
+    resolve_cache.invalidate(ev.object.__uri__)
+
+    oldpath = getattr(ev, 'oldpath', None)
+    if oldpath:
+        resolve_cache.invalidate_path(oldpath)
+
+
+@config.subscriber(events.ContentsDeletingEvent)
+def contents_cache_handler(ev):
+    """ Evict deleted subtree from resolve cache """
+    for uri in ev.uris:
+        resolve_cache.invalidate(uri)
+
+
+@config.subscriber(events.ContentCreatedEvent)
+@config.subscriber(events.ContentAddedEvent)
+def content_negative_cache_handler(ev):
+    """ Remove new content from negative resolve cache """
+    negative_cache.discard(ev.object.__uri__)
+
+
+@config.subscriber(events.ContentsAddedEvent)
+def contents_negative_cache_handler(ev):
+    """ Remove bulk created content from negative resolve cache """
+    for item in ev.items:
+        negative_cache.discard(item['__uri__'])
+
+
+@config.subscriber(events.PrincipalEvent)
+def principal_cache_handler(ev):
+    """ Evict principal from resolve cache """
+    uri = getattr(ev.principal, '__uri__', None)
+    if uri is not None:
+        resolve_cache.invalidate(uri)
 
 
 def extract_uri_schema(uri):
@@ -41,8 +443,12 @@ def extract_uri_schema(uri):
     return None
 
 
-def resolver(schema):
+def resolver(schema, batch=None):
     """ Register resolver for given schema
+
+    :param schema: uri schema
+    :param batch: Optional batch resolver, see
+       :py:func:`ptah.register_uri_resolver`
     """
     info = config.DirectiveInfo()
 
@@ -52,11 +458,12 @@ def resolver(schema):
         intr = config.Introspectable(ID_RESOLVER,discr,func.__doc__,ID_RESOLVER)
         intr['schema'] = schema
         intr['callable'] = func
+        intr['batch'] = batch
         intr['codeinfo'] = info.codeinfo
 
         info.attach(
             config.Action(
-                _register_uri_resolver, (schema, func),
+                _register_uri_resolver, (schema, func, batch),
                 discriminator=discr, introspectables=(intr,))
             )
 
@@ -65,12 +472,15 @@ def resolver(schema):
     return wrapper
 
 
-def register_uri_resolver(schema, resolver, depth=1):
+def register_uri_resolver(schema, resolver, depth=1, batch=None):
     """ Register resolver for given schema
 
     :param schema: uri schema
     :type schema: string
     :param resolver: Callable object that accept one parameter.
+    :param batch: Optional callable object that accept list of uris
+       and returns mapping of uri to resolved object. It is used
+       by :py:func:`ptah.resolve_many`
 
     Resolver interface::
 
@@ -85,20 +495,23 @@ def register_uri_resolver(schema, resolver, depth=1):
     intr = config.Introspectable(ID_RESOLVER,discr,resolver.__doc__,ID_RESOLVER)
     intr['schema'] = schema
     intr['callable'] = resolver
+    intr['batch'] = batch
     intr['codeinfo'] = info.codeinfo
 
     info.attach(
         config.Action(
-            _register_uri_resolver, (schema, resolver),
+            _register_uri_resolver, (schema, resolver, batch),
             discriminator=discr, introspectables=(intr,))
         )
 
 
-def _register_uri_resolver(cfg, schema, resolver):
+def _register_uri_resolver(cfg, schema, resolver, batch=None):
     cfg.get_cfg_storage(ID_RESOLVER)[schema] = resolver
+    if batch is not None:
+        cfg.get_cfg_storage(ID_BATCH_RESOLVER)[schema] = batch
 
 
-def pyramid_uri_resolver(config, schema, resolver):
+def pyramid_uri_resolver(config, schema, resolver, batch=None):
     """ pyramid configurator directive 'ptah_uri_resolver' """
     info = ptah.config.DirectiveInfo()
     discr = (ID_RESOLVER, schema)
@@ -106,13 +519,19 @@ def pyramid_uri_resolver(config, schema, resolver):
         ID_RESOLVER,discr,resolver.__doc__,ID_RESOLVER)
     intr['schema'] = schema
     intr['callable'] = resolver
+    intr['batch'] = batch
     intr['codeinfo'] = info.codeinfo
 
     config.action(
-        discr,
-        lambda config, schema, resolver:
-            config.get_cfg_storage(ID_RESOLVER).update({schema:resolver}),
-        (config, schema, resolver), introspectables=(intr,))
+        discr, _register_uri_resolver,
+        (config, schema, resolver, batch), introspectables=(intr,))
+
+
+def ordered_id():
+    """ Generate time ordered 32 chars hex id. First 12 chars is
+    timestamp in milliseconds, rest is random data (ULID like) """
+    return '%012x%s'%(int(time.time() * 1000) & 0xffffffffffff,
+                      binascii.hexlify(os.urandom(10)).decode('ascii'))
 
 
 class UriFactory(object):
@@ -125,11 +544,23 @@ class UriFactory(object):
        >> uri()
        'cms-content:f73f3266fa15438e94cca3621a3f2dbc'
 
+    :param schema: uri schema
+    :param ordered: Generate time ordered uris, by default
+       `ptah.uri_ordered` setting is used.
+
+    Time ordered uris keep inserts into uri indexes local.
     """
 
-    def __init__(self, schema):
+    #: default mode, it is set from `ptah.uri_ordered` setting
+    ordered = False
+
+    def __init__(self, schema, ordered=None):
         self.schema = schema
+        if ordered is not None:
+            self.ordered = ordered
 
     def __call__(self):
         """ Generate new uri using supplied schema """
+        if self.ordered:
+            return '%s:%s' % (self.schema, ordered_id())
         return '%s:%s' % (self.schema, uuid.uuid4().hex)
@@ -54,6 +54,8 @@ setup(name='ptah',
       entry_points = {
           'console_scripts': [
               'settings = ptah.scripts.settings:main',
+              'migrate-blobs = ptah.scripts.blobs:main',
+              'reindex-content = ptah.scripts.search:main',
             ],
           'pyramid.scaffold': [
               'ptah001 = ptah.scaffolds:Ptah001ProjectTemplate',